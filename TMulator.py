@@ -37,8 +37,18 @@
 # Global module imports
 ##############################################################################
 #
+import sys
+import time
+from collections import namedtuple
+
 from TMulator_programming import *      # Import additional TM programs, tapes  and start cells from companion module
                                         # I don't normally like 'import *', but I think it is justifiable here.
+from TMulator_tape import Tape          # Unbounded tape, which grows if the R/W head steps off either end
+from TMulator_compiled import CompiledProgram, MissingTransition, compile_program, precompiled_program, run_compiled  # Compiled (fast) engine
+from TMulator_loops import LoopDetected, LoopDetector                               # Loop detection
+from TMulator_codegen import run_generated                                          # Code-generating engine
+from TMulator_memo import run_memoised                                              # Memoising (block cache) engine
+from TMulator_counters import CounterAccelerator                                     # Counter-loop skipping engine
 
 ##############################################################################
 # Turing Machine emulator function
@@ -73,6 +83,187 @@ def execute_a_TM_step(current_tape, current_tape_index, current_card):
     return return_tuple
 
 
+##############################################################################
+# Run API
+##############################################################################
+#
+# Rather than hand-running the stepper (as main does), a program can be run with 'run()', which can use any of the
+# engines in ENGINES below (all of which give identical results), and which reports on the run in a 'RunResult'.
+# By default nothing is printed while it runs, but a 'trace' sink can be given, which is called every so many
+# steps (every 'trace.every' steps) with the time step, tape, tape index and card index at that point. For example:
+#
+# result = run(PROGRAM_01, TAPE_02, START_CELL_INDEX_02, max_steps=1000000, trace=SummaryTrace(every=100000))
+#
+# Possible reasons for a run ending
+HALTED = 'HALTED'                           # The machine reached card index 0
+MAX_STEPS_REACHED = 'MAX_STEPS_REACHED'     # The machine was still running after the maximum number of steps
+MISSING_TRANSITION = 'MISSING_TRANSITION'   # The machine needed a card (or a card entry) which the program doesn't have
+LOOP_DETECTED = 'LOOP_DETECTED'             # The machine has provably entered a loop (only checked if asked for)
+
+#
+# The result of a run. 'tape' is the (updated) 'Tape', 'wall_time' is in seconds, and 'error' describes the missing
+# transition or the loop if there was one (otherwise it is None). For a detected loop, the machine repeats the same
+# 'cycle_length' steps forever from step 'entry_step' onwards (otherwise these are None)
+RunResult = namedtuple('RunResult', ['halt_reason', 'steps', 'tape', 'tape_index', 'card_index', 'wall_time', 'error',
+                                     'cycle_length', 'entry_step'], defaults=(None, None))
+
+
+# Trace sink which prints a one-line summary of the machine state every so many steps
+class SummaryTrace:
+    def __init__(self, every=100000, file=None):
+        self.every = every
+        self.file = file
+
+    def __call__(self, time_step, current_tape, current_tape_index, current_card_index):
+        print('Time step:- {}  tape index:- {}  card index:- {}  tape extent:- [{}, {}]'.format(
+              time_step, current_tape_index, current_card_index, current_tape.first_index, current_tape.last_index),
+              file=self.file or sys.stdout)
+
+
+# Trace sink which prints the whole machine state after every step (as main always used to)
+class FullTrace:
+    def __init__(self, file=None):
+        self.every = 1
+        self.file = file
+
+    def __call__(self, time_step, current_tape, current_tape_index, current_card_index):
+        file = self.file or sys.stdout
+        print('\nTime step (just taken):- ', time_step, file=file)
+        print('Current tape:- ', current_tape, file=file)
+        print('Current tape index:- ', current_tape_index, file=file)
+        print('Current card index:- ', current_card_index, file=file)
+
+
+#
+# Engines. Each is a function which takes the program and the 'Tape' to run it on, and returns a function which
+# advances the machine from a given tape index and card index by at most a given number of steps, returning the new
+# tape index and card index and the number of steps taken (or raising a 'MissingTransition')
+def reference_engine(state_machine, current_tape):
+    def advance(current_tape_index, current_card_index, max_steps):
+        steps = 0
+        while steps < max_steps and current_card_index != 0:
+            try:
+                current_card = state_machine[current_card_index]
+                (_, current_tape_index, current_card_index) = execute_a_TM_step(current_tape, current_tape_index, current_card)
+            except KeyError as error:
+                raise MissingTransition(error.args[0], current_tape_index, current_card_index, steps) from None
+            steps += 1
+        return (current_tape_index, current_card_index, steps)
+    return advance
+
+
+def compiled_engine(state_machine, current_tape):
+    compiled = compile_program(state_machine, symbols=current_tape.alphabet)
+    def advance(current_tape_index, current_card_index, max_steps):
+        return run_compiled(compiled, current_tape, current_tape_index, current_card_index, max_steps)
+    return advance
+
+
+def codegen_engine(state_machine, current_tape):
+    compiled = compile_program(state_machine, symbols=current_tape.alphabet)
+    def advance(current_tape_index, current_card_index, max_steps):
+        return run_generated(compiled, current_tape, current_tape_index, current_card_index, max_steps)
+    return advance
+
+
+def memo_engine(state_machine, current_tape):
+    compiled = compile_program(state_machine, symbols=current_tape.alphabet)
+    def advance(current_tape_index, current_card_index, max_steps):
+        return run_memoised(compiled, current_tape, current_tape_index, current_card_index, max_steps)
+    return advance
+
+
+def counter_engine(state_machine, current_tape):
+    accelerator = CounterAccelerator(compile_program(state_machine, symbols=current_tape.alphabet), current_tape)
+    return accelerator.advance
+
+
+ENGINES = {'reference': reference_engine, 'compiled': compiled_engine, 'codegen': codegen_engine, 'memo': memo_engine,
+           'counters': counter_engine}
+
+
+# The engine used when loops are to be detected, which checks every step (see 'TMulator_loops.py'), so is slower
+def loop_detecting_engine(state_machine, current_tape):
+    detector = LoopDetector(compile_program(state_machine, symbols=current_tape.alphabet), current_tape)
+    return detector.advance
+
+
+# Function to run a program on a tape (a 'Tape', which is updated in place, or a list of symbols, which is copied
+# into a new 'Tape'), starting on card 1 with the R/W head at the given tape index, until the machine halts, or
+# hits a missing transition, or has taken 'max_steps' steps. If 'detect_loops' is True, then the run also ends as
+# soon as the machine has provably entered a loop (in which case the 'engine' is not used). If a 'profile' (a 'Profile'
+# from 'TMulator_profile.py') is given, then every step is counted in it (and again the 'engine' is not used). A run
+# can't both detect loops and be profiled (each needs its own engine), so asking for both is a ValueError. Returns a
+# 'RunResult'.
+# A run which got as far as card index 'current_card_index' after 'time_step' steps (e.g. one restored from a
+# checkpoint, see 'TMulator_checkpoint.py') can be carried on from there, with 'max_steps' still counting from step 0.
+# Such a run can't detect loops, as the loop detector would start afresh, and so (not knowing the steps before) find a
+# loop at a different step, with a different entry step, from the run it carries on.
+# The program may also be a compiled one (a 'CompiledProgram', or a program loaded by 'load_compiled()' from
+# 'TMulator_loader.py'), which isn't compiled again; the tape is re-coded to its alphabet instead.
+def run(state_machine, current_tape, current_tape_index, max_steps=None, trace=None, engine='compiled', detect_loops=False,
+        current_card_index=None, time_step=0, profile=None):
+    #
+    # Set up the run
+    if max_steps is None:
+        max_steps = MAX_NUMBER_OF_STEPS
+    if isinstance(state_machine, CompiledProgram):
+        state_machine = precompiled_program(state_machine)     # The reference engine needs the cards
+    if detect_loops and profile is not None:
+        raise ValueError("Can't detect loops in a profiled run")
+    if detect_loops and time_step != 0:
+        raise ValueError("Can't detect loops in a run carried on from step {}".format(time_step))
+    if not isinstance(current_tape, Tape):
+        current_tape = Tape(current_tape)
+    start_time = time.perf_counter()
+    if profile is not None:
+        advance = profile.engine(state_machine, current_tape)
+    else:
+        advance = (loop_detecting_engine if detect_loops else ENGINES[engine])(state_machine, current_tape)
+    if current_card_index is None:
+        current_card_index = START_CARD_INDEX
+    error = None
+    loop = None
+
+    #
+    # Run the machine, in chunks of 'trace.every' steps if we are tracing it (or all in one go if not). A trace sink may
+    # change its 'every' as the run goes on
+    chunk = trace.every if trace is not None else max_steps
+    try:
+        while time_step < max_steps and current_card_index != 0:
+            (current_tape_index, current_card_index, steps) = advance(current_tape_index, current_card_index,
+                                                                       min(chunk, max_steps - time_step))
+            time_step += steps
+            if trace is not None:
+                trace(time_step, current_tape, current_tape_index, current_card_index)
+                chunk = trace.every
+    except MissingTransition as missing:
+        time_step += missing.steps
+        current_tape_index = missing.tape_index
+        current_card_index = missing.state
+        error = 'No transition for {!r} (card index {})'.format(missing.args[0], missing.state)
+    except LoopDetected as loop_detected:
+        loop = loop_detected
+        time_step += loop.steps
+        current_tape_index = loop.tape_index
+        current_card_index = loop.state
+        error = str(loop)
+
+    #
+    # Work out why the run ended, and return the result
+    if loop is not None:
+        return RunResult(LOOP_DETECTED, time_step, current_tape, current_tape_index, current_card_index,
+                         time.perf_counter() - start_time, error, loop.cycle_length, loop.entry_step)
+    if error is not None:
+        halt_reason = MISSING_TRANSITION
+    elif current_card_index == 0:
+        halt_reason = HALTED
+    else:
+        halt_reason = MAX_STEPS_REACHED
+    return RunResult(halt_reason, time_step, current_tape, current_tape_index, current_card_index,
+                     time.perf_counter() - start_time, error)
+
+
 ##############################################################################
 # TM Initialisation and program/data options
 ##############################################################################
@@ -112,6 +303,7 @@ if __name__=='__main__':
     #
     # Choose and initialise the data (which may have come from 'TMulator_programming.py')
     current_tape = TAPE_00; current_tape_index = START_CELL_INDEX_00  # <------------------------------      Choose desired tape and start cell index
+    current_tape = Tape(current_tape)   # Wrap the tape up so that it grows (padded with 0s) if the head steps off either end
     
     #
     # Print out starting machine state
@@ -124,29 +316,13 @@ if __name__=='__main__':
     print('Current card index (i.e. current state):- ', current_card_index)
 
     #
-    # Now step the machine through the desired maximum number of steps, or fewer if it halts earlier than that
-    for time_step in range(1,MAX_NUMBER_OF_STEPS+1):
-        #
-        # Execute the step
-        (new_tape, new_tape_index, new_card_index) = execute_a_TM_step(current_tape, current_tape_index, state_machine[current_card_index])
-        #
-        # Update state parameters now that we have executed the step
-        current_tape = new_tape
-        current_tape_index = new_tape_index
-        current_card_index = new_card_index
-
-        #
-        # Print machine state after this time step
-        print('\nTime step (just taken):- ', time_step)
-        print('Current tape:- ', current_tape)
-        print('Current tape index:- ', current_tape_index)
-        print('Current card index:- ', current_card_index)
-
-        #
-        # Halt the machine if we have hit state 0
-        if current_card_index == 0:
-            print('\nMachine halted (on card index 0)\n')
-            break
-
-
-    
\ No newline at end of file
+    # Now step the machine through the desired maximum number of steps, or fewer if it halts earlier than that,
+    # printing out the machine state after every step
+    result = run(state_machine, current_tape, current_tape_index, max_steps=MAX_NUMBER_OF_STEPS, trace=FullTrace())
+
+    #
+    # Report on how the machine stopped
+    if result.halt_reason == HALTED:
+        print('\nMachine halted (on card index 0)\n')
+    elif result.halt_reason == MISSING_TRANSITION:
+        print('\nMachine stopped:- ', result.error, '\n')
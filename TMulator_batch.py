@@ -0,0 +1,228 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a batch runner, which
+# runs one program against many input tapes, fanning the jobs out over a pool of
+# worker processes.
+#
+# Each job is a (tape, start cell index) pair. Jobs are sent to the workers in chunks (so
+# that the per-job overhead of passing them between processes is kept small), each worker
+# compiles the program just once (see 'TMulator_compiled.py'), and results are streamed back
+# either in job order or as they complete. Only a bounded number of chunks is in flight at
+# any time, so that an arbitrarily long (or endless) stream of jobs can be fed in.
+#
+# It can be used as a module:
+#
+# for result in run_batch(PROGRAM_01, binary_number_jobs(16)):
+#     print(result.job_index, result.tape)
+#
+# or from the command line, e.g.:
+#
+# python TMulator_batch.py PROGRAM_01 --binary-width 16
+# python TMulator_batch.py PROGRAM_09 --jobs jobs.jsonl --processes 8 --unordered
+#
+# where each line of a jobs file is a JSON list [tape, start cell index].
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import itertools
+import json
+import os
+import sys
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from TMulator_compiled import MissingTransition, compile_program, run_compiled
+from TMulator_loops import LoopDetected, LoopDetector
+from TMulator_tape import Tape
+
+##############################################################################
+# Batch parameters
+##############################################################################
+#
+# Various top-level parameters
+START_CARD_INDEX = 1            # We always start on card index 1, and stop (halt) on card index 0
+DEFAULT_MAX_NUMBER_OF_STEPS = 10000
+DEFAULT_CHUNKSIZE = 64          # Number of jobs sent to a worker in one go
+CHUNKS_IN_FLIGHT_PER_WORKER = 4 # Enough to keep every worker busy, without reading the whole job stream up front
+MAX_RECOMPILED_PROGRAMS = 64    # Number of tape alphabets whose recompiled programs are kept by each worker
+
+#
+# The result of one job. 'tape' is the final tape as a list of symbols, starting at logical index 'first_index'
+# (which is only non-zero if the machine stepped off the LHS end). 'error' is None unless the job failed (e.g. the
+# machine hit a missing transition), in which case it describes why (and the other fields describe the tape as it was)
+BatchResult = namedtuple('BatchResult', ['job_index', 'tape', 'first_index', 'tape_index', 'card_index', 'steps', 'error'])
+
+
+##############################################################################
+# Worker side
+##############################################################################
+#
+# The compiled program in each worker process, set up once by the pool initialiser
+_worker_compiled = None
+
+#
+# The programs recompiled for tapes with symbols which the program never mentions, keyed by the tape's alphabet, least
+# recently used first. Each is kept along with the compiled program it was recompiled from
+_recompiled_programs = OrderedDict()
+
+
+# Function to initialise a worker process, compiling the program just once for all the jobs it will run
+def _initialise_worker(state_machine):
+    global _worker_compiled
+    _worker_compiled = compile_program(state_machine)
+
+
+# Function to find the program to run on a tape. If the tape holds symbols which the program never mentions (such as
+# the fill symbol, for a program which never reads it), then the program is compiled again for the tape's alphabet (and
+# kept for up to MAX_RECOMPILED_PROGRAMS alphabets, evicting the least recently used), so that reading one of them is a
+# missing transition, just as it is for 'run()'
+def _compiled_for_tape(compiled, current_tape):
+    if len(current_tape.alphabet) <= len(compiled.symbols):
+        return compiled
+    key = tuple(current_tape.alphabet)
+    entry = _recompiled_programs.get(key)
+    if entry is None or entry[0] is not compiled:
+        entry = _recompiled_programs[key] = (compiled, compile_program(compiled, symbols=current_tape.alphabet))
+        if len(_recompiled_programs) > MAX_RECOMPILED_PROGRAMS:
+            _recompiled_programs.popitem(last=False)
+    _recompiled_programs.move_to_end(key)
+    return entry[1]
+
+
+# Function to run a single job against a compiled program (stopping early if 'detect_loops' is True, and the machine
+# has provably entered a loop, see 'TMulator_loops.py')
+def run_job(compiled, job_index, tape, tape_index, max_steps, detect_loops=False):
+    current_tape = Tape(tape, alphabet=compiled.symbols)
+    compiled = _compiled_for_tape(compiled, current_tape)
+    card_index = START_CARD_INDEX
+    steps = 0
+    error = None
+    try:
+        if detect_loops:
+            (tape_index, card_index, steps) = LoopDetector(compiled, current_tape).advance(tape_index, card_index, max_steps)
+        else:
+            (tape_index, card_index, steps) = run_compiled(compiled, current_tape, tape_index, card_index, max_steps)
+    except LoopDetected as loop:
+        (tape_index, card_index, steps) = (loop.tape_index, loop.state, loop.steps)
+        error = 'LoopDetected: {}'.format(loop)
+    except MissingTransition as missing:
+        (tape_index, card_index, steps) = (missing.tape_index, missing.state, missing.steps)
+        error = 'No transition for {!r} (card index {})'.format(missing.args[0], missing.state)
+    return BatchResult(job_index, current_tape.to_list(), current_tape.first_index, tape_index, card_index, steps, error)
+
+
+# Function to run a chunk of jobs in a worker process
+def _run_chunk(chunk, max_steps, detect_loops):
+    return [run_job(_worker_compiled, job_index, tape, tape_index, max_steps, detect_loops)
+            for (job_index, tape, tape_index) in chunk]
+
+
+##############################################################################
+# Batch runner
+##############################################################################
+#
+# Function to run a program against every (tape, start cell index) job in 'jobs', over a pool of worker processes.
+# This is a generator, which yields a 'BatchResult' for each job, in job order if 'ordered' is True, otherwise as
+# soon as each chunk of jobs completes. If 'detect_loops' is True, then jobs which provably loop are stopped early.
+def run_batch(state_machine, jobs, max_steps=DEFAULT_MAX_NUMBER_OF_STEPS, processes=None, chunksize=DEFAULT_CHUNKSIZE, ordered=True,
+              detect_loops=False):
+    numbered_jobs = ((job_index, tape, tape_index) for job_index, (tape, tape_index) in enumerate(jobs))
+    chunks = iter(lambda: list(itertools.islice(numbered_jobs, chunksize)), [])
+    processes = processes or os.cpu_count() or 1
+    max_in_flight = CHUNKS_IN_FLIGHT_PER_WORKER * processes
+    with ProcessPoolExecutor(max_workers=processes, initializer=_initialise_worker, initargs=(state_machine,)) as executor:
+        in_flight = []          # Futures, in the order their chunks were submitted
+        for chunk in itertools.islice(chunks, max_in_flight):
+            in_flight.append(executor.submit(_run_chunk, chunk, max_steps, detect_loops))
+        while in_flight:
+            #
+            # Wait for the next chunk (the oldest one if we are keeping order, otherwise whichever finishes first)
+            if ordered:
+                done_future = in_flight.pop(0)
+            else:
+                (done, _) = wait(in_flight, return_when=FIRST_COMPLETED)
+                done_future = done.pop()
+                in_flight.remove(done_future)
+            #
+            # Top the pool back up, then hand back the results
+            for chunk in itertools.islice(chunks, 1):
+                in_flight.append(executor.submit(_run_chunk, chunk, max_steps, detect_loops))
+            for result in done_future.result():
+                yield result
+
+
+#
+# Function to generate a job for every binary number of the given width, enclosed in blanks, starting on the LHS
+# blank (as expected by e.g. PROGRAM_01 the incrementer, PROGRAM_02 the bit flipper or PROGRAM_08 the decrementer)
+def binary_number_jobs(width):
+    for value in range(2 ** width):
+        bits = [int(bit) for bit in format(value, '0{}b'.format(width))] if width else []
+        yield (['_'] + bits + ['_'], 0)
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to look up a program by name (e.g. 'PROGRAM_01') from 'TMulator.py' and its companion module, or to load
+# it from a program file (see 'TMulator_loader.py') if there is a file of that name
+def find_program(name):
+    if os.path.exists(name):
+        from TMulator_loader import ProgramError, load_compiled
+        try:
+            return load_compiled(name)[0]   # The program, along with its compiled form (cached, see 'TMulator_loader.py')
+        except ProgramError as error:
+            raise SystemExit(str(error))
+    import TMulator
+    state_machine = getattr(TMulator, name, None)
+    if not isinstance(state_machine, dict):
+        raise SystemExit('Unknown program {!r}'.format(name))
+    return state_machine
+
+
+# Function to read jobs (one JSON list [tape, start cell index] per line) from a file
+def read_jobs(jobs_file):
+    for line in jobs_file:
+        if line.strip():
+            (tape, tape_index) = json.loads(line)
+            yield (tape, tape_index)
+
+
+# Function to parse the command line, run the batch and write out one JSON result per line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a TM program against many tapes over a pool of worker processes')
+    parser.add_argument('program', help="Name of the program to run, e.g. 'PROGRAM_01', or a program file")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--jobs', type=argparse.FileType('r'), help="File of jobs, one JSON [tape, start cell index] per line ('-' for stdin)")
+    source.add_argument('--binary-width', type=int, help='Run every binary number of this width, enclosed in blanks')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_NUMBER_OF_STEPS, help='Maximum number of steps per job')
+    parser.add_argument('--processes', type=int, default=None, help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='Number of jobs sent to a worker in one go')
+    parser.add_argument('--unordered', action='store_true', help='Output results as they complete, rather than in job order')
+    parser.add_argument('--detect-loops', action='store_true', help='Stop jobs early once they have provably entered a loop')
+    args = parser.parse_args(argv)
+
+    state_machine = find_program(args.program)
+    jobs = read_jobs(args.jobs) if args.jobs else binary_number_jobs(args.binary_width)
+    for result in run_batch(state_machine, jobs, max_steps=args.max_steps, processes=args.processes,
+                            chunksize=args.chunksize, ordered=not args.unordered, detect_loops=args.detect_loops):
+        sys.stdout.write(json.dumps(result._asdict()) + '\n')
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
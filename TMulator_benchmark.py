@@ -0,0 +1,261 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a benchmark harness, which
+# times every engine in 'ENGINES' (so 'execute_a_TM_step()', via the reference engine, as well
+# as the compiled engine, and any engines added later) over a suite of cases:
+#
+#   - every bundled program (PROGRAM_00 - PROGRAM_13) on its bundled tape, run many times over,
+#     since these runs are only a handful of steps long (so per-run overheads dominate)
+#   - generated large inputs: wide binary numbers for PROGRAM_01/PROGRAM_02/PROGRAM_08, long unary
+#     numbers for PROGRAM_07, a long line of 1's for PROGRAM_00, and a counter left to count for
+#     PROGRAM_12 (PROGRAM_11 only reads a unary number of up to 3, so it has no scaled-up input)
+#   - the busy beavers (BUSY_BEAVER_3/4/5), on a blank tape
+#
+# For each case and engine it reports the steps per second (the best of a number of repeats), the
+# setup time (compiling the program etc.), and the peak memory allocated during a run (measured in
+# a separate run, since tracing allocations slows everything down). It also reports the startup
+# time (importing 'TMulator' in a fresh interpreter). Results can be written out as JSON, and then
+# used as a baseline, against which later results are compared, flagging any regressions. E.g.:
+#
+# python TMulator_benchmark.py --output baseline.json
+# python TMulator_benchmark.py --baseline baseline.json
+# python TMulator_benchmark.py --cases 'busy_beaver_*' --engines compiled --quick
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import TMulator
+from TMulator import ENGINES, run
+from TMulator_tape import Tape
+
+##############################################################################
+# Benchmark parameters
+##############################################################################
+#
+# Various top-level parameters
+DEFAULT_REPEATS = 3             # Each case is timed this many times, and the best time is reported
+DEFAULT_TOLERANCE = 0.10        # A case is a regression if it is this much slower than the baseline
+QUICK_SCALE = 100               # '--quick' divides the sizes and step budgets of the cases by this
+STARTUP_REPEATS = 3
+COUNTER_WIDTH = 32              # Number of bits in the counter which PROGRAM_12 counts up (so it doesn't overflow)
+
+#
+# A benchmark case: the program to run, a function returning the tape (given the scale), the start cell index,
+# the step budget for each run, and the number of runs to time together (for cases with very short runs)
+Case = namedtuple('Case', ['name', 'program', 'make_tape', 'tape_index', 'max_steps', 'runs'])
+
+#
+# The result of timing one case on one engine
+BenchmarkResult = namedtuple('BenchmarkResult', ['case', 'engine', 'steps', 'seconds', 'steps_per_second',
+                                                 'setup_seconds', 'peak_memory_bytes', 'halt_reason'])
+
+
+##############################################################################
+# Benchmark cases
+##############################################################################
+#
+# Functions to generate large inputs, each enclosed in blanks (and started on the LHS blank)
+def wide_binary_tape(width, bit):
+    return ['_'] + [bit] * width + ['_']
+
+
+def one_then_zeros_tape(width):
+    return ['_', 1] + [0] * (width - 1) + ['_']
+
+
+def unary_sum_tape(length):
+    return ['_'] + [1] * length + ['_'] + [1] * length + ['_']
+
+
+#
+# Function to build the suite of cases. 'scale' divides the sizes and step budgets of the large cases (so that a
+# quick run of the whole suite is possible)
+def benchmark_cases(scale=1):
+    width = max(1000000 // scale, 1)
+    cases = []
+    #
+    # The bundled programs, on their bundled tapes
+    bundled = [('PROGRAM_00', 'TAPE_01'), ('PROGRAM_01', 'TAPE_02'), ('PROGRAM_02', 'TAPE_02'), ('PROGRAM_03', 'TAPE_03'),
+               ('PROGRAM_04', 'TAPE_03'), ('PROGRAM_05', 'TAPE_03'), ('PROGRAM_06', 'TAPE_04'), ('PROGRAM_07', 'TAPE_05'),
+               ('PROGRAM_08', 'TAPE_02'), ('PROGRAM_09', 'TAPE_06'), ('PROGRAM_10', 'TAPE_06'), ('PROGRAM_11', 'TAPE_07'),
+               ('PROGRAM_12', 'TAPE_09'), ('PROGRAM_13', 'TAPE_10')]
+    for (program, tape) in bundled:
+        start = getattr(TMulator, tape.replace('TAPE_', 'START_CELL_INDEX_'))
+        cases.append(Case(program.lower(), getattr(TMulator, program), (lambda tape=tape: list(getattr(TMulator, tape))),
+                          start, 1000, max(10000 // scale, 1)))
+    #
+    # Generated large inputs
+    cases += [
+        Case('program_00_long_ones', TMulator.PROGRAM_00, lambda: ['_'] + [1] * width + [0], 0, 10 * width, 1),
+        Case('program_01_wide_binary', TMulator.PROGRAM_01, lambda: wide_binary_tape(width, 1), 0, 10 * width, 1),
+        Case('program_02_wide_binary', TMulator.PROGRAM_02, lambda: wide_binary_tape(width, 1), 0, 10 * width, 1),
+        Case('program_07_long_unary', TMulator.PROGRAM_07, lambda: unary_sum_tape(width // 2), 0, 10 * width, 1),
+        Case('program_08_wide_binary', TMulator.PROGRAM_08, lambda: one_then_zeros_tape(width), 0, 10 * width, 1),
+        Case('program_12_counting', TMulator.PROGRAM_12, lambda: wide_binary_tape(COUNTER_WIDTH, 0), 0, 10 * width, 1),
+    ]
+    #
+    # Busy beavers (the 5-state one runs for 47 million steps, so its step budget is capped)
+    cases += [
+        Case('busy_beaver_3', TMulator.BUSY_BEAVER_3, lambda: list(TMulator.TAPE_08), 0, 1000, max(10000 // scale, 1)),
+        Case('busy_beaver_4', TMulator.BUSY_BEAVER_4, lambda: list(TMulator.TAPE_08), 0, 1000, max(1000 // scale, 1)),
+        Case('busy_beaver_5', TMulator.BUSY_BEAVER_5, lambda: list(TMulator.TAPE_08), 0, max(5000000 // scale, 1), 1),
+    ]
+    return cases
+
+
+##############################################################################
+# Timing
+##############################################################################
+#
+# Function to time one case on one engine, returning a 'BenchmarkResult'. The tapes are built before the clock
+# starts, and the setup time is the time taken to prepare the engine (e.g. to compile the program)
+def time_case(case, engine, repeats=DEFAULT_REPEATS, measure_memory=True):
+    best_seconds = None
+    best_setup_seconds = None
+    for _ in range(repeats):
+        tapes = [Tape(case.make_tape()) for _ in range(case.runs)]
+        start_time = time.perf_counter()
+        ENGINES[engine](case.program, tapes[0])
+        setup_seconds = time.perf_counter() - start_time
+        steps = 0
+        start_time = time.perf_counter()
+        for tape in tapes:
+            result = run(case.program, tape, case.tape_index, max_steps=case.max_steps, engine=engine)
+            steps += result.steps
+        seconds = time.perf_counter() - start_time
+        if best_seconds is None or seconds < best_seconds:
+            best_seconds = seconds
+        if best_setup_seconds is None or setup_seconds < best_setup_seconds:
+            best_setup_seconds = setup_seconds
+    #
+    # Measure the peak memory of a single run separately, since tracing allocations slows everything down
+    peak_memory = None
+    if measure_memory:
+        tape = Tape(case.make_tape())
+        tracemalloc.start()
+        run(case.program, tape, case.tape_index, max_steps=case.max_steps, engine=engine)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return BenchmarkResult(case.name, engine, steps, best_seconds, steps / best_seconds if best_seconds else None,
+                           best_setup_seconds, peak_memory, result.halt_reason)
+
+
+# Function to time how long it takes to start up (import 'TMulator' in a fresh interpreter), in seconds
+def time_startup(repeats=STARTUP_REPEATS):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    best_seconds = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import TMulator'], cwd=directory, check=True)
+        seconds = time.perf_counter() - start_time
+        if best_seconds is None or seconds < best_seconds:
+            best_seconds = seconds
+    return best_seconds
+
+
+# Function to run the benchmarks, returning a JSON-serialisable report
+def run_benchmarks(cases, engines, repeats=DEFAULT_REPEATS, measure_memory=True, progress=None):
+    results = []
+    for case in cases:
+        for engine in engines:
+            result = time_case(case, engine, repeats=repeats, measure_memory=measure_memory)
+            if progress is not None:
+                progress(result)
+            results.append(result._asdict())
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'startup_seconds': time_startup(),
+        'results': results,
+    }
+
+
+# Function to compare a report with a baseline report, returning a list of (case, engine, speed ratio) for the cases
+# which are more than 'tolerance' slower than in the baseline (a ratio of 0.5 means half the baseline speed)
+def compare_with_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    baseline_speeds = {(result['case'], result['engine']): result['steps_per_second'] for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        baseline_speed = baseline_speeds.get((result['case'], result['engine']))
+        if baseline_speed and result['steps_per_second']:
+            ratio = result['steps_per_second'] / baseline_speed
+            if ratio < 1 - tolerance:
+                regressions.append((result['case'], result['engine'], ratio))
+    return regressions
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to print one result as a line of a table
+def print_result(result):
+    memory = '{:>10.1f}'.format(result.peak_memory_bytes / 1024) if result.peak_memory_bytes is not None else '         -'
+    print('{:<26} {:<10} {:>12} {:>14.0f} {:>10.4f} {} {}'.format(result.case, result.engine, result.steps,
+          result.steps_per_second or 0, result.setup_seconds, memory, result.halt_reason), file=sys.stderr)
+
+
+# Function to parse the command line, run the benchmarks and report on them
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the TM engines over the bundled programs, large inputs and busy beavers')
+    parser.add_argument('--cases', default='*', help="Only run the cases matching this pattern, e.g. 'program_0*'")
+    parser.add_argument('--engines', default=','.join(ENGINES), help='Comma-separated list of engines to time')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help='Number of times to time each case')
+    parser.add_argument('--quick', action='store_true', help='Scale the cases down, for a quick check')
+    parser.add_argument('--no-memory', action='store_true', help="Don't measure peak memory")
+    parser.add_argument('--output', help="Write the results to this JSON file ('-' for stdout)")
+    parser.add_argument('--baseline', help='Compare the results with this JSON file of earlier results')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Fractional slowdown counted as a regression')
+    args = parser.parse_args(argv)
+
+    engines = args.engines.split(',')
+    for engine in engines:
+        if engine not in ENGINES:
+            raise SystemExit('Unknown engine {!r} (choose from {})'.format(engine, ', '.join(ENGINES)))
+    cases = [case for case in benchmark_cases(QUICK_SCALE if args.quick else 1) if fnmatch.fnmatch(case.name, args.cases)]
+    print('{:<26} {:<10} {:>12} {:>14} {:>10} {:>10} {}'.format('case', 'engine', 'steps', 'steps/sec', 'setup (s)',
+          'peak (KiB)', 'halt reason'), file=sys.stderr)
+    report = run_benchmarks(cases, engines, repeats=args.repeats, measure_memory=not args.no_memory, progress=print_result)
+    print('Startup time:- {:.3f}s'.format(report['startup_seconds']), file=sys.stderr)
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    elif args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_with_baseline(report, json.load(baseline_file), args.tolerance)
+        for (case, engine, ratio) in regressions:
+            print('REGRESSION:- {} on {} engine runs at {:.0%} of baseline speed'.format(case, engine, ratio), file=sys.stderr)
+        if regressions:
+            raise SystemExit(1)
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
@@ -0,0 +1,403 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing checkpoints, so that a
+# long run (billions of steps) can be stopped (or killed) and later resumed exactly where
+# it left off, rather than all its state being lost with the locals of the main loop.
+#
+# A checkpoint directory holds:
+#
+#   - 'tape.0' and 'tape.1', two copies of the tape's cells (one byte per cell, just as a
+#     'Tape' holds them, with the segments of a 'SparseTape' one after another), which are
+#     written alternately, through a memory map
+#   - 'checkpoint.json', which says which of the two tape files is current, along with
+#     everything else about the machine: the program, the alphabet, the tape's layout and
+#     initial extent, the head, the state and the time step, and how the run was set up
+#
+# A checkpoint is written by updating the older of the two tape files, flushing it, and then
+# replacing 'checkpoint.json' (via a temporary file and a rename) to point at it. So a run
+# killed at any moment leaves the previous checkpoint intact, and the tape file it points to
+# is never touched while it is current.
+#
+# Only the pages of a tape file which differ from the tape are written. Between two writes of
+# the same file the machine has taken k steps, so it can only have written cells within
+# k * (largest step) of the head, and only the pages there are compared (with the page in
+# the memory map, so there is no second copy of the tape in memory). The cost of a checkpoint
+# is therefore proportional to the pages the machine has dirtied, not to the size of the tape
+# (except when the tape grows to the left, or is re-coded, which moves every cell and so
+# rewrites the whole file, as rarely as the tape doubles in size).
+#
+# Checkpoints are written by a trace sink ('CheckpointWriter'), so that any run with 'run()'
+# can be checkpointed, and a run is resumed by 'resume()'. From the command line, e.g.:
+#
+# python TMulator_checkpoint.py run BUSY_BEAVER_5 TAPE_08 0 run.ckpt --max-steps 50000000 --every 1000000
+# python TMulator_checkpoint.py info run.ckpt
+# python TMulator_checkpoint.py resume run.ckpt
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import json
+import mmap
+import os
+import tempfile
+from collections import namedtuple
+
+from TMulator import MAX_NUMBER_OF_STEPS, MISSING_TRANSITION, START_CARD_INDEX, run
+from TMulator_loader import program_from_transitions, program_to_transitions
+from TMulator_tape import Tape, tape_from_segments
+
+##############################################################################
+# Checkpoint files
+##############################################################################
+#
+# Various top-level parameters
+CHECKPOINT_FORMAT_VERSION = 2                  # Version 2 records the tape's layout as segments (see '_TapeFile')
+READABLE_FORMAT_VERSIONS = (1, 2)
+CHECKPOINT_FILE = 'checkpoint.json'
+TAPE_FILES = ('tape.0', 'tape.1')       # Written alternately, so that the current one is never being written
+DEFAULT_CHECKPOINT_STEPS = 1 << 24      # Steps between checkpoints
+PAGE_SIZE = mmap.PAGESIZE               # Tape files are compared with the tape (and written) a page at a time
+
+#
+# A checkpoint as read back from a directory. 'tape' is a 'Tape', and 'settings' holds the arguments the run was
+# started with ('max_steps', 'every', 'engine' and 'detect_loops')
+Checkpoint = namedtuple('Checkpoint', ['state_machine', 'tape', 'tape_index', 'card_index', 'time_step', 'settings'])
+
+
+# Function to write a small file atomically (via a temporary file and a rename), making sure that it has reached the disk
+def _replace_file(path, data):
+    directory = os.path.dirname(path) or '.'
+    (handle, temporary_path) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as temporary_file:
+            temporary_file.write(data)
+            temporary_file.flush()
+            os.fsync(temporary_file.fileno())
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        directory_handle = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory_handle)      # So that the rename itself survives a crash
+        finally:
+            os.close(directory_handle)
+
+
+##############################################################################
+# Writing checkpoints
+##############################################################################
+#
+# One of the two tape files, memory mapped, along with what it held when it was last written: the time step, and the
+# tape's layout (the logical index of the first cell and the length of each of its stretches of cells, see
+# 'Tape.segment_cells()') and alphabet then (if either of those has changed since, other than the last stretch growing
+# on the right, then every page has to be compared again)
+class _TapeFile:
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+        self.map = None
+        self.time_step = None           # None until we know what the file holds
+        self.layout = None
+        self.alphabet = None
+
+    #
+    # Make the file (and its memory map) the same length as the cells
+    def _resize(self, length):
+        if self.map is not None and len(self.map) == length:
+            return
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.truncate(length)
+        if length:
+            self.map = mmap.mmap(self.file.fileno(), length)
+
+    #
+    # Bring the file up to date with the tape, given that the machine has moved by at most 'reach' cells from the
+    # head at 'tape_index' since the file was last written (or None if we don't know). The file holds the tape's
+    # stretches of cells one after another, and each stretch is compared with (and written to) its own part of the
+    # file, a page at a time. Only the cells within 'reach' of the head can have changed, along with any the last
+    # stretch has grown by on the right; any other change of layout (e.g. stretches merging, or one growing on the
+    # left, or one before the last growing at all, which moves those after it along the file) means every page has to
+    # be compared again. Returns the number of pages written.
+    def update(self, tape, tape_index, reach):
+        segments = tape.segment_cells()
+        layout = _tape_layout(segments)
+        old_layout = self.layout
+        self._resize(sum(length for (_, length) in layout))
+        relaid = (reach is None or old_layout is None or tape.alphabet != self.alphabet or len(layout) != len(old_layout) or
+                  layout[:-1] != old_layout[:-1] or layout[-1][0] != old_layout[-1][0])
+        pages_written = 0
+        offset = 0
+        for (number, (first_index, cells)) in enumerate(segments):
+            if relaid:
+                pages_written += self._write_cells(cells, offset, 0, len(cells))
+            else:
+                old_length = old_layout[number][1]
+                start = max(0, tape_index - reach - first_index)
+                stop = min(old_length, tape_index + reach + 1 - first_index)
+                if start < stop:
+                    pages_written += self._write_cells(cells, offset, start, stop)
+                if old_length < len(cells):
+                    pages_written += self._write_cells(cells, offset, old_length, len(cells))  # Grown on the right
+            offset += len(cells)
+        if self.map is not None:
+            self.map.flush()
+        os.fsync(self.file.fileno())
+        self.layout = layout
+        self.alphabet = list(tape.alphabet)
+        return pages_written
+
+    #
+    # Write the pages of the file which hold cells[start:stop] of a stretch of cells starting at 'offset' in the file,
+    # and which differ from them. Returns the number of pages written.
+    def _write_cells(self, cells, offset, start, stop):
+        pages_written = 0
+        (file_start, file_stop) = (offset + start, offset + stop)
+        for page in range(file_start - file_start % PAGE_SIZE, file_stop, PAGE_SIZE):
+            (page_start, page_stop) = (max(page, offset), min(page + PAGE_SIZE, offset + len(cells)))
+            (cells_start, cells_stop) = (page_start - offset, page_stop - offset)
+            if self.map[page_start:page_stop] != cells[cells_start:cells_stop]:
+                self.map[page_start:page_stop] = cells[cells_start:cells_stop]
+                pages_written += 1
+        return pages_written
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+# Function to describe the layout of a tape's stretches of cells (as from 'Tape.segment_cells()'), as a list of
+# [logical index of the first cell, length] pairs
+def _tape_layout(segments):
+    return [[first_index, len(cells)] for (first_index, cells) in segments]
+
+
+# Trace sink (see 'run()' in 'TMulator.py') which writes a checkpoint every 'every' steps. 'settings' are recorded in
+# each checkpoint, so that 'resume()' can carry the run on in the same way
+class CheckpointWriter:
+    def __init__(self, directory, state_machine, every=DEFAULT_CHECKPOINT_STEPS, settings=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.every = every
+        self.transitions = program_to_transitions(state_machine)
+        self.max_step_size = max([abs(transition[3]) for transition in self.transitions] or [0])
+        self.settings = dict(settings or {}, every=every)
+        self.tape_files = [_TapeFile(os.path.join(directory, name)) for name in TAPE_FILES]
+        self.current = 1                # So that the first checkpoint goes into 'tape.0'
+        self.checkpoints_written = 0
+        self.pages_written = 0
+
+    #
+    # Carry on from an existing checkpoint (which must be the latest one in our directory), so that its tape file is
+    # left alone, and only written again once it has been superseded
+    def continue_from(self, checkpoint_info, tape):
+        self.current = checkpoint_info['tape_file']
+        tape_file = self.tape_files[self.current]
+        layout = _tape_layout(tape.segment_cells())
+        tape_file._resize(sum(length for (_, length) in layout))
+        (tape_file.time_step, tape_file.layout, tape_file.alphabet) = (checkpoint_info['time_step'], layout, list(tape.alphabet))
+
+    def __call__(self, time_step, current_tape, current_tape_index, current_card_index):
+        self.write(time_step, current_tape, current_tape_index, current_card_index)
+
+    #
+    # Write a checkpoint of the machine as it is after 'time_step' steps (into the tape file which isn't current)
+    def write(self, time_step, current_tape, current_tape_index, current_card_index):
+        target = 1 - self.current
+        tape_file = self.tape_files[target]
+        reach = None
+        if tape_file.time_step is not None and tape_file.time_step <= time_step:
+            reach = (time_step - tape_file.time_step) * self.max_step_size
+        self.pages_written += tape_file.update(current_tape, current_tape_index, reach)
+        tape_file.time_step = time_step
+        checkpoint_info = {'version': CHECKPOINT_FORMAT_VERSION, 'tape_file': target, 'time_step': time_step,
+                           'tape_index': current_tape_index, 'card_index': current_card_index,
+                           'alphabet': list(current_tape.alphabet), 'fill_symbol': current_tape.fill_symbol,
+                           'segments': tape_file.layout,
+                           'initial_first_index': current_tape.initial_first_index,
+                           'initial_last_index': current_tape.initial_last_index,
+                           'transitions': self.transitions, 'settings': self.settings}
+        _replace_file(os.path.join(self.directory, CHECKPOINT_FILE), json.dumps(checkpoint_info).encode())
+        self.current = target
+        self.checkpoints_written += 1
+
+    def close(self):
+        for tape_file in self.tape_files:
+            tape_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+##############################################################################
+# Checkpointed runs, and resuming them
+##############################################################################
+#
+# Function to read the latest checkpoint in a directory, returning the raw checkpoint info and a 'Checkpoint'
+def _read_checkpoint(directory):
+    try:
+        with open(os.path.join(directory, CHECKPOINT_FILE), 'rb') as checkpoint_file:
+            checkpoint_info = json.loads(checkpoint_file.read())
+    except FileNotFoundError:
+        raise ValueError('{} holds no checkpoint'.format(directory)) from None
+    if checkpoint_info.get('version') not in READABLE_FORMAT_VERSIONS:
+        raise ValueError('{} holds a checkpoint in an unknown format'.format(directory))
+    if 'segments' in checkpoint_info:
+        layout = checkpoint_info['segments']
+    else:
+        layout = [[-checkpoint_info['origin'], checkpoint_info['length']]]     # Version 1 held just the one stretch
+    length = sum(segment_length for (_, segment_length) in layout)
+    data = b''
+    with open(os.path.join(directory, TAPE_FILES[checkpoint_info['tape_file']]), 'rb') as tape_file:
+        if length:
+            with mmap.mmap(tape_file.fileno(), length, access=mmap.ACCESS_READ) as tape_map:
+                data = tape_map[:]
+    segments = []
+    position = 0
+    for (first_index, segment_length) in layout:
+        segments.append((first_index, data[position:position + segment_length]))
+        position += segment_length
+    tape = tape_from_segments(segments, checkpoint_info['alphabet'], checkpoint_info['fill_symbol'])
+    tape.initial_first_index = checkpoint_info['initial_first_index']
+    tape.initial_last_index = checkpoint_info['initial_last_index']
+    checkpoint = Checkpoint(program_from_transitions(checkpoint_info['transitions']), tape, checkpoint_info['tape_index'],
+                            checkpoint_info['card_index'], checkpoint_info['time_step'], checkpoint_info['settings'])
+    return (checkpoint_info, checkpoint)
+
+
+# Function to read the latest checkpoint in a directory, returning a 'Checkpoint'
+def read_checkpoint(directory):
+    return _read_checkpoint(directory)[1]
+
+
+# Function to run a program (as 'run()' does) with a checkpoint writer as its trace sink. The sink sees the end of every
+# chunk of steps, but not the steps taken before a missing transition, so a final checkpoint is written for those
+def _run_with_writer(writer, *args, **kwargs):
+    result = run(*args, trace=writer, **kwargs)
+    if result.halt_reason == MISSING_TRANSITION:
+        writer.write(result.steps, result.tape, result.tape_index, result.card_index)
+    return result
+
+
+# Function to run a program (as 'run()' does), writing a checkpoint into 'directory' at the start, every 'every' steps,
+# and at the end. Returns a 'RunResult'.
+def run_with_checkpoints(state_machine, current_tape, current_tape_index, directory, max_steps=None,
+                         every=DEFAULT_CHECKPOINT_STEPS, engine='compiled', detect_loops=False):
+    if max_steps is None:
+        max_steps = MAX_NUMBER_OF_STEPS
+    if not isinstance(current_tape, Tape):
+        current_tape = Tape(current_tape)
+    settings = {'max_steps': max_steps, 'engine': engine, 'detect_loops': detect_loops}
+    with CheckpointWriter(directory, state_machine, every, settings) as writer:
+        writer.write(0, current_tape, current_tape_index, START_CARD_INDEX)
+        return _run_with_writer(writer, state_machine, current_tape, current_tape_index, max_steps=max_steps, engine=engine,
+                                detect_loops=detect_loops)
+
+
+# Function to carry on a checkpointed run from its latest checkpoint, in exactly the same way as it would have carried
+# on had it not been stopped (up to the original 'max_steps', unless a new one is given), still writing checkpoints as
+# it goes. Returns a 'RunResult', whose steps count from the start of the original run.
+# A run with loop detection can only be resumed from its first checkpoint (the loop detector's state isn't checkpointed,
+# and one started afresh part way through would find a loop at a different step from the original run), so later on
+# it has to be resumed with 'detect_loops' set to False.
+def resume(directory, max_steps=None, every=None, engine=None, detect_loops=None):
+    (checkpoint_info, checkpoint) = _read_checkpoint(directory)
+    settings = dict(checkpoint.settings)
+    for (name, value) in (('max_steps', max_steps), ('every', every), ('engine', engine), ('detect_loops', detect_loops)):
+        if value is not None:
+            settings[name] = value
+    if settings['detect_loops'] and checkpoint.time_step != 0:
+        raise ValueError("{} holds a run with loop detection at step {}, which can't be resumed exactly, so it has to be "
+                         "resumed without loop detection".format(directory, checkpoint.time_step))
+    with CheckpointWriter(directory, checkpoint.state_machine, settings.pop('every'), settings) as writer:
+        writer.continue_from(checkpoint_info, checkpoint.tape)
+        return _run_with_writer(writer, checkpoint.state_machine, checkpoint.tape, checkpoint.tape_index,
+                                max_steps=settings['max_steps'], engine=settings['engine'],
+                                detect_loops=settings['detect_loops'], current_card_index=checkpoint.card_index,
+                                time_step=checkpoint.time_step)
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to look up a program, tape or start cell index by name from 'TMulator.py' and its companion module (a
+# program may also be given as a program file, see 'TMulator_loader.py')
+def _find(name):
+    if os.path.exists(name):
+        from TMulator_loader import load_compiled
+        return load_compiled(name)[0]   # The program, along with its compiled form (cached, see 'TMulator_loader.py')
+    import TMulator
+    if not hasattr(TMulator, name):
+        raise SystemExit('Unknown name {!r}'.format(name))
+    return getattr(TMulator, name)
+
+
+# Function to parse the command line, and start, resume or describe a checkpointed run
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a TM program with periodic checkpoints, or resume it from the latest one')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Run a program, writing checkpoints as it goes')
+    run_parser.add_argument('program', help="Name of the program, e.g. 'PROGRAM_01', or a program file")
+    run_parser.add_argument('tape', help="Name of the tape, e.g. 'TAPE_02'")
+    run_parser.add_argument('start', help="Name of the start cell index, e.g. 'START_CELL_INDEX_02' (or a number)")
+    run_parser.add_argument('directory', help='Checkpoint directory')
+    run_parser.add_argument('--max-steps', type=int, default=1000000)
+    run_parser.add_argument('--every', type=int, default=DEFAULT_CHECKPOINT_STEPS, help='Steps between checkpoints')
+    run_parser.add_argument('--engine', default='compiled')
+    run_parser.add_argument('--detect-loops', action='store_true')
+    resume_parser = subparsers.add_parser('resume', help='Carry on a run from its latest checkpoint')
+    resume_parser.add_argument('directory')
+    resume_parser.add_argument('--max-steps', type=int, default=None, help='New step budget (default: the original one)')
+    resume_parser.add_argument('--every', type=int, default=None)
+    resume_parser.add_argument('--engine', default=None)
+    resume_parser.add_argument('--no-detect-loops', dest='detect_loops', action='store_const', const=False, default=None,
+                               help='Resume a run which was detecting loops without loop detection')
+    info_parser = subparsers.add_parser('info', help='Describe the latest checkpoint')
+    info_parser.add_argument('directory')
+    args = parser.parse_args(argv)
+
+    if args.command == 'info':
+        checkpoint = read_checkpoint(args.directory)
+        print('Time step:- ', checkpoint.time_step)
+        print('Current tape index:- ', checkpoint.tape_index)
+        print('Current card index:- ', checkpoint.card_index)
+        print('Tape extent:- [{}, {}]'.format(checkpoint.tape.first_index, checkpoint.tape.last_index))
+        print('Settings:- ', checkpoint.settings)
+        return
+    if args.command == 'run':
+        start = int(args.start) if args.start.lstrip('-').isdigit() else _find(args.start)
+        result = run_with_checkpoints(_find(args.program), _find(args.tape), start, args.directory, max_steps=args.max_steps,
+                                      every=args.every, engine=args.engine, detect_loops=args.detect_loops)
+    else:
+        try:
+            result = resume(args.directory, max_steps=args.max_steps, every=args.every, engine=args.engine,
+                            detect_loops=args.detect_loops)
+        except ValueError as error:
+            raise SystemExit(str(error))
+    print('{} after {} steps ({:.3f}s)'.format(result.halt_reason, result.steps, result.wall_time))
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
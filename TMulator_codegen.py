@@ -0,0 +1,242 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a code-generating
+# engine, which turns a program into a dedicated Python function, so that nothing
+# is looked up in a table (or a dict) as the machine runs.
+#
+# Starting from the compiled form of a program (see 'TMulator_compiled.py'), we write out
+# Python source with a block of code for each state. Each block reads the scanned symbol code,
+# and compares it with the constant codes the state has transitions for, in turn. Each
+# transition then writes its constant symbol code (or writes nothing, if it leaves the symbol
+# alone), adds its constant step to the head position (checking for the head stepping off
+# the LHS end only if the step is negative), and moves on to its next state. A state with
+# transitions which stay in that state loops within its own block, so that e.g. a scan along
+# the tape never goes back through the dispatch on the state. The source is compiled with
+# 'compile()' and 'exec()', and the resulting function is cached, so that it is only generated
+# once per program.
+#
+# To see the generated source for a program, or to check that the generated functions give
+# exactly the same results as 'execute_a_TM_step()' on all the bundled programs and tapes:
+#
+# python TMulator_codegen.py show PROGRAM_01
+# python TMulator_codegen.py check
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+from collections import OrderedDict
+
+from TMulator_compiled import MissingTransition
+
+##############################################################################
+# Code generation
+##############################################################################
+#
+# Various top-level parameters
+GENERATED_FUNCTION_NAME = 'run_generated'
+MAX_GENERATED_FUNCTIONS = 64        # Number of programs whose generated functions are kept by 'generate_function()'
+
+#
+# The generated functions, keyed by the compiled tables they were generated from, least recently used first
+_generated_functions = OrderedDict()
+
+
+# Function to generate the source for one transition, as a list of lines (indented by 'indent'). 'in_loop' is True
+# if the transition is within a state's own loop (so it stays in the loop if it stays in the same state). Within the
+# generated function, 'steps' is the number of the step being taken (counting from 0), so once it has been taken,
+# 'steps + 1' steps have been taken
+def _transition_source(compiled, index, row, indent, in_loop):
+    width = compiled.width
+    symbol_code = index % width
+    write_code = compiled.write_table[index]
+    step = compiled.step_table[index]
+    next_row = compiled.next_table[index] // width
+    lines = []
+    if write_code != symbol_code:
+        lines.append('cells[head] = {}'.format(write_code))
+    if step != 0:
+        lines.append('head += {}'.format(step) if step > 0 else 'head -= {}'.format(-step))
+    if next_row == 0:
+        lines.append('return (head, 0, steps + 1, False)')
+    elif step < 0:
+        lines.append('if head < 0:')
+        lines.append('    return (head, {}, steps + 1, False)'.format(next_row))
+    if next_row != 0 and next_row != row:
+        lines.append('state = {}'.format(next_row))
+        if in_loop:
+            lines.append('break')
+    if not lines:
+        lines.append('pass')
+    return [indent + line for line in lines]
+
+
+# Function to generate the source for one state's block, as a list of lines (indented by 'indent'). A state with
+# transitions back to itself gets its own loop, which takes its steps from the same iterator as the main loop
+def _state_source(compiled, row, indent):
+    width = compiled.width
+    row_offset = row * width
+    transitions = [index for index in range(row_offset, row_offset + width) if compiled.next_table[index] >= 0]
+    if not transitions:
+        return [indent + 'return (head, {}, steps, True)'.format(row)]      # Every transition is missing
+    in_loop = any(compiled.next_table[index] == row_offset for index in transitions)
+    lines = [indent + 'symbol = cells[head]']
+    if in_loop:
+        lines.append(indent + 'while True:')
+        indent += '    '
+    #
+    # Transitions with the same actions share one block of code, and (in a loop) the blocks which stay in the loop
+    # come first, since those are the ones taken most often
+    blocks = {}
+    for index in transitions:
+        source = tuple(_transition_source(compiled, index, row, indent + '    ', in_loop))
+        blocks.setdefault(source, []).append(index % width)
+    ordered_blocks = sorted(blocks.items(), key=lambda block: compiled.next_table[row_offset + block[1][0]] != row_offset)
+    for (number, (source, symbol_codes)) in enumerate(ordered_blocks):
+        lines.append(indent + '{} {}:    # {}'.format('if' if number == 0 else 'elif',
+                     ' or '.join('symbol == {}'.format(code) for code in symbol_codes),
+                     ', '.join(repr(compiled.symbols[code]) for code in symbol_codes)))
+        lines.extend(source)
+    lines.append(indent + 'else:')
+    lines.append(indent + '    return (head, {}, steps, True)'.format(row))
+    if in_loop:
+        lines.append(indent + 'for steps in step_numbers:')
+        lines.append(indent + '    symbol = cells[head]')
+        lines.append(indent + '    break')
+        lines.append(indent + 'else:')
+        lines.append(indent + '    return (head, {}, max_steps, False)'.format(row))
+    return lines
+
+
+# Function to generate the source of a function which runs a compiled program. The function takes the cells of a
+# 'Tape' (which must already hold the program's symbol codes), the position of the head in the cells, the row of the
+# current state, and the maximum number of steps to take. It returns the new head position and state row, the number
+# of steps taken, and whether it stopped on a missing transition (which hasn't been taken). It also returns as soon as
+# the head is outside the cells (which is either the head position being negative, or the next read being past the
+# end of the cells), leaving the caller to grow the tape, and call it again.
+def generate_source(compiled):
+    lines = ['def {}(cells, head, state, max_steps):'.format(GENERATED_FUNCTION_NAME),
+             '    step_numbers = iter(range(max_steps))',
+             '    steps = 0',
+             '    try:',
+             '        for steps in step_numbers:']
+    for row in range(1, len(compiled.states)):
+        lines.append('            {} state == {}:    # {!r}'.format('if' if row == 1 else 'elif', row, compiled.states[row]))
+        lines.extend(_state_source(compiled, row, ' ' * 16))
+    if len(compiled.states) > 1:
+        lines.append('            else:')
+        lines.append('                return (head, state, steps, False)')
+    else:
+        lines.append('            return (head, state, steps, False)')
+    lines += ['    except IndexError:',
+              '        return (head, state, steps, False)',
+              '    return (head, state, max_steps, False)',
+              '']
+    return '\n'.join(lines)
+
+
+# Function to return the generated function for a compiled program, generating and compiling it if need be (and
+# keeping it for up to MAX_GENERATED_FUNCTIONS programs, evicting the least recently used)
+def generate_function(compiled):
+    key = (compiled.width, tuple(compiled.write_table), tuple(compiled.step_table), tuple(compiled.next_table))
+    function = _generated_functions.get(key)
+    if function is None:
+        namespace = {}
+        exec(compile(generate_source(compiled), '<TMulator generated program>', 'exec'), namespace)
+        function = _generated_functions[key] = namespace[GENERATED_FUNCTION_NAME]
+        if len(_generated_functions) > MAX_GENERATED_FUNCTIONS:
+            _generated_functions.popitem(last=False)
+    _generated_functions.move_to_end(key)
+    return function
+
+
+##############################################################################
+# Run loop
+##############################################################################
+#
+# Function to run a compiled program, via its generated function, on a 'Tape', starting from the given tape index and
+# state, for at most 'max_steps' steps. Returns the updated tape index and state, and the number of steps taken,
+# exactly as 'run_compiled()' does (and likewise raises a 'MissingTransition' if the machine hits one)
+def run_generated(compiled, tape, tape_index, state, max_steps):
+    tape.use_alphabet(compiled.symbols)
+    function = generate_function(compiled)
+    row = compiled.state_rows[state]
+    (cells, origin) = tape.cells_at(tape_index)
+    head = tape_index + origin
+    steps_taken = 0
+    missing = False
+    while steps_taken < max_steps and row != 0 and not missing:
+        if not 0 <= head < len(cells):
+            tape_index = head - origin
+            (cells, origin) = tape.cells_at(tape_index)
+            head = tape_index + origin
+        (head, row, steps, missing) = function(cells, head, row, max_steps - steps_taken)
+        steps_taken += steps
+    tape_index = head - origin
+    state = compiled.states[row]
+
+    #
+    # Deal with a missing transition, reporting it just as the reference stepper would have done
+    if missing:
+        if state not in compiled.card_states:
+            raise MissingTransition(state, tape_index, state, steps_taken)              # There is no card for this state
+        raise MissingTransition(tape[tape_index], tape_index, state, steps_taken)      # The card has no entry for the scanned symbol
+    return (tape_index, state, steps_taken)
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to check the generated engine against the reference engine on every bundled program and tape, printing
+# any differences, and returning the number of (program, tape) pairs which differ
+def check_bundled_programs(max_steps=10000):
+    import TMulator
+    programs = sorted(name for name in dir(TMulator) if name.startswith(('PROGRAM_', 'BUSY_BEAVER_')))
+    tapes = sorted(name for name in dir(TMulator) if name.startswith('TAPE_'))
+    differences = 0
+    for program in programs:
+        for tape in tapes:
+            start = getattr(TMulator, tape.replace('TAPE_', 'START_CELL_INDEX_'))
+            results = [TMulator.run(getattr(TMulator, program), list(getattr(TMulator, tape)), start, max_steps=max_steps,
+                                    engine=engine) for engine in ('reference', 'codegen')]
+            (reference, generated) = [result[:5] + result[6:] for result in results]     # Everything except wall time
+            if reference != generated:
+                differences += 1
+                print('{} on {}:- reference {} but codegen {}'.format(program, tape, reference, generated))
+    print('Checked {} programs on {} tapes:- {} differences'.format(len(programs), len(tapes), differences))
+    return differences
+
+
+# Function to parse the command line, and show generated source or check the generated engine
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show the Python source generated for a TM program, or check the generated engine')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show_parser = subparsers.add_parser('show', help='Print the source generated for a program')
+    show_parser.add_argument('program', help="Name of the program, e.g. 'PROGRAM_01'")
+    subparsers.add_parser('check', help='Check the generated engine against the reference engine on all bundled programs and tapes')
+    args = parser.parse_args(argv)
+
+    if args.command == 'show':
+        import TMulator
+        from TMulator_compiled import compile_program
+        print(generate_source(compile_program(getattr(TMulator, args.program))))
+    elif check_bundled_programs():
+        raise SystemExit(1)
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
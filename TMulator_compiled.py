@@ -0,0 +1,386 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a 'compiled' form
+# of the TM programs, along with a run loop which executes them.
+#
+# A program written in the usual card format (a dict of cards, each card being a dict
+# of dicts keyed by scanned symbol) is turned into dense, integer-indexed tables:
+#
+#   - every symbol is 'interned' to a small integer code (the same codes as a 'Tape' holds in its cells)
+#   - every state is given a row in the tables, with row 0 always being the halting state
+#   - the 'write', 'step' and 'next_state' actions are held in three flat lists, indexed
+#     by (row * width + symbol code), where width is the number of symbols in the alphabet
+#
+# The run loop then steps over those lists with no per-step dict access or tuple building,
+# and produces exactly the same tapes as repeatedly calling 'execute_a_TM_step()'.
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+from collections import namedtuple
+
+from TMulator_tape import Tape
+
+##############################################################################
+# Compiled program representation
+##############################################################################
+#
+# Various top-level parameters
+HALT_STATE = 0              # As in 'TMulator.py', we stop (halt) on card index 0
+START_STATE = 1             # ... and start on card index 1
+MAX_NUMBER_OF_SYMBOLS = 256 # Symbol codes must fit in a byte, so that tapes can be held as bytearrays
+PLACEMARKER_CARD = 'Placemarker card for halting state 0'
+
+#
+# The compiled form of a program. 'symbols' maps code -> symbol, and 'symbol_codes' maps symbol -> code (and
+# likewise 'states' and 'state_rows' for states and their rows). The 'next_table' holds the *offset* of the next
+# row (i.e. row * width) rather than the row itself, which saves a multiply on every step. A transition which is
+# missing from the program (including every transition of a state which is jumped to but has no card) is held as a
+# negative 'next_table' entry, -(offset + 1), so that the run loop can stop and report it in the same way as the
+# reference stepper would. 'card_states' holds the states which do have a card.
+#
+# 'sweep_next_table' is the same as 'next_table', except that the entries for 'sweep' transitions (see below) are
+# marked with -(number of entries + 1 + index), which stops the run loop so that it can apply the rest of the sweep
+# in one go, using the (step, stop codes, translation table) held for that entry in 'sweeps'.
+CompiledProgram = namedtuple('CompiledProgram', ['symbols', 'symbol_codes', 'states', 'state_rows', 'card_states', 'width',
+                                                 'write_table', 'step_table', 'next_table', 'sweep_next_table', 'sweeps'])
+
+
+#
+# A program in the usual card format which carries its compiled form along with it (e.g. one loaded by 'load_compiled()'
+# from 'TMulator_loader.py'), so that 'compile_program()' can hand that back rather than compiling the program again
+class PrecompiledProgram(dict):
+    def __init__(self, state_machine, compiled):
+        super().__init__(state_machine)
+        self.compiled = compiled
+
+
+#
+# The exception raised when the machine hits a missing transition. It is a KeyError (with the same argument as the
+# reference stepper's KeyError would have), which also records where the machine got to: the tape index and state
+# it was in, and the number of steps it had taken (in this run) before the missing transition
+class MissingTransition(KeyError):
+    def __init__(self, key, tape_index, state, steps):
+        super().__init__(key)
+        self.tape_index = tape_index
+        self.state = state
+        self.steps = steps
+
+
+# Function to intern a symbol, giving it the next free code if we haven't seen it before
+def _intern_symbol(symbol, symbols, symbol_codes):
+    if symbol not in symbol_codes:
+        if len(symbols) >= MAX_NUMBER_OF_SYMBOLS:
+            raise ValueError('Too many distinct symbols (at most {} are supported)'.format(MAX_NUMBER_OF_SYMBOLS))
+        symbol_codes[symbol] = len(symbols)
+        symbols.append(symbol)
+    return symbol_codes[symbol]
+
+
+# Function to turn a program (in the usual card format) into its compiled form. Any symbols passed in
+# 'symbols' are given the first codes, in that order (which is handy for matching an existing tape encoding),
+# and any further symbols found in the program are interned after them.
+# A 'PrecompiledProgram' (or a 'CompiledProgram') is handed back as it is, so long as it has codes for all the given
+# symbols, leaving the tape to be re-coded to its alphabet (which every engine does, with 'Tape.use_alphabet()').
+def compile_program(state_machine, symbols=()):
+    if isinstance(state_machine, CompiledProgram):
+        state_machine = precompiled_program(state_machine)
+    precompiled = getattr(state_machine, 'compiled', None)
+    if precompiled is not None and all(symbol in precompiled.symbol_codes for symbol in symbols):
+        return precompiled
+
+    #
+    # Intern the symbols, in a deterministic order (the given symbols first, then as they appear in the cards)
+    symbol_list = []
+    symbol_codes = {}
+    for symbol in symbols:
+        _intern_symbol(symbol, symbol_list, symbol_codes)
+    for state, card in state_machine.items():
+        if state == HALT_STATE:
+            continue            # Card 0 is just a placemarker, so there is nothing to compile
+        for scanned_symbol, action_dict in card.items():
+            _intern_symbol(scanned_symbol, symbol_list, symbol_codes)
+            _intern_symbol(action_dict['write'], symbol_list, symbol_codes)
+
+    #
+    # Give every state a row, with the halting state always on row 0. States which are jumped to, but
+    # which have no card, still get a row (full of missing transitions), as does the start state
+    state_list = [HALT_STATE]
+    state_rows = {HALT_STATE: 0}
+    for state in list(state_machine) + [START_STATE]:
+        if state != HALT_STATE and state not in state_rows:
+            state_rows[state] = len(state_list)
+            state_list.append(state)
+    for state, card in state_machine.items():
+        if state == HALT_STATE:
+            continue
+        for action_dict in card.values():
+            next_state = action_dict['next_state']
+            if next_state not in state_rows:
+                state_rows[next_state] = len(state_list)
+                state_list.append(next_state)
+
+    #
+    # Fill in the tables, starting with every transition missing (leave the symbol alone, don't move, and stop)
+    width = len(symbol_list)
+    number_of_entries = len(state_list) * width
+    write_table = [index % width for index in range(number_of_entries)]
+    step_table = [0] * number_of_entries
+    next_table = [-((index - index % width) + 1) for index in range(number_of_entries)]
+    for state, card in state_machine.items():
+        if state == HALT_STATE:
+            continue
+        row_offset = state_rows[state] * width
+        for scanned_symbol, action_dict in card.items():
+            index = row_offset + symbol_codes[scanned_symbol]
+            write_table[index] = symbol_codes[action_dict['write']]
+            step_table[index] = action_dict['step']
+            next_table[index] = state_rows[action_dict['next_state']] * width
+
+    #
+    # Find the sweeps, and mark them in a copy of the next-state table
+    sweeps = _find_sweeps(width, write_table, step_table, next_table)
+    sweep_next_table = list(next_table)
+    for index in sweeps:
+        sweep_next_table[index] = -(number_of_entries + 1 + index)
+
+    #
+    # Return the compiled program
+    card_states = frozenset(state for state in state_machine if state != HALT_STATE)
+    return CompiledProgram(tuple(symbol_list), symbol_codes, tuple(state_list), state_rows, card_states, width,
+                           write_table, step_table, next_table, sweep_next_table, sweeps)
+
+
+# Function to turn a compiled program back into the usual card format, as a 'PrecompiledProgram' (so that the engines
+# which work from the compiled form don't compile it again)
+def precompiled_program(compiled):
+    (symbols, states, width) = (compiled.symbols, compiled.states, compiled.width)
+    state_machine = {HALT_STATE: PLACEMARKER_CARD}
+    for state in states:
+        if state not in compiled.card_states:
+            continue
+        row_offset = compiled.state_rows[state] * width
+        card = state_machine[state] = {}
+        for code, symbol in enumerate(symbols):
+            next_row_offset = compiled.next_table[row_offset + code]
+            if next_row_offset >= 0:        # Missing transitions are left out of the card
+                card[symbol] = {'write': symbols[compiled.write_table[row_offset + code]],
+                                'step': compiled.step_table[row_offset + code], 'next_state': states[next_row_offset // width]}
+    return PrecompiledProgram(state_machine, compiled)
+
+
+##############################################################################
+# Sweeps (run-length acceleration)
+##############################################################################
+#
+# Most programs spend nearly all their steps in 'self-loops', i.e. transitions which keep the state and move the head
+# in a fixed direction (e.g. PROGRAM_01 state 2 scanning right to the RHS blank, or PROGRAM_02 state 2 flipping bits as
+# it steps right). For a given state and step, the symbols with such a self-loop form the 'sweep set', and once the
+# machine is in one of them it will carry on stepping over (and rewriting) cells until it reaches a cell whose symbol
+# is not in the sweep set. So rather than taking those steps one at a time, we find the end of the run with
+# bytes.find() (a memchr-like pass over the cells) and rewrite the whole run with one bytes.translate().
+#
+# Various top-level parameters
+FIRST_SWEEP_WINDOW = 64             # Number of cells we look ahead for the end of a sweep, at first
+MAX_SWEEP_WINDOW = 1 << 20          # ... doubling each time we don't find it, up to this many
+MIN_MEAN_SWEEP_LENGTH = 16          # A sweep which averages fewer steps than this costs more than it saves ...
+MIN_SWEEP_SAMPLES = 8               # ... (judged once it has been applied this many times), so we turn it off ...
+SWEEP_RETRY_STEPS = 1 << 16         # ... until this many more steps have gone by, when we give it another chance
+
+
+# Function to find every sweep transition in the compiled tables. Returns a dict, keyed by table index, of
+# (step, stop codes, translation table), where the stop codes are all the symbol codes which end the sweep, and the
+# translation table maps each code in the sweep set to the code which is written over it (and every other code to itself)
+def _find_sweeps(width, write_table, step_table, next_table):
+    sweeps = {}
+    for row_offset in range(width, len(next_table), width):
+        sweep_sets = {}
+        for code in range(width):
+            index = row_offset + code
+            if next_table[index] == row_offset and step_table[index] != 0:
+                sweep_sets.setdefault(step_table[index], []).append(code)
+        for step, sweep_codes in sweep_sets.items():
+            stop_codes = bytes(code for code in range(width) if code not in sweep_codes)
+            translation = bytearray(range(256))
+            for code in sweep_codes:
+                translation[code] = write_table[row_offset + code]
+            for code in sweep_codes:
+                sweeps[row_offset + code] = (step, stop_codes, bytes(translation))
+    return sweeps
+
+
+# Function to apply (the rest of) a sweep, starting with the head on 'cells[head]', for at most 'max_steps' steps. Returns
+# the number of steps taken, which is the number of cells from the head up to (but not including) the first one holding a
+# stop code (or up to the end of the cells, if that comes first). If a 'swept' list is given, then the codes read by the
+# sweep (before they are rewritten, in the order they are read) are appended to it, as bytes
+def _apply_sweep(cells, head, sweep, max_steps, swept=None):
+    (step, stop_codes, translation) = sweep
+    sweep_length = 0
+    window = FIRST_SWEEP_WINDOW
+    while sweep_length < max_steps:
+        #
+        # Take the next window of cells in the direction of travel (as a copy, in that order)
+        start = head + sweep_length * step
+        if not 0 <= start < len(cells):
+            break
+        length = min(window, max_steps - sweep_length)
+        stop = start + length * step
+        segment = cells[start:(stop if stop >= 0 else None):step]
+        #
+        # Find the first stop code in it, and rewrite the cells before that
+        run_length = len(segment)
+        for stop_code in stop_codes:
+            position = segment.find(stop_code, 0, run_length)
+            if position >= 0:
+                run_length = position
+        end = start + run_length * step
+        cells[start:(end if end >= 0 else None):step] = segment[:run_length].translate(translation)
+        if swept is not None:
+            swept.append(segment[:run_length])
+        sweep_length += run_length
+        if run_length < length:
+            break               # We found a stop code (or the end of the cells)
+        window = min(2 * window, MAX_SWEEP_WINDOW)
+    return sweep_length
+
+
+##############################################################################
+# Compiled run loop
+##############################################################################
+#
+# Function to run a compiled program on a tape (a 'Tape' from 'TMulator_tape.py', which is updated in place), starting
+# in the given state with the R/W head at the given (logical) tape index, for at most 'max_steps' steps. Returns the
+# final tape index, the final state and the number of steps taken. As with the reference stepper, a missing transition
+# raises a KeyError (a 'MissingTransition', for the scanned symbol, or for the state if it has no card), leaving the
+# tape as it was before it.
+# Sweeps are applied in one go, unless 'macro_steps' is False (the results are identical either way). If a
+# 'transition_log' (e.g. an array) is given, then the table index of every transition taken is appended to it, which
+# is enough to replay the run step by step (see 'TMulator_trace.py'), and sweeps are not used. Unless, that is, a
+# 'sweep_log' (a list) is given as well, in which case sweeps are still applied in one go (see 'TMulator_profile.py'),
+# and each one is appended to the sweep log, rather than to the transition log, as a (length of the transition log when
+# it started, tape index where it started, step, bytes of the codes it read) tuple.
+def run_compiled(compiled, tape, tape_index, state, max_steps, macro_steps=True, transition_log=None, sweep_log=None):
+    #
+    # Make sure that the tape's symbol codes are the same as ours
+    tape.use_alphabet(compiled.symbols)
+    if transition_log is not None:
+        macro_steps = macro_steps and sweep_log is not None
+        log_transition = transition_log.append
+
+    #
+    # Pull everything we need into locals, since they are much faster to access in the loop below
+    width = compiled.width
+    write_table = compiled.write_table
+    step_table = compiled.step_table
+    next_table = list(compiled.sweep_next_table) if macro_steps else compiled.next_table
+    sweeps = compiled.sweeps
+    sweep_statistics = {}           # Number of times each sweep has been applied, and the total steps it has taken
+    steps_since_retry = 0
+    first_sweep_marker = -(len(next_table) + 1)
+    row_offset = compiled.state_rows[state] * width
+    (cells, origin) = tape.cells_at(tape_index)
+    head = tape_index + origin
+    steps_taken = 0
+
+    #
+    # Now step the machine, until it halts (row offset 0), hits a missing transition (negative row offset), or
+    # reaches the maximum number of steps. The inner loop only checks for the head stepping off the LHS end of
+    # the cells (where a negative index would otherwise silently wrap round), since stepping off the RHS end
+    # raises an IndexError on the next read anyway. Either way, we grow the tape and carry on.
+    while steps_taken < max_steps:
+        #
+        # If the last step started a sweep, apply the rest of it in one go, and carry on in the same state. If the
+        # sweep keeps turning out to be short, then turn it off (in our copy of the table) for a while
+        if row_offset <= first_sweep_marker:
+            index = first_sweep_marker - row_offset
+            sweep = sweeps[index]
+            row_offset = index - index % width
+            if 0 <= head < len(cells):
+                if sweep_log is None:
+                    sweep_length = _apply_sweep(cells, head, sweep, max_steps - steps_taken)
+                else:
+                    swept = []
+                    sweep_length = _apply_sweep(cells, head, sweep, max_steps - steps_taken, swept)
+                    sweep_log.append((len(transition_log), head - origin, sweep[0], b''.join(swept)))
+                head += sweep_length * sweep[0]
+                steps_taken += sweep_length
+                statistics = sweep_statistics.setdefault(index, [0, 0])
+                statistics[0] += 1
+                statistics[1] += sweep_length
+                if statistics[0] >= MIN_SWEEP_SAMPLES and statistics[1] < statistics[0] * MIN_MEAN_SWEEP_LENGTH:
+                    next_table[index] = row_offset
+            continue
+        elif row_offset <= 0:
+            break
+        if not 0 <= head < len(cells):
+            tape_index = head - origin
+            (cells, origin) = tape.cells_at(tape_index)
+            head = tape_index + origin
+        if macro_steps and steps_since_retry >= SWEEP_RETRY_STEPS:
+            next_table[:] = compiled.sweep_next_table       # Give every sweep another chance
+            sweep_statistics.clear()
+            steps_since_retry = 0
+        steps = 0
+        try:
+            if transition_log is None:
+                for steps in range(1, min(max_steps - steps_taken, SWEEP_RETRY_STEPS) + 1):
+                    index = row_offset + cells[head]
+                    cells[head] = write_table[index]
+                    head += step_table[index]
+                    row_offset = next_table[index]
+                    if row_offset <= 0 or head < 0:
+                        break
+            else:
+                for steps in range(1, min(max_steps - steps_taken, SWEEP_RETRY_STEPS) + 1):
+                    index = row_offset + cells[head]
+                    log_transition(index)
+                    cells[head] = write_table[index]
+                    head += step_table[index]
+                    row_offset = next_table[index]
+                    if row_offset <= 0 or head < 0:
+                        break
+        except IndexError:
+            steps -= 1              # The head was off the RHS end of the cells, so this step hasn't happened yet
+        steps_taken += steps
+        steps_since_retry += steps
+
+    #
+    # If we ran out of steps just as a sweep started, then we are still in the sweep's state
+    if row_offset <= first_sweep_marker:
+        index = first_sweep_marker - row_offset
+        row_offset = index - index % width
+
+    #
+    # Deal with a missing transition, reporting it just as the reference stepper would have done (the step which hit
+    # it has been counted, but didn't happen)
+    if row_offset < 0:
+        state = compiled.states[(-row_offset - 1) // width]
+        tape_index = head - origin
+        if transition_log is not None:
+            transition_log.pop()
+        if state not in compiled.card_states:
+            raise MissingTransition(state, tape_index, state, steps_taken - 1)              # There is no card for this state
+        raise MissingTransition(tape[tape_index], tape_index, state, steps_taken - 1)      # The card has no entry for the scanned symbol
+
+    #
+    # Return the updated parameters
+    return (head - origin, compiled.states[row_offset // width], steps_taken)
+
+
+# Function to run a program (in the usual card format) on a tape (either a 'Tape', which is updated in place, or a
+# list of symbols, which is copied into a new 'Tape'), in the same way as the main loop of 'TMulator.py' would. Returns
+# the updated tape, tape index and card index (just like 'execute_a_TM_step()'), along with the number of steps taken.
+def run_program(state_machine, current_tape, current_tape_index, current_card_index, max_steps):
+    if not isinstance(current_tape, Tape):
+        current_tape = Tape(current_tape)
+    compiled = compile_program(state_machine, symbols=current_tape.alphabet)
+    (new_tape_index, new_card_index, steps) = run_compiled(compiled, current_tape, current_tape_index, current_card_index, max_steps)
+    return (current_tape, new_tape_index, new_card_index, steps)
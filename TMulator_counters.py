@@ -0,0 +1,374 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing an engine which recognises
+# 'counter loops' (machines which count, by sweeping to and fro between two markers) and
+# jumps ahead many iterations of them at once, working out the resulting tape arithmetically.
+#
+# PROGRAM_12, for example, holds a binary number between two blanks, and over and over again
+# it passes right over the number to the RHS blank, bounces back to carry the increment (turning
+# trailing 1s into 0s, and the first 0 into a 1), returns left to the LHS blank, and bounces off
+# it to go round again. Each time round takes 2n + 2 steps for an n-bit number, wherever in the
+# loop we start counting from, and all it does is add 1 to the number, so a run of 2^n increments
+# takes O(n.2^n) steps. But given the number and the steps left, k increments can be done in one
+# go: add k to the number and write it back, and count k * (2n + 2) steps as taken.
+#
+# The loop is found in the compiled tables, in terms of its roles rather than its symbols:
+#
+#   - a 'pass' state, which steps over every digit unchanged (in the direction away from the carry),
+#     and on the 'carry marker' rewrites it, steps back and enters the carry state
+#   - a 'carry' state, which steps over the digits towards the other marker, turning the top digit into
+#     the bottom digit (and staying put), and any other digit into the next one up (and entering the
+#     return state). Following 'the next one up' from the bottom digit gives every digit, in order of value
+#   - a 'return' state, which steps over every digit unchanged (in the carry direction), and on the 'home
+#     marker' rewrites it, steps back and enters the pass state again
+#
+# which covers binary increment and decrement (PROGRAM_12 and PROGRAM_13, where for the latter the digits
+# just count in the other order), and other bases. Whenever the machine is in a pass state, on a digit, with
+# nothing but digits between the two markers, the engine works out how many whole iterations it can skip
+# (as many as the steps left allow, but stopping short of the iteration which would carry past the home
+# marker, since what happens then isn't part of the loop), and applies them. Everything else (including
+# the run-up to the loop and the overflow at the end of it) is stepped exactly by 'run_compiled()', so the
+# results are identical to every other engine, and the engine counts how many steps it skipped.
+#
+# From the command line, e.g.:
+#
+# python TMulator_counters.py PROGRAM_12 TAPE_09 START_CELL_INDEX_09
+# python TMulator_counters.py PROGRAM_13 TAPE_10 START_CELL_INDEX_10 --max-steps 1000000
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import os
+import time
+from collections import namedtuple
+
+from TMulator_compiled import HALT_STATE, MissingTransition, run_compiled
+
+##############################################################################
+# Counter loops
+##############################################################################
+#
+# Various top-level parameters
+PROBE_LIMIT = 256                   # Number of single steps we take looking for a pass state we can skip from, ...
+MIN_BULK_STEPS = 1 << 10            # ... before running this many steps in one go (without looking), ...
+MAX_BULK_STEPS = 1 << 20            # ... doubling each time we don't find one, up to this many
+FIRST_SCAN_WINDOW = 64              # Number of cells we look through for a marker, at first (doubling until we find it)
+
+#
+# A counter loop, found in the compiled tables. The states are held as row offsets (as in 'run_compiled()'), and the
+# symbols as codes. 'direction' is the step the carry (and the return) takes, so the pass state steps the other way,
+# the carry marker is on the pass state's side of the digits, and the home marker on the other side. 'digits' holds
+# the digit codes in order of their value (so 'base' is its length), and 'values' maps each digit code to its value
+CounterLoop = namedtuple('CounterLoop', ['pass_row', 'carry_row', 'return_row', 'direction', 'home_code', 'carry_code',
+                                         'digits', 'values', 'base'])
+
+
+# Function to find the counter loops in a compiled program. Returns a dict keyed by the (row offset of the) pass state,
+# each value being a list of the counter loops through that state (one for each carry marker it bounces off)
+def find_counter_loops(compiled):
+    width = compiled.width
+    write_table = compiled.write_table
+    step_table = compiled.step_table
+    next_table = compiled.next_table
+    rows = range(width, len(next_table), width)        # Every row but the halting state's
+
+    #
+    # The symbols a state passes over unchanged, stepping in a given direction
+    def passes(row_offset, direction):
+        return {code for code in range(width) if write_table[row_offset + code] == code and
+                step_table[row_offset + code] == direction and next_table[row_offset + code] == row_offset}
+
+    loops = {}
+    for carry_row in rows:
+        #
+        # A carry state has exactly one digit (the top one) on which it stays put, writing the bottom digit
+        stays = [code for code in range(width) if next_table[carry_row + code] == carry_row]
+        if len(stays) != 1:
+            continue
+        top = stays[0]
+        direction = step_table[carry_row + top]
+        bottom = write_table[carry_row + top]
+        if direction not in (-1, +1) or bottom == top:
+            continue
+        #
+        # Follow 'the next one up' from the bottom digit, which must reach the top digit via transitions which all
+        # step the same way into the same return state, without repeating a digit
+        digits = [bottom]
+        return_row = None
+        while digits[-1] != top:
+            index = carry_row + digits[-1]
+            if step_table[index] != direction or next_table[index] <= 0 or write_table[index] in digits:
+                break
+            if return_row is None:
+                return_row = next_table[index]
+            if next_table[index] != return_row or return_row == carry_row:
+                break
+            digits.append(write_table[index])
+        if digits[-1] != top or return_row is None:
+            continue
+        #
+        # The return state passes over the digits to the home marker, which sends it into the pass state. The pass
+        # state passes over the digits the other way, to a carry marker, which sends it into the carry state
+        if not set(digits) <= passes(return_row, direction):
+            continue
+        for home_code in range(width):
+            index = return_row + home_code
+            pass_row = next_table[index]
+            if (write_table[index] != home_code or step_table[index] != -direction or pass_row <= 0 or
+                    pass_row in (carry_row, return_row) or not set(digits) <= passes(pass_row, -direction)):
+                continue
+            for carry_code in range(width):
+                index = pass_row + carry_code
+                if (carry_code not in digits and write_table[index] == carry_code and
+                        step_table[index] == direction and next_table[index] == carry_row):
+                    values = {code: value for (value, code) in enumerate(digits)}
+                    loops.setdefault(pass_row, []).append(
+                        CounterLoop(pass_row, carry_row, return_row, direction, home_code, carry_code, tuple(digits),
+                                    values, len(digits)))
+    return loops
+
+
+# Function to find the first cell from 'head' (inclusive), stepping by 'step', which isn't a digit (i.e. which has a
+# non-zero entry in 'flags', a translation table). Returns its index in the cells, or None if there isn't one
+def _find_non_digit(cells, head, step, flags):
+    window = FIRST_SCAN_WINDOW
+    while True:
+        if step > 0:
+            end = min(len(cells), head + window)
+            position = cells[head:end].translate(flags).find(1)
+            if position >= 0:
+                return head + position
+            if end == len(cells):
+                return None
+        else:
+            start = max(0, head + 1 - window)
+            position = cells[start:head + 1].translate(flags).rfind(1)
+            if position >= 0:
+                return start + position
+            if start == 0:
+                return None
+        window *= 2
+
+
+##############################################################################
+# Counter-loop engine
+##############################################################################
+#
+class CounterAccelerator:
+    #
+    # Set up the accelerator, for a compiled program and the 'Tape' it is to run on
+    def __init__(self, compiled, tape):
+        self.compiled = compiled
+        self.tape = tape
+        self.loops = find_counter_loops(compiled)
+        self.digit_flags = {}           # Translation tables marking the non-digits (and the non-top digits) of each loop
+        for loops in self.loops.values():
+            for loop in loops:
+                self.digit_flags[loop.digits] = (bytes(0 if code in loop.values else 1 for code in range(256)),
+                                                 bytes(0 if code == loop.digits[-1] else 1 for code in range(256)))
+        self.skips = 0                  # Number of times we have skipped ahead, ...
+        self.skipped_iterations = 0     # ... the number of iterations of the loops skipped, ...
+        self.skipped_steps = 0          # ... and the number of steps they would have taken
+
+    def statistics(self):
+        return {'loops': sum(len(loops) for loops in self.loops.values()), 'skips': self.skips,
+                'skipped_iterations': self.skipped_iterations, 'skipped_steps': self.skipped_steps}
+
+    #
+    # Advance the machine from the given tape index and state by at most 'max_steps' steps, skipping whole iterations of
+    # counter loops whenever we can. Returns the new tape index and state, and the number of steps taken (including the
+    # ones skipped), exactly as 'run_compiled()' does (and likewise raises a 'MissingTransition' if the machine hits one)
+    def advance(self, tape_index, state, max_steps):
+        compiled = self.compiled
+        tape = self.tape
+        if not self.loops:
+            return run_compiled(compiled, tape, tape_index, state, max_steps)
+        tape.use_alphabet(compiled.symbols)
+        state_rows = compiled.state_rows
+        width = compiled.width
+        steps_taken = 0
+        probes = 0
+        bulk_steps = MIN_BULK_STEPS
+        failed_row = None               # The pass state we last failed to skip from (until we leave it)
+        while steps_taken < max_steps and state != HALT_STATE:
+            #
+            # Skip ahead if we have just come into a pass state, and can
+            row_offset = state_rows[state] * width
+            if row_offset != failed_row:
+                failed_row = None
+                if row_offset in self.loops:
+                    skipped = self._skip(self.loops[row_offset], tape_index, max_steps - steps_taken)
+                    if skipped:
+                        steps_taken += skipped
+                        probes = 0
+                        bulk_steps = MIN_BULK_STEPS
+                        continue
+                    failed_row = row_offset
+            #
+            # Otherwise step on, a step at a time while we are looking for a pass state, or (if we haven't found one we
+            # can skip from in a while) a run of steps in one go
+            if probes < PROBE_LIMIT:
+                steps = 1
+                probes += 1
+            else:
+                steps = bulk_steps
+                probes = 0
+                bulk_steps = min(bulk_steps * 2, MAX_BULK_STEPS)
+            try:
+                (tape_index, state, steps) = run_compiled(compiled, tape, tape_index, state,
+                                                          min(steps, max_steps - steps_taken), macro_steps=steps > 1)
+            except MissingTransition as missing:
+                raise MissingTransition(missing.args[0], missing.tape_index, missing.state,
+                                        steps_taken + missing.steps) from None
+            steps_taken += steps
+        return (tape_index, state, steps_taken)
+
+    #
+    # Try to skip whole iterations of one of the given counter loops (all through the pass state we are in), with the
+    # head at 'tape_index', and at most 'max_steps' steps to go. Returns the number of steps skipped (0 if we can't)
+    def _skip(self, loops, tape_index, max_steps):
+        (cells, origin) = self.tape.cells_at(tape_index)
+        head = tape_index + origin
+        for loop in loops:
+            if cells[head] not in loop.values:
+                continue
+            #
+            # Find the markers either side of the digits (both of which must be in the cells we have)
+            (digit_flags, top_flags) = self.digit_flags[loop.digits]
+            direction = loop.direction
+            carry_position = _find_non_digit(cells, head, -direction, digit_flags)
+            if carry_position is None or cells[carry_position] != loop.carry_code:
+                continue
+            home_position = _find_non_digit(cells, head, direction, digit_flags)
+            if home_position is None or cells[home_position] != loop.home_code:
+                continue
+            number_of_digits = abs(home_position - carry_position) - 1
+            iteration_steps = 2 * number_of_digits + 2
+            iterations = max_steps // iteration_steps
+            if iterations == 0:
+                return 0
+            #
+            # Only the low digits can change (bar a carry out of them), so read just enough of them to hold the number
+            # of iterations. The i'th digit up from the bottom is i + 1 cells from the carry marker
+            base = loop.base
+            low_digits = 1
+            while base ** low_digits <= iterations and low_digits < number_of_digits:
+                low_digits += 1
+            values = loop.values
+            low_value = 0
+            for position in range(carry_position + direction * low_digits, carry_position, -direction):
+                low_value = low_value * base + values[cells[position]]
+            #
+            # If adding them carries out of the low digits, then carry into the high digits too: the top digits above
+            # the low ones become bottom digits, and the first digit which isn't a top digit goes up by one. If they are
+            # all top digits, then the carry would reach the home marker, so we stop one iteration short of that
+            new_low_value = low_value + iterations
+            if new_low_value >= base ** low_digits:
+                first_high = carry_position + direction * (low_digits + 1)
+                if direction > 0:
+                    high = _find_non_digit(cells[first_high:home_position], 0, +1, top_flags)
+                    carried = None if high is None else first_high + high
+                else:
+                    high = _find_non_digit(cells[home_position + 1:first_high + 1], first_high - home_position - 1, -1,
+                                           top_flags)
+                    carried = None if high is None else home_position + 1 + high
+                if carried is None:
+                    iterations = base ** low_digits - 1 - low_value
+                    if iterations == 0:
+                        return 0
+                    new_low_value = low_value + iterations
+                else:
+                    bottoms = bytes([loop.digits[0]]) * abs(carried - first_high)
+                    if direction > 0:
+                        cells[first_high:carried] = bottoms
+                    else:
+                        cells[carried + 1:first_high + 1] = bottoms
+                    cells[carried] = loop.digits[values[cells[carried]] + 1]
+                    new_low_value -= base ** low_digits
+            #
+            # Write the new low digits back, and count the steps the iterations would have taken
+            for position in range(carry_position + direction, carry_position + direction * (low_digits + 1), direction):
+                (new_low_value, digit) = divmod(new_low_value, base)
+                cells[position] = loop.digits[digit]
+            self.skips += 1
+            self.skipped_iterations += iterations
+            self.skipped_steps += iterations * iteration_steps
+            return iterations * iteration_steps
+        return 0
+
+
+# Function to run a compiled program on a 'Tape', skipping the iterations of any counter loops, starting from the given
+# tape index and state, for at most 'max_steps' steps. Returns the updated tape index and state, and the number of steps
+# taken, exactly as 'run_compiled()' does (and likewise raises a 'MissingTransition' if the machine hits one)
+def run_counters(compiled, tape, tape_index, state, max_steps):
+    return CounterAccelerator(compiled, tape).advance(tape_index, state, max_steps)
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to find a program, tape or start cell index by name in 'TMulator.py' (or load a program file)
+def _find(name):
+    if os.path.exists(name):
+        from TMulator_loader import load_compiled
+        return load_compiled(name)[0]   # The program, along with its compiled form (cached, see 'TMulator_loader.py')
+    import TMulator
+    if not hasattr(TMulator, name):
+        raise SystemExit('Unknown name {!r}'.format(name))
+    return getattr(TMulator, name)
+
+
+# Function to parse the command line, and run a program with the counter-loop engine, reporting the steps skipped
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a TM program, skipping the iterations of its counter loops')
+    parser.add_argument('program', help="Name of the program, e.g. 'PROGRAM_12', or a program file")
+    parser.add_argument('tape', help="Name of the tape, e.g. 'TAPE_09'")
+    parser.add_argument('start', help="Name of the start cell index, e.g. 'START_CELL_INDEX_09' (or a number)")
+    parser.add_argument('--max-steps', type=int, default=1 << 40)
+    parser.add_argument('--show-tape', action='store_true', help='Print the final tape')
+    args = parser.parse_args(argv)
+
+    from TMulator_compiled import START_STATE, compile_program
+    from TMulator_tape import Tape
+    tape = Tape(list(_find(args.tape)))
+    compiled = compile_program(_find(args.program), symbols=tape.alphabet)
+    start = int(args.start) if args.start.lstrip('-').isdigit() else _find(args.start)
+    accelerator = CounterAccelerator(compiled, tape)
+    for loops in accelerator.loops.values():
+        for loop in loops:
+            print('Counter loop:- pass/carry/return card indices {}/{}/{}, base {}, digits (in order) {}'.format(
+                  *(compiled.states[row_offset // compiled.width]
+                    for row_offset in (loop.pass_row, loop.carry_row, loop.return_row)),
+                  loop.base, ' '.join(repr(compiled.symbols[code]) for code in loop.digits)))
+    start_time = time.perf_counter()
+    try:
+        (tape_index, state, steps) = accelerator.advance(start, START_STATE, args.max_steps)
+        outcome = 'Halted' if state == HALT_STATE else 'Still running (card index {})'.format(state)
+    except MissingTransition as missing:
+        (tape_index, steps) = (missing.tape_index, missing.steps)
+        outcome = 'No transition for {!r} (card index {})'.format(missing.args[0], missing.state)
+    print('{} after {} steps ({:.3f}s), at tape index {}'.format(outcome, steps, time.perf_counter() - start_time,
+                                                                 tape_index))
+    print('Skipped {skipped_steps} steps ({skipped_iterations} iterations, in {skips} skips)'.format(
+          **accelerator.statistics()))
+    if args.show_tape:
+        print(tape)
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
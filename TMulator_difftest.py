@@ -0,0 +1,591 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a differential testing
+# harness, which checks every engine against the reference stepper ('execute_a_TM_step()')
+# on randomly generated programs and tapes.
+#
+# The random programs use every feature of the card format that the engines have to get
+# right: steps of more than one cell (and now and then a far jump, which switches a 'Tape'
+# over to a 'SparseTape', or a jump to around the edge of a 'SparseTape' segment), negative and zero steps, 'E' (error) writes, missing transitions,
+# and jumps to states which have no card. Each engine is run in lockstep with the reference
+# stepper, the two being compared (tape contents and extent, head, state and outcome) after
+# chunks of steps which double in length, so that most of the time goes on stepping rather
+# than comparing (apart from the vectorised engine, which can't carry on from where it stopped,
+# and so is run just once for each case, and compared at the end). If they differ, both are re-run from the start one step at a time, to find
+# the first step at which they diverge, and the failing case is then shrunk (dropping cards
+# and transitions, shortening steps and tapes, and so on, for as long as it still fails) to
+# a minimal one, which is printed (and can be saved as a program file). Every engine is also
+# checked to switch a 'Tape' over to a 'SparseTape' on a far jump. From the command line,
+# e.g.:
+#
+# python TMulator_difftest.py --cases 2000 --max-steps 5000 --seed 1
+# python TMulator_difftest.py --engines codegen,memo-sparse --save failures
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+import weakref
+from collections import namedtuple
+
+from TMulator import ENGINES, compiled_engine, loop_detecting_engine, reference_engine
+from TMulator_checkpoint import CheckpointWriter, read_checkpoint
+from TMulator_compiled import MissingTransition, compile_program, run_compiled
+from TMulator_loops import LoopDetected
+from TMulator_loader import program_from_transitions, save_program
+from TMulator_profile import Profile
+from TMulator_tape import SEGMENT_GAP, SEGMENT_PAD, SPARSE_JUMP, SparseTape, Tape
+from TMulator_trace import TraceReader, TraceWriter
+
+try:
+    from TMulator_vectorised import run_vectorised     # Optional - only needed to test the vectorised engine
+except ImportError:
+    run_vectorised = None
+
+##############################################################################
+# Test parameters
+##############################################################################
+#
+# Various top-level parameters
+START_CARD_INDEX = 1                # We always start on card index 1, and stop (halt) on card index 0
+TAPE_SYMBOLS = (0, 1, '_')          # The symbols random tapes are made of (0 being the fill symbol)
+ERROR_SYMBOL = 'E'                  # Written (now and then) by random programs, which may or may not have cards for it
+MAX_STATES = 4                      # Random programs have 1 to this many states
+MAX_TAPE_LENGTH = 12                # Random tapes have 0 to this many cells
+MAX_JUMP = 8                        # The largest step of an ordinary multi-cell jump
+JUMP_RATE = 0.2                     # Fraction of transitions which jump (by -MAX_JUMP to MAX_JUMP cells) rather than step by 1
+LONG_JUMP_RATE = 0.04               # Fraction of transitions which jump by more than MAX_JUMP, but less than SEGMENT_PAD, cells
+GAP_JUMP_RATE = 0.02                # Fraction of transitions which jump by SEGMENT_GAP to 2 * SEGMENT_GAP cells
+FAR_JUMP_RATE = 0.01                # Fraction of transitions which jump by SPARSE_JUMP cells or more
+HALT_RATE = 0.08                    # Fraction of transitions which halt
+NO_CARD_RATE = 0.02                 # Fraction of transitions which go to a state with no card
+MISSING_RATE = 0.08                 # Fraction of transitions left out of the program
+ERROR_RATE = 0.08                   # Fraction of transitions which write an 'E'
+MAX_CHECK_INTERVAL = 1 << 12        # The engines are compared after chunks of 1, 2, 4, ... steps, up to this many
+DEFAULT_CASES = 1000
+DEFAULT_MAX_STEPS = 5000
+
+TRACE_CHECKPOINT_INTERVAL = 1024   # Steps between checkpoints in the traces written by the 'trace' engine
+
+
+#
+# A test case: a program (as a list of [state, scanned symbol, write, step, next state] transitions, see
+# 'TMulator_loader.py'), a tape (a list of symbols, starting at index 0) and the start tape index
+Case = namedtuple('Case', ['transitions', 'tape', 'start'])
+
+#
+# A case which jumps far to the right and then further still to the left, on which every engine given a 'Tape' should
+# switch it over to a 'SparseTape', rather than growing it to hundreds of megabytes
+FAR_JUMP_CASE = Case([[1, 0, 1, 10 ** 8, 2], [2, 0, 1, -3 * 10 ** 8, 3], [3, 0, 1, 1, 0]], [0, 0], 0)
+
+#
+# A divergence between an engine and the reference stepper, first seen after 'step' steps. 'fields' names what differs
+# ('steps', 'outcome', 'head', 'state' and/or 'tape'), and 'expected' and 'found' are the reference's and the engine's
+# snapshots (see '_Machine.snapshot()') at that step
+Divergence = namedtuple('Divergence', ['engine', 'case', 'step', 'fields', 'expected', 'found'])
+
+
+##############################################################################
+# Engines under test
+##############################################################################
+#
+# Engine which runs with loop detection (as 'run(..., detect_loops=True)' does), and once a loop has been detected,
+# carries on with the compiled engine, failing if the machine then halts or hits a missing transition after all
+def loop_checking_engine(state_machine, current_tape):
+    detecting_advance = loop_detecting_engine(state_machine, current_tape)
+    compiled_advance = compiled_engine(state_machine, current_tape)
+    loops = []
+    def advance(tape_index, state, max_steps):
+        if not loops:
+            try:
+                return detecting_advance(tape_index, state, max_steps)
+            except LoopDetected as loop:
+                loops.append(loop)
+                return (loop.tape_index, loop.state, loop.steps)
+        try:
+            (tape_index, state, steps) = compiled_advance(tape_index, state, max_steps)
+        except MissingTransition as missing:
+            raise AssertionError('{} (after the loop detector said: {})'.format(missing, loops[0])) from None
+        if state == 0:
+            raise AssertionError('Halted (after the loop detector said: {})'.format(loops[0]))
+        return (tape_index, state, steps)
+    return advance
+
+
+# Engine which records its run to a trace file (as 'record_run()' does, checkpointing every TRACE_CHECKPOINT_INTERVAL
+# steps), and after every call checks that replaying the trace gives back the tape, head and state it has
+class TracingEngine:
+    def __init__(self, state_machine, current_tape):
+        self.tape = current_tape
+        self.compiled = compile_program(state_machine, symbols=current_tape.alphabet)
+        current_tape.use_alphabet(self.compiled.symbols)
+        (handle, self.path) = tempfile.mkstemp(suffix='.tmtrace')
+        os.close(handle)
+        self.writer = TraceWriter(self.path, self.compiled, TRACE_CHECKPOINT_INTERVAL)
+        weakref.finalize(self, _remove_trace, self.writer, self.path)
+        self.steps = None           # None until the first checkpoint has been written
+
+    def __call__(self, tape_index, state, max_steps):
+        if self.steps is None:
+            self.writer.write_checkpoint(0, self.tape, tape_index, state)
+            self.steps = 0
+        taken = 0
+        while taken < max_steps and state != 0:
+            next_checkpoint = (self.steps // TRACE_CHECKPOINT_INTERVAL + 1) * TRACE_CHECKPOINT_INTERVAL
+            transitions = []
+            try:
+                (tape_index, state, steps) = run_compiled(self.compiled, self.tape, tape_index, state,
+                                                          min(max_steps - taken, next_checkpoint - self.steps),
+                                                          transition_log=transitions)
+            except MissingTransition as missing:
+                self.writer.write_transitions(self.steps, transitions)
+                self.steps += missing.steps
+                self._check(missing.tape_index, missing.state)
+                raise MissingTransition(missing.args[0], missing.tape_index, missing.state, taken + missing.steps) from None
+            self.writer.write_transitions(self.steps, transitions)
+            self.steps += steps
+            taken += steps
+            if self.steps == next_checkpoint:
+                self.writer.write_checkpoint(self.steps, self.tape, tape_index, state)
+        self._check(tape_index, state)
+        return (tape_index, state, taken)
+
+    #
+    # Check that the trace replays to the given head and state, and our tape
+    def _check(self, tape_index, state):
+        self.writer.file.flush()
+        with TraceReader(self.path) as reader:
+            (tape, replayed_tape_index, replayed_state) = reader.tape_at(self.steps)
+        if (tape_snapshot(tape), replayed_tape_index, replayed_state) != (tape_snapshot(self.tape), tape_index, state):
+            raise AssertionError('Replaying the trace to step {} gives a different machine'.format(self.steps))
+
+
+def _remove_trace(writer, path):
+    writer.file.close()
+    os.remove(path)
+
+
+# Engine which runs the compiled engine, writing a checkpoint (as 'run_with_checkpoints()' does) after every call, and
+# checking that reading it back gives the tape, head and state it has
+class CheckpointingEngine:
+    def __init__(self, state_machine, current_tape):
+        self.tape = current_tape
+        self.advance = compiled_engine(state_machine, current_tape)
+        self.directory = tempfile.mkdtemp(suffix='.tmcheckpoint')
+        self.writer = CheckpointWriter(self.directory, state_machine, every=1)
+        weakref.finalize(self, _remove_checkpoints, self.writer, self.directory)
+        self.steps = 0
+
+    def __call__(self, tape_index, state, max_steps):
+        (tape_index, state, steps) = self.advance(tape_index, state, max_steps)
+        self.steps += steps
+        self.writer.write(self.steps, self.tape, tape_index, state)
+        checkpoint = read_checkpoint(self.directory)
+        if ((tape_snapshot(checkpoint.tape), checkpoint.tape_index, checkpoint.card_index, checkpoint.time_step) !=
+                (tape_snapshot(self.tape), tape_index, state, self.steps)):
+            raise AssertionError('The checkpoint after step {} reads back as a different machine'.format(self.steps))
+        return (tape_index, state, steps)
+
+
+def _remove_checkpoints(writer, directory):
+    writer.close()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+# Engine which runs the vectorised engine (from 'TMulator_vectorised.py') on the one tape. That can't carry on from
+# where it stopped, so every call re-runs the machine from its start (taking the steps it has already taken, and then
+# up to 'max_steps' more), and copies the resulting cells back onto the tape. This makes each call cost as much as all
+# the calls before it, so it is only compared with the reference stepper at the end of a case (see 'WHOLE_RUN_ENGINES')
+def vectorised_engine(state_machine, current_tape):
+    card_states = compile_program(state_machine, symbols=current_tape.alphabet).card_states
+    first_index = current_tape.first_index
+    initial_symbols = current_tape.to_list()
+    fill_symbol = current_tape.fill_symbol
+    start = {}
+    def advance(tape_index, state, max_steps):
+        start.setdefault('tape_index', tape_index)
+        start.setdefault('steps', 0)
+        result = run_vectorised(state_machine, [initial_symbols], [start['tape_index'] - first_index],
+                                start['steps'] + max_steps, fill_symbol)
+        #
+        # Copy the cells back (only those which hold, or held, something other than the fill symbol)
+        row = result.cells[0]
+        columns = (row != result.symbols.index(fill_symbol)).nonzero()[0]
+        written = {first_index - result.origin + column: result.symbols[code]
+                   for (column, code) in zip(columns.tolist(), row[columns].tolist())}
+        for (run_start, symbols) in tape_snapshot(current_tape)[2]:
+            for index in range(run_start, run_start + len(symbols)):
+                written.setdefault(index, fill_symbol)
+        for (index, symbol) in written.items():
+            current_tape[index] = symbol
+        #
+        # Report how far the machine got this time
+        (tape_index, state) = (int(result.tape_indices[0]) + first_index, int(result.card_indices[0]))
+        steps = int(result.steps[0]) - start['steps']
+        start['steps'] = int(result.steps[0])
+        if result.missing[0]:
+            raise MissingTransition(state if state not in card_states else current_tape[tape_index], tape_index, state, steps)
+        return (tape_index, state, steps)
+    return advance
+
+
+#
+# The engines to test, each a (factory, tape class) pair: the factory is an engine from 'TMulator.py' (or one with the
+# same signature), and the tape class is what the case's tape is wrapped in. The reference engine is tested too, on a
+# 'SparseTape', and every other engine is tested on both kinds of tape (but for the vectorised engine, when NumPy is
+# installed, which only copies its cells onto the tape)
+TEST_ENGINES = {'reference-sparse': (reference_engine, SparseTape),
+                'profile': (lambda state_machine, tape: Profile().engine(state_machine, tape), Tape)}
+for (engine_name, engine_factory) in ENGINES.items():
+    if engine_name != 'reference':
+        TEST_ENGINES[engine_name] = (engine_factory, Tape)
+        TEST_ENGINES[engine_name + '-sparse'] = (engine_factory, SparseTape)
+TEST_ENGINES['profile-sparse'] = (TEST_ENGINES['profile'][0], SparseTape)
+for (engine_name, engine_factory) in (('loops', loop_checking_engine), ('trace', TracingEngine),
+                                      ('checkpoint', CheckpointingEngine)):
+    TEST_ENGINES[engine_name] = (engine_factory, Tape)
+    TEST_ENGINES[engine_name + '-sparse'] = (engine_factory, SparseTape)
+if run_vectorised is not None:
+    TEST_ENGINES['vectorised'] = (vectorised_engine, Tape)     # It runs on its own array of cells, whatever the tape
+
+#
+# The engines which are run in one go for each case, and compared with the reference stepper only once it has stopped
+# (or run out of steps), rather than in lockstep with it (which would re-run them from the start for every chunk)
+WHOLE_RUN_ENGINES = {'vectorised'}
+
+
+##############################################################################
+# Random cases
+##############################################################################
+#
+# Function to generate a random test case
+def random_case(rng):
+    states = rng.randint(1, MAX_STATES)
+    transitions = []
+    for state in range(1, states + 1):
+        for symbol in TAPE_SYMBOLS + (ERROR_SYMBOL,):
+            if rng.random() < MISSING_RATE:
+                continue
+            write = ERROR_SYMBOL if rng.random() < ERROR_RATE else rng.choice(TAPE_SYMBOLS)
+            kind = rng.random()
+            if kind < FAR_JUMP_RATE:
+                step = rng.choice((-1, 1)) * rng.randint(SPARSE_JUMP, 4 * SPARSE_JUMP)
+            elif kind < FAR_JUMP_RATE + GAP_JUMP_RATE:
+                step = rng.choice((-1, 1)) * rng.randint(SEGMENT_GAP, 2 * SEGMENT_GAP)  # Just in or out of reach of a segment
+            elif kind < FAR_JUMP_RATE + GAP_JUMP_RATE + LONG_JUMP_RATE:
+                step = rng.choice((-1, 1)) * rng.randint(MAX_JUMP + 1, SEGMENT_PAD - 1)  # Leaves short gaps between segments
+            elif kind < FAR_JUMP_RATE + GAP_JUMP_RATE + LONG_JUMP_RATE + JUMP_RATE:
+                step = rng.randint(-MAX_JUMP, MAX_JUMP)
+            else:
+                step = rng.choice((-1, 1))
+            kind = rng.random()
+            if kind < HALT_RATE:
+                next_state = 0
+            elif kind < HALT_RATE + NO_CARD_RATE:
+                next_state = states + 1
+            else:
+                next_state = rng.randint(1, states)
+            transitions.append([state, symbol, write, step, next_state])
+    tape = [rng.choice(TAPE_SYMBOLS) for _ in range(rng.randint(0, MAX_TAPE_LENGTH))]
+    return Case(transitions, tape, rng.randint(-2, len(tape) + 1))
+
+
+##############################################################################
+# Lockstep runs
+##############################################################################
+#
+# Function to describe a tape by its extent and its runs of non-fill cells (as (first index, symbols) pairs), which is
+# the same for equal tapes, however their cells are held or coded
+def tape_snapshot(tape):
+    alphabet = tape.alphabet
+    non_fill = bytes(int(code != tape.fill_code) for code in range(256))
+    runs = []
+    for (start, cells) in tape.segment_cells():
+        marks = cells.translate(non_fill)   # 1 for each non-fill cell, so that runs can be found with (fast) find()
+        position = marks.find(1)
+        while position >= 0:
+            end = marks.find(0, position)
+            end = len(marks) if end < 0 else end
+            runs.append((start + position, tuple(map(alphabet.__getitem__, cells[position:end]))))
+            position = marks.find(1, end)
+    return (tape.first_index, tape.last_index, tuple(runs))
+
+
+# One machine (an engine running a case), which can be advanced by any number of steps at a time
+class _Machine:
+    def __init__(self, factory, tape_class, case):
+        self.tape = tape_class(case.tape)
+        self.tape_index = case.start
+        self.card_index = START_CARD_INDEX
+        self.steps = 0
+        self.outcome = None         # Set once the machine stops: 'HALTED', the missing transition, or the engine's error
+        self.advance = factory(program_from_transitions(case.transitions), self.tape)
+
+    #
+    # Advance the machine by (at most) the given number of steps
+    def run(self, steps):
+        target = self.steps + steps
+        try:
+            while self.outcome is None and self.steps < target:
+                (self.tape_index, self.card_index, taken) = self.advance(self.tape_index, self.card_index, target - self.steps)
+                self.steps += taken
+                if self.card_index == 0:
+                    self.outcome = 'HALTED'
+                elif taken == 0:
+                    self.outcome = 'STUCK'      # An engine which takes no steps, without having halted, is broken
+        except MissingTransition as missing:
+            (self.tape_index, self.card_index) = (missing.tape_index, missing.state)
+            self.steps += missing.steps
+            self.outcome = 'MISSING {!r}'.format(missing.args[0])
+        except Exception as error:
+            self.outcome = 'ERROR {!r}'.format(error)
+
+    #
+    # Everything an engine must agree with the reference stepper on: (steps, outcome, head, state, tape)
+    def snapshot(self):
+        return (self.steps, self.outcome, self.tape_index, self.card_index, tape_snapshot(self.tape))
+
+
+# Function to run engines in lockstep with the reference stepper on a case (sharing one reference run between them),
+# for at most 'max_steps' steps. Any of the 'WHOLE_RUN_ENGINES' are instead run in one go, and compared with where the
+# reference stepper ended up. Returns a list of the 'Divergence's at the first steps where they differ (for those
+# engines which do), and the number of steps the reference stepper ran
+def check_case(case, engines, max_steps=DEFAULT_MAX_STEPS):
+    reference = _Machine(reference_engine, Tape, case)
+    machines = {engine: _Machine(*TEST_ENGINES[engine], case) for engine in engines if engine not in WHOLE_RUN_ENGINES}
+    whole_run_engines = [engine for engine in engines if engine in WHOLE_RUN_ENGINES]
+    divergences = []
+    (checked, interval) = (0, 1)
+    while (machines or whole_run_engines) and checked < max_steps:
+        chunk = min(interval, max_steps - checked)
+        reference.run(chunk)
+        checked += chunk
+        expected = reference.snapshot()
+        for (engine, machine) in list(machines.items()):
+            machine.run(chunk)
+            if machine.snapshot() != expected:
+                divergences.append(_locate_divergence(case, engine, checked))
+                del machines[engine]
+        if reference.outcome is not None:
+            break
+        interval = min(2 * interval, MAX_CHECK_INTERVAL)
+    for engine in whole_run_engines:
+        machine = _Machine(*TEST_ENGINES[engine], case)
+        machine.run(checked)
+        if machine.snapshot() != reference.snapshot():
+            divergences.append(_locate_divergence(case, engine, checked))
+    return (divergences, reference.steps)
+
+
+# Function to run each of the given engines (but for the vectorised one, which works on its own array of cells) on
+# FAR_JUMP_CASE, starting on a 'Tape'. Returns the engines which didn't switch the tape over to a 'SparseTape'
+def check_far_jumps(engines):
+    dense = []
+    for engine in engines:
+        if engine == 'vectorised':
+            continue
+        machine = _Machine(TEST_ENGINES[engine][0], Tape, FAR_JUMP_CASE)
+        machine.run(DEFAULT_MAX_STEPS)
+        if machine.outcome != 'HALTED' or not isinstance(machine.tape, SparseTape):
+            dense.append(engine)
+    return dense
+
+
+# Function to run one engine alongside the reference stepper on a case, returning the 'Divergence' at the first
+# step where they differ (or None if they never do)
+def first_divergence(case, engine, max_steps=DEFAULT_MAX_STEPS):
+    (divergences, _) = check_case(case, [engine], max_steps)
+    return divergences[0] if divergences else None
+
+
+# Function to find the first step (up to 'max_steps') at which an engine and the reference stepper differ, by re-running
+# them both from the start, comparing them after every step. One of the 'WHOLE_RUN_ENGINES' is instead re-run in one go
+# for each step it is compared at, and those steps are found by bisection (so it is re-run a few dozen times, rather
+# than once for every step)
+def _locate_divergence(case, engine, max_steps):
+    if engine in WHOLE_RUN_ENGINES:
+        return _bisect_divergence(case, engine, max_steps)
+    (factory, tape_class) = TEST_ENGINES[engine]
+    reference = _Machine(reference_engine, Tape, case)
+    machine = _Machine(factory, tape_class, case)
+    for step in range(max_steps + 1):
+        (expected, found) = (reference.snapshot(), machine.snapshot())
+        if expected != found:
+            return _divergence(engine, case, step, expected, found)
+        reference.run(1)
+        machine.run(1)
+    return None     # Not reached (unless the engine isn't deterministic)
+
+
+# Function to find a step (up to 'max_steps') at which a whole-run engine differs from the reference stepper, having
+# agreed with it the step before, by bisection (taking it that once they differ, they go on differing)
+def _bisect_divergence(case, engine, max_steps):
+    (factory, tape_class) = TEST_ENGINES[engine]
+    def snapshots(steps):
+        (reference, machine) = (_Machine(reference_engine, Tape, case), _Machine(factory, tape_class, case))
+        reference.run(steps)
+        machine.run(steps)
+        return (reference.snapshot(), machine.snapshot())
+    (expected, found) = snapshots(0)
+    if expected != found:
+        return _divergence(engine, case, 0, expected, found)
+    (expected, found) = snapshots(max_steps)
+    if expected == found:
+        return None     # Not reached (unless the engine isn't deterministic)
+    (agreed, differed) = (0, max_steps)
+    while differed - agreed > 1:
+        step = (agreed + differed) // 2
+        if len(set(snapshots(step))) == 1:
+            agreed = step
+        else:
+            differed = step
+    (expected, found) = snapshots(differed)
+    return _divergence(engine, case, differed, expected, found)
+
+
+# Function to describe the divergence of an engine from the reference stepper at the given step
+def _divergence(engine, case, step, expected, found):
+    fields = [name for (name, expected_value, found_value) in
+              zip(('steps', 'outcome', 'head', 'state', 'tape'), expected, found) if expected_value != found_value]
+    return Divergence(engine, case, step, fields, expected, found)
+
+
+##############################################################################
+# Shrinking
+##############################################################################
+#
+# Generator of the cases which are one simplification away from the given one, roughly biggest simplification first
+def _simplifications(case):
+    (transitions, tape, start) = case
+    states = sorted({transition[0] for transition in transitions})
+    for state in states:
+        yield case._replace(transitions=[transition for transition in transitions if transition[0] != state])
+    for number in range(len(transitions)):
+        yield case._replace(transitions=transitions[:number] + transitions[number + 1:])
+    if tape:
+        yield Case(transitions, tape[1:], start - 1)
+        yield case._replace(tape=tape[:-1])
+    for number, (state, symbol, write, step, next_state) in enumerate(transitions):
+        simpler = []
+        if next_state != 0:
+            simpler.append([state, symbol, write, step, 0])
+        if write != symbol:
+            simpler.append([state, symbol, symbol, step, next_state])
+        for smaller_step in sorted({0, (step > 0) - (step < 0), int(step / 2)}, key=abs):
+            if abs(smaller_step) < abs(step):
+                simpler.append([state, symbol, write, smaller_step, next_state])
+        for transition in simpler:
+            yield case._replace(transitions=transitions[:number] + [transition] + transitions[number + 1:])
+    for number, symbol in enumerate(tape):
+        if symbol != TAPE_SYMBOLS[0]:
+            yield case._replace(tape=tape[:number] + [TAPE_SYMBOLS[0]] + tape[number + 1:])
+    if start != 0:
+        yield case._replace(start=start - (start > 0) + (start < 0))
+
+
+# Function to shrink a divergence to (locally) minimal case, which still makes the same engine diverge from the
+# reference stepper within 'max_steps' steps. Returns the divergence for the shrunk case
+def shrink(divergence, max_steps=DEFAULT_MAX_STEPS):
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for case in _simplifications(divergence.case):
+            simpler_divergence = first_divergence(case, divergence.engine, max_steps)
+            if simpler_divergence is not None:
+                divergence = simpler_divergence
+                shrunk = True
+                break
+    return divergence
+
+
+##############################################################################
+# Test runs
+##############################################################################
+#
+# Function to run 'cases' random cases (from the given seed) on each of the given engines, shrinking every divergence
+# found. Returns the (shrunk) divergences and the total number of reference steps the engines were checked over
+# (each engine being run for as many steps)
+def run_tests(cases=DEFAULT_CASES, max_steps=DEFAULT_MAX_STEPS, seed=0, engines=None, report=None):
+    rng = random.Random(seed)
+    engines = list(TEST_ENGINES) if engines is None else engines
+    divergences = []
+    total_steps = 0
+    for number in range(cases):
+        case = random_case(rng)
+        (case_divergences, steps) = check_case(case, engines, max_steps)
+        total_steps += steps
+        for divergence in case_divergences:
+            divergence = shrink(divergence, max_steps)
+            divergences.append(divergence)
+            if report is not None:
+                report(number, divergence)
+    return (divergences, total_steps)
+
+
+# Function to describe a divergence, over several lines
+def describe_divergence(divergence):
+    (expected, found) = (divergence.expected, divergence.found)
+    lines = ['{} diverges from the reference stepper at step {} ({} differ)'.format(divergence.engine, divergence.step,
+                                                                                   ', '.join(divergence.fields)),
+             '  program (state, symbol, write, step, next state):-']
+    lines += ['    {!r}'.format(transition) for transition in divergence.case.transitions]
+    lines.append('  tape:- {!r}  start tape index:- {}'.format(divergence.case.tape, divergence.case.start))
+    for (name, snapshot) in (('reference', expected), (divergence.engine, found)):
+        (steps, outcome, tape_index, card_index, (first_index, last_index, runs)) = snapshot
+        lines.append('  {}:- steps {}  outcome {}  tape index {}  card index {}  tape extent [{}, {}]  non-fill {}'.format(
+                     name, steps, outcome, tape_index, card_index, first_index, last_index, list(runs)))
+    return '\n'.join(lines)
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to parse the command line, and run the tests (exiting with status 1 if any engine diverged)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check every engine against the reference stepper on random programs and tapes')
+    parser.add_argument('--cases', type=int, default=DEFAULT_CASES, help='Number of random cases')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS, help='Maximum number of steps per case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engines', help='Comma separated engines to test (default: {})'.format(','.join(TEST_ENGINES)))
+    parser.add_argument('--save', help='Directory to save the shrunk failing programs to')
+    args = parser.parse_args(argv)
+
+    engines = args.engines.split(',') if args.engines else None
+    start_time = time.perf_counter()
+    def report(number, divergence):
+        print('Case {}:- {}\n'.format(number, describe_divergence(divergence)))
+        if args.save:
+            os.makedirs(args.save, exist_ok=True)
+            save_program(program_from_transitions(divergence.case.transitions),
+                         os.path.join(args.save, 'case_{}_{}.tm'.format(number, divergence.engine)))
+    dense = check_far_jumps(engines or list(TEST_ENGINES))
+    for engine in dense:
+        print('{} did not switch to a SparseTape on a far jump'.format(engine))
+    (divergences, total_steps) = run_tests(args.cases, args.max_steps, args.seed, engines, report)
+    print('Checked {} cases on {} engines ({} steps each, {:.1f}s):- {} divergences'.format(
+          args.cases, len(engines or TEST_ENGINES), total_steps, time.perf_counter() - start_time, len(divergences)))
+    if divergences or dense:
+        raise SystemExit(1)
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
@@ -0,0 +1,419 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing an exhaustive search of small
+# machines (in the style of the busy beaver search), which runs every 2-symbol, n-state machine
+# (stepping +/-1, on a blank tape of 0s) and reports the ones which run longest before halting,
+# and which leave the most 1's on the tape.
+#
+# Rather than generating every possible program and running each one from scratch, machines are
+# enumerated in 'tree normal form': a machine starts with no transitions at all, and is run until
+# it needs a transition it doesn't have. At that point it is, in effect, a halting machine (with
+# the missing transition made a halt, which writes a 1), and it is then extended in every way that
+# missing transition could be filled in, each extension carrying on from where the run got to. So
+# transitions which a machine never uses are never enumerated, and machines are only generated in
+# a canonical form:
+#
+#   - states are numbered in the order the machine first enters them (so a transition can only go
+#     to a state it has already used, or to the next new one), which removes the n! renumberings
+#   - the first transition steps right (every machine stepping left first is a mirror image of one
+#     stepping right), and goes to state 2 (staying in state 1 would run off along the blank tape)
+#   - a machine with just one missing transition left is only recorded as halting
+#
+# Each machine is classified as early as possible: it is run first with the loop detector (see
+# 'TMulator_loops.py') for 'loop_steps' steps, then up to 'max_steps' steps watching for it to be
+# a 'translated cycler' (one which marches off along the tape, leaving a repeating pattern behind
+# it, see '_run_watching_records()'), and ends up as halted (a missing transition), looping, or
+# undecided (a 'holdout').
+#
+# The tree is expanded to a fixed depth, and the subtrees below that depth ('shards') are searched
+# over a pool of worker processes. Finished shards are appended to a progress file (one JSON line
+# each), so an interrupted search picks up where it left off. From the command line, e.g.:
+#
+# python TMulator_enumerate.py 3
+# python TMulator_enumerate.py 4 --max-steps 2000 --progress bb4.jsonl --processes 8
+#
+# Machines are written in the usual compact notation, e.g. '1RB1RZ_1LB0RC_1LC1LA' for BUSY_BEAVER_3
+# (states A, B, C, ... for 1, 2, 3, ..., Z for halt, '---' for a transition the machine never needs),
+# and 'program_from_text()' turns one back into a program in the usual card format.
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from TMulator_compiled import HALT_STATE, MissingTransition, compile_program
+from TMulator_loops import LoopDetected, LoopDetector
+from TMulator_tape import Tape
+
+##############################################################################
+# Enumeration parameters
+##############################################################################
+#
+# Various top-level parameters
+START_CARD_INDEX = 1                # We always start on card index 1, and stop (halt) on card index 0
+SYMBOLS = (0, 1)                    # The blank (0), and 1
+DEFAULT_MAX_STEPS = 1000            # A machine still running after this many steps is a holdout
+DEFAULT_LOOP_STEPS = 300            # Steps run with the loop detector, before watching for translated cyclers
+TRANSLATION_WINDOW = 64             # The most cells behind the head compared when looking for a translated cycler
+DEFAULT_SHARD_DEPTH = 4             # Number of transitions defined in the machines at the roots of the shards
+SHARDS_PER_BATCH = 16               # Shards sent to a worker process at a time (most shards are tiny)
+DEFAULT_TOP = 10                    # Number of machines kept in each top list
+STATE_LETTERS = 'ZABCDEFGHIJKLMNOPQRSTUVWXY'    # Letter for each state (Z for the halting state 0)
+
+#
+# The outcome of a search. 'machines' is the number of (partial) machines run, which 'halted' (needing a missing
+# transition), 'looped', or were 'undecided' after 'max_steps' steps (the 'holdouts', as machine texts). 'top_steps'
+# and 'top_ones' are lists of (steps, ones, machine text) for the halting machines which ran longest, and which
+# left the most 1's
+EnumerationResult = namedtuple('EnumerationResult', ['states', 'machines', 'halted', 'looped', 'undecided',
+                                                     'top_steps', 'top_ones', 'holdouts'])
+
+
+##############################################################################
+# Machines
+##############################################################################
+#
+# Function to write a machine (a dict of (state, symbol) -> (write, step, next state)) in the compact notation, with
+# an optional halting transition (state, symbol) shown as '1RZ'
+def machine_text(table, states, halt=None):
+    entries = []
+    for state in range(1, states + 1):
+        for symbol in SYMBOLS:
+            if (state, symbol) == halt:
+                entries.append('1RZ')
+            elif (state, symbol) in table:
+                (write, step, next_state) = table[(state, symbol)]
+                entries.append('{}{}{}'.format(write, 'R' if step > 0 else 'L', STATE_LETTERS[next_state]))
+            else:
+                entries.append('---')
+        entries.append('_')
+    return ''.join(entries[:-1])
+
+
+# Function to turn a machine in the compact notation into a program in the usual card format (with '---' transitions
+# left out, so that the program stops with a missing transition if it ever needs one)
+def program_from_text(text):
+    state_machine = {HALT_STATE: 'Placemarker card for halting state 0'}
+    for state, card_text in enumerate(text.split('_'), 1):
+        card = state_machine[state] = {}
+        for symbol, entry in zip(SYMBOLS, (card_text[:3], card_text[3:])):
+            if entry != '---':
+                card[symbol] = {'write': int(entry[0]), 'step': +1 if entry[1] == 'R' else -1,
+                                'next_state': STATE_LETTERS.index(entry[2])}
+    return state_machine
+
+
+# Function to turn a machine (as a dict of transitions) into a program in the usual card format
+def _program(table):
+    state_machine = {HALT_STATE: 'Placemarker card for halting state 0'}
+    for (state, symbol), (write, step, next_state) in table.items():
+        state_machine.setdefault(state, {})[symbol] = {'write': write, 'step': step, 'next_state': next_state}
+    return state_machine
+
+
+##############################################################################
+# Translated cyclers
+##############################################################################
+#
+# A machine is a translated cycler if at two steps t1 < t2 it is in the same state on a new rightmost cell (one beyond
+# every cell visited so far, so that the tape beyond it is blank), at p1 and then at p2, and the w cells behind the head
+# are the same both times, where w is how far back behind p1 the head went between t1 and t2. From t2 on it then does
+# just what it did from t1, shifted along by p2 - p1 cells (as it only reads those w cells, and the blank tape beyond
+# the head), and so on forever. Likewise for new leftmost cells. The loop detector's check for runs off into blank
+# tape is the case w = 0, so it misses the machines which step back over what they have just written.
+#
+# Function to check for a translated cycler, when the head has reached a new cell on one side ('direction' being +1 for
+# the right and -1 for the left). 'records' are the earlier times it did so, as [step, head, row offset, window, back]
+# lists, where 'window' holds the TRANSLATION_WINDOW cells behind the head then, and 'back' is how far back the head
+# went before the next record ('back' being how far back it has gone since the latest one). Returns the earlier record
+# which the machine repeats (or None if there isn't one), having added this one to the records
+def _check_records(records, direction, tape, step, head, row_offset, back):
+    if records:
+        records[-1][4] = back
+    furthest_back = head
+    for record in reversed(records):
+        (record_step, record_head, record_row_offset, window, record_back) = record
+        furthest_back = min(furthest_back, record_back) if direction > 0 else max(furthest_back, record_back)
+        width = (record_head - furthest_back) * direction
+        if record_row_offset == row_offset and width <= TRANSLATION_WINDOW:
+            if direction > 0:
+                (behind, record_behind) = (tape.codes(head - width, head), window[TRANSLATION_WINDOW - width:])
+            else:
+                (behind, record_behind) = (tape.codes(head + 1, head + 1 + width), window[:width])
+            if behind == record_behind:
+                return record
+    if direction > 0:
+        window = tape.codes(head - TRANSLATION_WINDOW, head)
+    else:
+        window = tape.codes(head + 1, head + 1 + TRANSLATION_WINDOW)
+    records.append([step, head, row_offset, window, head])
+    return None
+
+
+# Function to run a machine on (as 'run_compiled()' does, but a step at a time) from a configuration after 'steps'
+# steps, by at most 'max_steps' steps, watching for it to be a translated cycler. Returns the new tape index and state
+# and the number of steps taken, or raises a 'LoopDetected' (or a 'MissingTransition')
+def _run_watching_records(compiled, tape, tape_index, state, max_steps, steps):
+    (width, states) = (compiled.width, compiled.states)
+    (write_table, step_table, next_table) = (compiled.write_table, compiled.step_table, compiled.next_table)
+    row_offset = compiled.state_rows[state] * width
+    (first_index, last_index) = (min(tape_index, tape.first_index), max(tape_index, tape.last_index))
+    (right_records, left_records) = ([], [])
+    (right_back, left_back) = (tape_index, tape_index)
+    (cells, origin) = tape.cells_at(tape_index)
+    taken = 0
+    while taken < max_steps and row_offset > 0:
+        position = tape_index + origin
+        if not 0 <= position < len(cells):
+            (cells, origin) = tape.cells_at(tape_index)
+            position = tape_index + origin
+        index = row_offset + cells[position]
+        if next_table[index] < 0:
+            state = states[row_offset // width]
+            raise MissingTransition(tape[tape_index] if state in compiled.card_states else state, tape_index, state, taken)
+        cells[position] = write_table[index]
+        tape_index += step_table[index]
+        row_offset = next_table[index]
+        taken += 1
+        #
+        # Keep track of how far back the head has gone since its latest record on each side, and check each new record
+        if tape_index < right_back:
+            right_back = tape_index
+        if tape_index > left_back:
+            left_back = tape_index
+        record = None
+        if tape_index > last_index:
+            last_index = tape_index
+            record = _check_records(right_records, +1, tape, steps + taken, tape_index, row_offset, right_back)
+            right_back = tape_index
+        elif tape_index < first_index:
+            first_index = tape_index
+            record = _check_records(left_records, -1, tape, steps + taken, tape_index, row_offset, left_back)
+            left_back = tape_index
+        if record is not None:
+            (record_step, record_head) = record[:2]
+            raise LoopDetected(steps + taken - record_step, record_step, tape_index - record_head, tape_index,
+                               states[row_offset // width], taken)
+    return (tape_index, states[row_offset // width], taken)
+
+
+##############################################################################
+# Searching a subtree
+##############################################################################
+#
+# Search state for one subtree: counts, top lists and holdouts
+class _Tally:
+    def __init__(self, top):
+        self.top = top
+        self.machines = self.halted = self.looped = self.undecided = 0
+        self.top_steps = []
+        self.top_ones = []
+        self.holdouts = []
+
+    def record_halt(self, steps, ones, text):
+        self.halted += 1
+        self.top_steps = sorted(self.top_steps + [(steps, ones, text)], key=lambda entry: (-entry[0], -entry[1], entry[2]))[:self.top]
+        self.top_ones = sorted(self.top_ones + [(steps, ones, text)], key=lambda entry: (-entry[1], -entry[0], entry[2]))[:self.top]
+
+    def merge(self, other):
+        self.machines += other['machines']
+        self.looped += other['looped']
+        self.undecided += other['undecided']
+        self.holdouts += other['holdouts']
+        self.halted += other['halted']
+        self.top_steps = sorted(self.top_steps + [tuple(entry) for entry in other['top_steps']],
+                                key=lambda entry: (-entry[0], -entry[1], entry[2]))[:self.top]
+        self.top_ones = sorted(self.top_ones + [tuple(entry) for entry in other['top_ones']],
+                               key=lambda entry: (-entry[1], -entry[0], entry[2]))[:self.top]
+
+    def as_dict(self):
+        return {'machines': self.machines, 'halted': self.halted, 'looped': self.looped, 'undecided': self.undecided,
+                'top_steps': self.top_steps, 'top_ones': self.top_ones, 'holdouts': self.holdouts}
+
+
+# Function to list the ways a missing transition can be filled in, in canonical order, given the highest state the
+# machine has used so far
+def _extensions(highest_state, states):
+    return [(write, step, next_state) for next_state in range(1, min(highest_state + 1, states) + 1)
+            for write in SYMBOLS for step in (-1, +1)]
+
+
+# Function to run one (partial) machine on from a configuration, until it needs a missing transition, loops, or runs out
+# of steps. Records the outcome in the tally, and returns the machines which extend it (each with the configuration to
+# carry on from), which is an empty list unless it needed a missing transition
+def _run_machine(table, configuration, states, max_steps, loop_steps, tally):
+    (tape, tape_index, state, steps) = configuration
+    tally.machines += 1
+    compiled = compile_program(_program(table), symbols=SYMBOLS)
+    try:
+        if steps < loop_steps:
+            (tape_index, state, taken) = LoopDetector(compiled, tape).advance(tape_index, state, loop_steps - steps)
+            steps += taken
+        (tape_index, state, taken) = _run_watching_records(compiled, tape, tape_index, state, max_steps - steps, steps)
+        steps += taken
+        tally.undecided += 1
+        tally.holdouts.append(machine_text(table, states))
+        return []
+    except LoopDetected:
+        tally.looped += 1
+        return []
+    except MissingTransition as missing:
+        (tape_index, state, steps) = (missing.tape_index, missing.state, steps + missing.steps)
+
+    #
+    # The machine needs a transition it doesn't have, so it halts there (writing a 1), and is extended in every way
+    symbol = tape[tape_index]
+    ones = sum(cells.count(tape.symbol_codes[1]) for (_, cells) in tape.segment_cells()) - (symbol == 1) + 1
+    tally.record_halt(steps + 1, ones, machine_text(table, states, halt=(state, symbol)))
+    if len(table) >= 2 * states - 1:
+        return []
+    highest_state = max([state] + [next_state for (_, _, next_state) in table.values()])
+    return [({**table, (state, symbol): extension}, (tape.copy(), tape_index, state, steps))
+            for extension in _extensions(highest_state, states)]
+
+
+# Function to search the subtree below a machine, depth first, starting from a blank tape. Returns the tally as a dict.
+# If 'stop_depth' is given, then machines with that many transitions are not run, but are returned (in canonical order)
+def search_subtree(table, states, max_steps=DEFAULT_MAX_STEPS, loop_steps=DEFAULT_LOOP_STEPS, top=DEFAULT_TOP, stop_depth=None):
+    tally = _Tally(top)
+    frontier = []
+    pending = [(table, (Tape([SYMBOLS[0]], alphabet=SYMBOLS), 0, START_CARD_INDEX, 0))]
+    while pending:
+        (table, configuration) = pending.pop()
+        if stop_depth is not None and len(table) >= stop_depth:
+            frontier.append(table)
+            continue
+        if not table:
+            extensions = _root_extensions(tally, states)
+        else:
+            extensions = _run_machine(table, configuration, states, max_steps, loop_steps, tally)
+        pending.extend(reversed(extensions))    # So that they are popped in canonical order
+    return (tally, frontier)
+
+
+# Function to handle the machine with no transitions at all, which halts on its first step, and the pruned ways to
+# fill in its first transition (stepping right, into state 2)
+def _root_extensions(tally, states):
+    tally.machines += 1
+    tally.record_halt(1, 1, machine_text({}, states, halt=(START_CARD_INDEX, SYMBOLS[0])))
+    if states == 1:
+        return []       # Staying in state 1 would run off along the blank tape forever
+    return [({(START_CARD_INDEX, SYMBOLS[0]): (write, +1, 2)}, (Tape([SYMBOLS[0]], alphabet=SYMBOLS), 0, START_CARD_INDEX, 0))
+            for write in SYMBOLS]
+
+
+# Function to search one shard (run in a worker process), returning its tally as a dict
+def _search_shard(shard_table, states, max_steps, loop_steps, top):
+    table = {(state, symbol): tuple(action) for (state, symbol, *action) in shard_table}
+    return search_subtree(table, states, max_steps, loop_steps, top)[0].as_dict()
+
+
+##############################################################################
+# Sharded search
+##############################################################################
+#
+# Function to search every 2-symbol machine with the given number of states, sharding the search across a pool of
+# worker processes. If a 'progress_path' is given then each finished shard is appended to it, and shards already
+# there (from an earlier, interrupted search with the same settings) are not searched again. Returns an 'EnumerationResult'.
+def enumerate_machines(states, max_steps=DEFAULT_MAX_STEPS, loop_steps=DEFAULT_LOOP_STEPS, processes=None,
+                       shard_depth=DEFAULT_SHARD_DEPTH, top=DEFAULT_TOP, progress_path=None, report_progress=None):
+    #
+    # Expand the top of the tree here, to find the shards (which is quick, and always gives the same shards)
+    (tally, frontier) = search_subtree({}, states, max_steps, loop_steps, top, stop_depth=shard_depth)
+    shards = [sorted([state, symbol] + list(action) for (state, symbol), action in table.items()) for table in frontier]
+
+    #
+    # Read back the shards already done, checking that they were for the same search
+    settings = {'states': states, 'max_steps': max_steps, 'loop_steps': loop_steps, 'translation_window': TRANSLATION_WINDOW,
+                'shard_depth': shard_depth, 'shards': len(shards)}
+    done = {}
+    if progress_path is not None and os.path.exists(progress_path):
+        with open(progress_path) as progress_file:
+            lines = [json.loads(line) for line in progress_file if line.strip()]
+        if lines and lines[0] != {'settings': settings}:
+            raise ValueError('{} is the progress of a different search ({})'.format(progress_path, lines[0]))
+        done = {line['shard']: line['tally'] for line in lines[1:] if 'tally' in line}
+    progress_file = None
+    if progress_path is not None:
+        progress_file = open(progress_path, 'a')
+        if not done and os.path.getsize(progress_path) == 0:
+            progress_file.write(json.dumps({'settings': settings}) + '\n')
+
+    #
+    # Search the remaining shards over the pool, in batches, writing each one to the progress file as it comes back
+    try:
+        with ProcessPoolExecutor(max_workers=processes or os.cpu_count() or 1) as executor:
+            remaining = [number for number in range(len(shards)) if number not in done]
+            tallies = executor.map(_search_shard, [shards[number] for number in remaining], repeat(states),
+                                   repeat(max_steps), repeat(loop_steps), repeat(top), chunksize=SHARDS_PER_BATCH)
+            for (number, shard_tally) in zip(remaining, tallies):
+                done[number] = shard_tally
+                if progress_file is not None:
+                    progress_file.write(json.dumps({'shard': number, 'tally': shard_tally}) + '\n')
+                    progress_file.flush()
+                if report_progress is not None:
+                    report_progress(len(done), len(shards))
+    finally:
+        if progress_file is not None:
+            progress_file.close()
+
+    #
+    # Merge the shards (in shard order, so that the result doesn't depend on the order they finished in)
+    for number in range(len(shards)):
+        tally.merge(done[number])
+    return EnumerationResult(states, tally.machines, tally.halted, tally.looped, tally.undecided, tally.top_steps,
+                             tally.top_ones, tally.holdouts)
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to parse the command line, run the search and report on it
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search every 2-symbol, n-state machine (busy beaver style)')
+    parser.add_argument('states', type=int, help='Number of states')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS, help='Steps after which a machine is a holdout')
+    parser.add_argument('--loop-steps', type=int, default=DEFAULT_LOOP_STEPS, help='Steps run with the loop detector')
+    parser.add_argument('--processes', type=int, default=None, help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--shard-depth', type=int, default=DEFAULT_SHARD_DEPTH)
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='Number of machines to list by steps and by ones')
+    parser.add_argument('--progress', help='Progress file, for resuming an interrupted search')
+    parser.add_argument('--holdouts', help='Write the holdouts to this file (one machine per line)')
+    args = parser.parse_args(argv)
+
+    result = enumerate_machines(args.states, args.max_steps, args.loop_steps, args.processes, args.shard_depth, args.top,
+                                args.progress)
+    print('Machines:- {}  halted:- {}  looped:- {}  undecided:- {}'.format(result.machines, result.halted, result.looped,
+                                                                          result.undecided))
+    print('\nMost steps:-')
+    for (steps, ones, text) in result.top_steps:
+        print('  {:>10} steps  {:>6} ones  {}'.format(steps, ones, text))
+    print('\nMost ones:-')
+    for (steps, ones, text) in result.top_ones:
+        print('  {:>10} steps  {:>6} ones  {}'.format(steps, ones, text))
+    if args.holdouts:
+        with open(args.holdouts, 'w') as holdouts_file:
+            holdouts_file.writelines(text + '\n' for text in result.holdouts)
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
@@ -0,0 +1,195 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a live trace, for watching
+# long runs as they go, without slowing them down to the speed of printing.
+#
+# 'FullTrace' prints the whole tape after every step, which costs time in proportion to the
+# length of the tape, on every step. 'LiveTrace' is a trace sink for 'run()' which instead
+# shows a window onto the tape (a fixed number of cells around the head), along with the time
+# step, state and speed, and redraws it in place with terminal control sequences. Only the
+# cells which have changed since the last frame are rewritten, and the window only moves when
+# the head gets near one of its edges (when it jumps half a window along). Frames are drawn at
+# (at most) a target frame rate, and in between the engine runs at full speed: the sink sets
+# its own 'every' (the number of steps 'run()' takes between calls to it) from the speed the
+# engine is going at, so that it is called about once per frame.
+#
+# If the output isn't a terminal, then each frame is printed as a line of its own instead. From
+# the command line, e.g.:
+#
+# python TMulator_live.py PROGRAM_10 TAPE_06 START_CELL_INDEX_06 --max-steps 100000000
+# python TMulator_live.py BUSY_BEAVER_5 TAPE_08 0 --fps 10 --width 100
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import os
+import sys
+import time
+
+##############################################################################
+# Live trace parameters
+##############################################################################
+#
+# Various top-level parameters
+DEFAULT_FPS = 20                # Frames drawn per second (at most)
+DEFAULT_WIDTH = 64              # Number of cells in the window onto the tape
+CELL_WIDTH = 2                  # Characters per cell (each symbol is right-aligned in its cell, and cut short if too long)
+WINDOW_MARGIN = 1 / 8           # The window moves when the head is within this fraction of the window from an edge
+MAX_EVERY = 1 << 24             # The most steps we let the engine take between calls
+MAX_EVERY_GROWTH = 4            # ... and the most 'every' can grow by from one call to the next
+CLEAR_LINE = '\x1b[2K'          # Terminal control sequences: clear the current line, ...
+LINES_UP = '\x1b[{}F'           # ... move to the start of the line so many lines up, ...
+NEXT_LINE = '\x1b[E'            # ... move to the start of the next line, ...
+COLUMN = '\x1b[{}G'             # ... and move to a column (counting from 1) of the current line
+FRAME_LINES = 3                 # A frame is the status line, the tape line and the head line
+
+
+##############################################################################
+# Live trace sink
+##############################################################################
+#
+class LiveTrace:
+    #
+    # Set up a live trace, writing to 'file' (standard output by default), with control sequences if it is a terminal
+    # (or 'ansi' says so)
+    def __init__(self, width=DEFAULT_WIDTH, fps=DEFAULT_FPS, file=None, ansi=None):
+        self.width = width
+        self.frame_time = 1 / fps
+        self.file = file or sys.stdout
+        self.ansi = self.file.isatty() if ansi is None else ansi
+        self.every = 1
+        self.speed = 0                  # Steps per second, as last measured
+        self.last_call = None           # (time, time step) of the last call
+        self.last_frame_time = None
+        self.latest = None              # The arguments of the latest call, for 'flush()'
+        self.window_start = None        # The tape index of the first cell in the window
+        self.cells = None               # The text of each cell in the window, as last drawn
+        self.head_column = None         # Where the head marker was last drawn
+        self.frames = 0
+
+    #
+    # Called by 'run()' every 'every' steps. Works out a new 'every' from the speed of the engine, and draws a frame if
+    # one is due (or if the machine has halted)
+    def __call__(self, time_step, current_tape, current_tape_index, current_card_index):
+        now = time.perf_counter()
+        self.latest = (time_step, current_tape, current_tape_index, current_card_index)
+        if self.last_call is not None:
+            (last_time, last_time_step) = self.last_call
+            if now > last_time and time_step > last_time_step:
+                self.speed = (time_step - last_time_step) / (now - last_time)
+                self.every = max(1, min(int(self.speed * self.frame_time), self.every * MAX_EVERY_GROWTH, MAX_EVERY))
+        self.last_call = (now, time_step)
+        if self.last_frame_time is None or now - self.last_frame_time >= self.frame_time or current_card_index == 0:
+            self._draw(now, *self.latest)
+
+    #
+    # Draw the latest state, if it hasn't been (e.g. once the run has reached its maximum number of steps)
+    def flush(self):
+        if self.latest is not None and self.last_frame_time != self.last_call[0]:
+            self._draw(self.last_call[0], *self.latest)
+
+    #
+    # Draw a frame, updating the previous one in place if we can
+    def _draw(self, now, time_step, current_tape, current_tape_index, current_card_index):
+        #
+        # Move the window (by half its width, or to centre it on the head if the head has jumped well outside it) if
+        # the head is near either edge of it
+        width = self.width
+        margin = max(1, int(width * WINDOW_MARGIN))
+        half = width // 2
+        inside = lambda start: start + margin <= current_tape_index < start + width - margin
+        redraw = self.window_start is None or not self.ansi
+        if self.window_start is None or not inside(self.window_start):
+            start = self.window_start
+            for _ in range(2):
+                if start is None or inside(start):
+                    break
+                start += half if current_tape_index >= start + width - margin else -half
+            self.window_start = start if start is not None and inside(start) else current_tape_index - half
+            redraw = True
+        cells = [str(current_tape[index])[-CELL_WIDTH:].rjust(CELL_WIDTH)
+                 for index in range(self.window_start, self.window_start + width)]
+        head_column = (current_tape_index - self.window_start) * CELL_WIDTH + CELL_WIDTH
+        status = 'Time step:- {}  card index:- {}  tape index:- {}  window:- [{}, {}]  steps per second:- {:.0f}'.format(
+                 time_step, current_card_index, current_tape_index, self.window_start, self.window_start + width - 1, self.speed)
+
+        #
+        # Without control sequences, each frame is a line of its own (with the head's cell in brackets)
+        if not self.ansi:
+            position = current_tape_index - self.window_start
+            tape_text = ''.join(cells[:position]) + '[' + cells[position].strip() + ']' + ''.join(cells[position + 1:])
+            print('{} {}'.format(status, tape_text), file=self.file)
+        else:
+            output = []
+            if self.cells is None:
+                output.append('\n' * FRAME_LINES)       # Make room for the first frame
+            output.append(LINES_UP.format(FRAME_LINES) + CLEAR_LINE + status + NEXT_LINE)
+            if redraw:
+                output.append(CLEAR_LINE + ''.join(cells))
+            else:
+                for (number, (old, new)) in enumerate(zip(self.cells, cells)):
+                    if old != new:
+                        output.append(COLUMN.format(number * CELL_WIDTH + 1) + new)
+            output.append(NEXT_LINE)
+            if redraw or head_column != self.head_column:
+                output.append(CLEAR_LINE + ' ' * (head_column - 1) + '^')
+            output.append(NEXT_LINE)
+            self.file.write(''.join(output))
+            self.file.flush()
+        self.cells = cells
+        self.head_column = head_column
+        self.last_frame_time = now
+        self.frames += 1
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to find a program, tape or start cell index by name in 'TMulator.py' (or load a program file)
+def _find(name):
+    if os.path.exists(name):
+        from TMulator_loader import load_compiled
+        return load_compiled(name)[0]   # The program, along with its compiled form (cached, see 'TMulator_loader.py')
+    import TMulator
+    if not hasattr(TMulator, name):
+        raise SystemExit('Unknown name {!r}'.format(name))
+    return getattr(TMulator, name)
+
+
+# Function to parse the command line, and run a program with a live trace
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a TM program, watching a window onto the tape live')
+    parser.add_argument('program', help="Name of the program, e.g. 'PROGRAM_10', or a program file")
+    parser.add_argument('tape', help="Name of the tape, e.g. 'TAPE_06'")
+    parser.add_argument('start', help="Name of the start cell index, e.g. 'START_CELL_INDEX_06' (or a number)")
+    parser.add_argument('--max-steps', type=int, default=10000000)
+    parser.add_argument('--engine', default='compiled')
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS, help='Frames per second (at most)')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH, help='Number of cells in the window')
+    args = parser.parse_args(argv)
+
+    from TMulator import run
+    trace = LiveTrace(width=args.width, fps=args.fps)
+    start = int(args.start) if args.start.lstrip('-').isdigit() else _find(args.start)
+    result = run(_find(args.program), list(_find(args.tape)), start, max_steps=args.max_steps, trace=trace, engine=args.engine)
+    trace.flush()
+    print('{} after {} steps ({:.3f}s, {} frames)'.format(result.halt_reason, result.steps, result.wall_time, trace.frames))
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
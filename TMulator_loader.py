@@ -0,0 +1,386 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a program loader, which
+# reads programs from files (rather than from the dict literals in 'TMulator_programming.py'),
+# validates them up front, and caches their compiled form on disk.
+#
+# Three file formats are understood (chosen by the file extension):
+#
+#   - '.json' (or '.yaml'/'.yml', if PyYAML is installed), holding an object with a
+#     'transitions' list, each entry being [state, scanned symbol, write, step, next state],
+#     e.g. {"transitions": [[1, "_", "_", 1, 2], [2, 0, 0, 1, 2], ...]}
+#     (symbols keep their JSON types, so 0 and "0" are different symbols, just as in Python)
+#   - anything else is read as a plain transition table, one transition per line:
+#         state  scanned-symbol  write  step  next-state
+#     where an integer is an int symbol, a quoted token ('0' or "0") is a string, and any
+#     other token (e.g. _ or E) is a string; '#' (outside quotes) starts a comment
+#
+# Validation finds the problems which would otherwise only turn up mid-run (as a KeyError deep
+# inside 'execute_a_TM_step()'), such as a card with no entry for a symbol which the program
+# reads elsewhere, a jump to a state with no card, a non-integer step, or a symbol written as a
+# string where the program reads it as an int (or vice versa).
+#
+# 'load_compiled()' caches the validated program and its compiled tables, keyed by a hash of the
+# file's contents, so repeated runs of the same file skip parsing, validation and compilation. The
+# program it returns carries its compiled tables along with it, so that 'run()' (and every other
+# runner) uses them as they are, rather than compiling the program again. The command line tools
+# load program files this way.
+#
+# From the command line, e.g.:
+#
+# python TMulator_loader.py check my_program.json
+# python TMulator_loader.py export PROGRAM_01 program_01.json
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shlex
+import tempfile
+
+from TMulator_compiled import HALT_STATE, PLACEMARKER_CARD, PrecompiledProgram, compile_program
+
+try:
+    import yaml     # Optional - only needed for YAML program files
+except ImportError:
+    yaml = None
+
+##############################################################################
+# Loader parameters
+##############################################################################
+#
+# Various top-level parameters
+START_CARD_INDEX = 1        # We always start on card index 1, and stop (halt) on card index 0
+CACHE_FORMAT_VERSION = b'3' # Bump this whenever the compiled form changes, so that old cache entries are ignored
+CACHE_DIGEST_SIZE = 32      # Bytes of the SHA-256 hash at the start of each cache entry
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'TMulator')
+
+
+#
+# The exception raised for a program which can't be read, or which fails validation ('problems' lists what is wrong)
+class ProgramError(ValueError):
+    def __init__(self, problems):
+        super().__init__('Invalid program:- ' + '; '.join(problems))
+        self.problems = problems
+
+    def __reduce__(self):
+        return (ProgramError, (self.problems,))     # So that it can be passed back from a worker process intact
+
+
+##############################################################################
+# Validation
+##############################################################################
+#
+# Function to check a program (in the usual card format), returning a list of the problems found with it (an empty
+# list if there are none). 'tape_symbols' are any further symbols which the program should be able to read.
+def validate_program(state_machine, tape_symbols=()):
+    problems = []
+    if START_CARD_INDEX not in state_machine:
+        problems.append('there is no card {} to start on'.format(START_CARD_INDEX))
+
+    #
+    # Check the shape of every card and every action
+    cards = {}
+    for state, card in state_machine.items():
+        if state == HALT_STATE:
+            continue
+        if isinstance(state, bool) or not isinstance(state, int):
+            problems.append('card index {!r} is not an int'.format(state))
+        if not isinstance(card, dict):
+            problems.append('card {!r} is not a dict of actions'.format(state))
+            continue
+        cards[state] = card
+        for scanned_symbol, action_dict in card.items():
+            where = 'card {!r}, symbol {!r}'.format(state, scanned_symbol)
+            if not isinstance(action_dict, dict) or set(action_dict) != {'write', 'step', 'next_state'}:
+                problems.append("{}: action must be a dict with exactly 'write', 'step' and 'next_state'".format(where))
+                continue
+            if isinstance(action_dict['step'], bool) or not isinstance(action_dict['step'], int):
+                problems.append('{}: step {!r} is not an int'.format(where, action_dict['step']))
+            next_state = action_dict['next_state']
+            if next_state != HALT_STATE and next_state not in state_machine:
+                problems.append('{}: next state {!r} has no card'.format(where, next_state))
+
+    #
+    # Every card should cover every symbol which the program (or the tape) can present to it
+    read_symbols = dict.fromkeys(tape_symbols)
+    for card in cards.values():
+        read_symbols.update(dict.fromkeys(card))
+    for state, card in cards.items():
+        missing = [symbol for symbol in read_symbols if symbol not in card]
+        if missing:
+            problems.append('card {!r} has no entry for {}'.format(state, ', '.join(repr(symbol) for symbol in missing)))
+
+    #
+    # Written symbols should be of the same type as the symbols which are read (e.g. '0' written where 0 is read), and
+    # a symbol which is never read should only be written as the machine halts
+    read_by_text = {str(symbol): symbol for symbol in read_symbols}
+    for state, card in cards.items():
+        for scanned_symbol, action_dict in card.items():
+            if not isinstance(action_dict, dict) or 'write' not in action_dict:
+                continue
+            written = action_dict['write']
+            if written in read_symbols:
+                continue
+            where = 'card {!r}, symbol {!r}'.format(state, scanned_symbol)
+            if str(written) in read_by_text:
+                problems.append('{}: writes {!r}, but the program reads {!r}'.format(where, written, read_by_text[str(written)]))
+            elif action_dict.get('next_state') != HALT_STATE:
+                problems.append('{}: writes {!r}, which no card can read, and carries on running'.format(where, written))
+    return problems
+
+
+##############################################################################
+# Reading and writing program files
+##############################################################################
+#
+# Function to parse one token of a plain transition table (an int, a quoted string, or a bare string)
+def _parse_token(token):
+    if len(token) >= 2 and token[0] == token[-1] and token[0] in '\'"':
+        return token[1:-1]
+    try:
+        return int(token)
+    except ValueError:
+        return token
+
+
+# Function to format a symbol as a token of a plain transition table (the inverse of '_parse_token()'). A symbol which
+# is neither an int nor a string, or a string which can't be quoted (one holding both kinds of quote, or a line break),
+# can't be written to a plain table at all
+def _format_token(symbol):
+    if isinstance(symbol, int):
+        return str(symbol)
+    if not isinstance(symbol, str):
+        raise ProgramError(["symbol {!r} can't be written to a plain transition table".format(symbol)])
+    if symbol and not any(character.isspace() or character in '\'"#' for character in symbol) and _parse_token(symbol) == symbol:
+        return symbol
+    for quote in '\'"':
+        if quote not in symbol and '\n' not in symbol and '\r' not in symbol:
+            return quote + symbol + quote
+    raise ProgramError(["symbol {!r} can't be written to a plain transition table (use a JSON file)".format(symbol)])
+
+
+# Function to split one line of a plain transition table into its tokens (keeping any quotes, for '_parse_token()'),
+# leaving out any comment. A '#' within a quoted token is part of the symbol, not the start of a comment
+def _split_line(line):
+    lexer = shlex.shlex(line, posix=False)
+    lexer.whitespace_split = True
+    lexer.commenters = '#'
+    return list(lexer)
+
+
+# Function to turn a list of transitions ([state, scanned symbol, write, step, next state]) into the usual card format
+def program_from_transitions(transitions):
+    state_machine = {HALT_STATE: PLACEMARKER_CARD}
+    problems = []
+    for transition in transitions:
+        if not isinstance(transition, (list, tuple)) or len(transition) != 5:
+            problems.append('transition {!r} is not [state, symbol, write, step, next state]'.format(transition))
+            continue
+        (state, scanned_symbol, written, step, next_state) = transition
+        try:
+            hash((state, scanned_symbol, written, next_state))
+        except TypeError:
+            problems.append('transition {!r} has a list or object for a state or symbol'.format(transition))
+            continue
+        card = state_machine.setdefault(state, {})
+        if not isinstance(card, dict):
+            problems.append('transition {!r} is for the halting state'.format(transition))
+        elif scanned_symbol in card:
+            problems.append('card {!r} has more than one entry for {!r}'.format(state, scanned_symbol))
+        else:
+            card[scanned_symbol] = {'write': written, 'step': step, 'next_state': next_state}
+    if problems:
+        raise ProgramError(problems)
+    return state_machine
+
+
+# Function to turn a program in the usual card format into a list of transitions
+def program_to_transitions(state_machine):
+    return [[state, scanned_symbol, action_dict['write'], action_dict['step'], action_dict['next_state']]
+            for state, card in state_machine.items() if state != HALT_STATE
+            for scanned_symbol, action_dict in card.items()]
+
+
+# Function to parse the contents of a program file (as bytes), choosing the format from the file name
+# (a file which can't be read as a program at all raises a 'ProgramError', just as one which fails validation does)
+def parse_program(data, path):
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError as error:
+        raise ProgramError(['{} is not UTF-8 text ({})'.format(path, error)]) from None
+    if extension in ('.json', '.yaml', '.yml'):
+        if extension != '.json' and yaml is None:
+            raise ProgramError(['PyYAML is needed to read {}'.format(path)])
+        parse_errors = (ValueError, yaml.YAMLError) if yaml is not None else (ValueError,)
+        try:
+            document = json.loads(text) if extension == '.json' else yaml.safe_load(text)
+        except parse_errors as error:
+            raise ProgramError(['{} is not valid {} ({})'.format(path, extension[1:].upper(), error)]) from None
+        if not isinstance(document, dict) or not isinstance(document.get('transitions'), list):
+            raise ProgramError(["{} should hold an object with a 'transitions' list".format(path)])
+        transitions = document['transitions']
+    else:
+        transitions = []
+        for line_number, line in enumerate(text.splitlines(), 1):
+            try:
+                tokens = _split_line(line)
+            except ValueError as error:
+                raise ProgramError(['line {}: {}'.format(line_number, error)]) from None
+            if not tokens:
+                continue
+            if len(tokens) != 5:
+                raise ProgramError(['line {}: expected state, symbol, write, step, next state'.format(line_number)])
+            transitions.append([_parse_token(token) for token in tokens])
+    return program_from_transitions(transitions)
+
+
+# Function to read and validate a program file, returning the program in the usual card format
+def load_program(path, tape_symbols=()):
+    with open(path, 'rb') as program_file:
+        state_machine = parse_program(program_file.read(), path)
+    problems = validate_program(state_machine, tape_symbols)
+    if problems:
+        raise ProgramError(problems)
+    return state_machine
+
+
+# Function to write a program (in the usual card format) to a file, in the format given by the file extension
+def save_program(state_machine, path):
+    extension = os.path.splitext(path)[1].lower()
+    transitions = program_to_transitions(state_machine)
+    if extension in ('.yaml', '.yml') and yaml is None:
+        raise ProgramError(['PyYAML is needed to write {}'.format(path)])
+    if extension not in ('.json', '.yaml', '.yml'):
+        lines = ['  '.join(_format_token(token) for token in transition) + '\n' for transition in transitions]
+    with open(path, 'w') as program_file:
+        if extension == '.json':
+            program_file.write('{"transitions": [\n')
+            program_file.write(',\n'.join('    ' + json.dumps(transition) for transition in transitions))
+            program_file.write('\n]}\n')
+        elif extension in ('.yaml', '.yml'):
+            yaml.safe_dump({'transitions': transitions}, program_file, default_flow_style=None)
+        else:
+            program_file.write('# state  symbol  write  step  next-state\n')
+            program_file.writelines(lines)
+
+
+##############################################################################
+# Compiled program cache
+##############################################################################
+#
+# Function to load a program file, returning both the program (in the usual card format, as a 'PrecompiledProgram'
+# which carries the compiled form along with it) and its compiled form. The pair is cached on disk, keyed by a hash of
+# the file's contents, so if the file hasn't changed since it was last loaded then the cached pair is used, and the
+# file isn't parsed, validated or compiled again.
+def load_compiled(path, cache_directory=None):
+    cache_directory = cache_directory or os.environ.get('TMULATOR_CACHE_DIR') or DEFAULT_CACHE_DIRECTORY
+    with open(path, 'rb') as program_file:
+        data = program_file.read()
+    key = hashlib.sha256(CACHE_FORMAT_VERSION + os.path.splitext(path)[1].lower().encode() + b'\0' + data).hexdigest()
+    cache_path = os.path.join(cache_directory, key + '.pickle')
+
+    #
+    # Use the cached copy if there is one. Each entry starts with a hash of the pickle which follows it, so that a garbled
+    # one isn't mistaken for a (different) program. One which can't be read back (a truncated or garbled pickle can raise
+    # almost any exception) is dropped, just as if it had never been cached
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            (digest, payload) = (cache_file.read(CACHE_DIGEST_SIZE), cache_file.read())
+        if hashlib.sha256(payload).digest() != digest:
+            raise ValueError('corrupt cache entry')
+        loaded = pickle.loads(payload)
+        if isinstance(loaded, tuple) and len(loaded) == 2 and isinstance(loaded[0], PrecompiledProgram):
+            return loaded
+        raise ValueError('not a cached program')
+    except FileNotFoundError:
+        pass
+    except Exception:
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+
+    #
+    # Otherwise parse, validate and compile the program, and write the result to the cache atomically (via a
+    # temporary file and a rename), so that a concurrent reader never sees a partly written entry
+    state_machine = parse_program(data, path)
+    problems = validate_program(state_machine)
+    if problems:
+        raise ProgramError(problems)
+    compiled = compile_program(state_machine)
+    loaded = (PrecompiledProgram(state_machine, compiled), compiled)
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        (handle, temporary_path) = tempfile.mkstemp(dir=cache_directory, suffix='.tmp')
+        payload = pickle.dumps(loaded, protocol=pickle.HIGHEST_PROTOCOL)
+        with os.fdopen(handle, 'wb') as cache_file:
+            cache_file.write(hashlib.sha256(payload).digest() + payload)
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        pass                # The cache is only an optimisation, so carry on without it
+    return loaded
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to look up a bundled program by name from 'TMulator.py' and its companion module
+def _find(name):
+    import TMulator
+    if not hasattr(TMulator, name):
+        raise SystemExit('Unknown name {!r}'.format(name))
+    return getattr(TMulator, name)
+
+
+# Function to parse the command line, and check program files or export bundled programs
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check TM program files, or export the bundled programs to files')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help='Validate program files (or bundled programs, by name)')
+    check_parser.add_argument('programs', nargs='+')
+    export_parser = subparsers.add_parser('export', help='Write a bundled program to a file')
+    export_parser.add_argument('program', help="Name of the program, e.g. 'PROGRAM_01'")
+    export_parser.add_argument('path', help='File to write (.json, .yaml or plain transition table)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        save_program(_find(args.program), args.path)
+        return
+    failed = False
+    for name in args.programs:
+        if os.path.exists(name):
+            try:
+                problems = validate_program(parse_program(open(name, 'rb').read(), name))
+            except (ProgramError, ValueError, KeyError) as error:
+                problems = [str(error)]
+        else:
+            problems = validate_program(_find(name))
+        print('{}:- {}'.format(name, 'OK' if not problems else ''))
+        for problem in problems:
+            print('    ' + problem)
+        failed = failed or bool(problems)
+    raise SystemExit(1 if failed else 0)
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
@@ -0,0 +1,315 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a loop detector, which
+# stops a run early (rather than letting it burn through its whole step budget) once the
+# machine has provably entered a loop.
+#
+# Two kinds of loop are detected:
+#
+#   - Repeated configurations. If the machine is ever in exactly the same configuration
+#     (state, head position and tape contents) as at some earlier step, then it will cycle
+#     through the same configurations forever. These are found with Brent's algorithm, which
+#     keeps just one saved configuration (replaced at steps 1, 2, 4, 8, ...) and compares each
+#     new configuration with it. So that this stays cheap per step, the tape contents are
+#     compared by a polynomial hash, which is updated incrementally by each write, and only
+#     when the hashes match are the tapes themselves compared.
+#
+#   - Runs off into blank tape. If the machine is in some state with every cell from the head
+#     rightwards holding the fill symbol, and later is in the same state, again with every cell
+#     from the head rightwards holding the fill symbol, and never went to the left of the first
+#     head position in between, then it will repeat that stretch of steps forever, each time
+#     shifted rightwards by the same number of cells (and likewise for the left). This is the
+#     usual way for a buggy program to run forever, and its configurations never repeat.
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import re
+
+from TMulator_compiled import MissingTransition
+from TMulator_mapped import MappedTape
+
+##############################################################################
+# Loop detector parameters
+##############################################################################
+#
+# Various top-level parameters
+HASH_MODULUS = (1 << 61) - 1    # A Mersenne prime, so that every non-zero number has an inverse
+HASH_BASE = 0x5DEECE66D         # The tape hash is the sum of (code - fill code) * HASH_BASE ** index over all cells
+KEY_GAP = 1 << 12               # Stretches of tape this many fill cells apart are described separately when comparing tapes
+
+
+#
+# The exception raised by a loop detector when the machine has provably entered a loop. The machine repeats the
+# same 'cycle_length' steps forever from step 'entry_step' onwards, each time with its head 'shift' cells further
+# along (0 for a repeated configuration). 'tape_index', 'state' and 'steps' describe where the run was stopped
+class LoopDetected(Exception):
+    def __init__(self, cycle_length, entry_step, shift, tape_index, state, steps):
+        if shift == 0:
+            message = 'Configuration repeats every {} steps from step {}'.format(cycle_length, entry_step)
+        else:
+            message = 'Machine runs off to the {}, repeating every {} steps (shifted by {} cells) from step {}'.format(
+                      'right' if shift > 0 else 'left', cycle_length, abs(shift), entry_step)
+        super().__init__(message)
+        self.cycle_length = cycle_length
+        self.entry_step = entry_step
+        self.shift = shift
+        self.tape_index = tape_index
+        self.state = state
+        self.steps = steps
+
+
+##############################################################################
+# Hashed stepping
+##############################################################################
+#
+# Function to work out, for each entry of a compiled program's tables, how much taking that transition changes the
+# tape hash (per unit of HASH_BASE ** head index), and what it multiplies HASH_BASE ** head index by
+def _hash_tables(compiled):
+    width = compiled.width
+    delta_table = [(write_code - index % width) % HASH_MODULUS for index, write_code in enumerate(compiled.write_table)]
+    power_table = [pow(HASH_BASE, step % (HASH_MODULUS - 1), HASH_MODULUS) for step in compiled.step_table]
+    return (delta_table, power_table)
+
+
+# Function to work out the hash of a tape from scratch
+def _tape_hash(tape):
+    fill_code = tape.fill_code
+    tape_hash = 0
+    for (first_index, cells) in tape.segment_cells():
+        for position, code in enumerate(cells):
+            if code != fill_code:
+                index = first_index + position
+                tape_hash += (code - fill_code) * pow(HASH_BASE, index % (HASH_MODULUS - 1), HASH_MODULUS)
+    return tape_hash % HASH_MODULUS
+
+
+# Function to describe a tape's contents exactly, regardless of how far it has grown, or how its cells are held (in one
+# stretch, or in the segments of a 'SparseTape'). The description is a tuple of (first index, codes) pairs, one for
+# each stretch of non-fill cells, where stretches separated by fewer than KEY_GAP fill cells are joined into one (so
+# an ordinary tape usually has just the one, and an all-fill tape none)
+def _tape_key(tape):
+    fill = bytes((tape.fill_code,))
+    long_gap = re.compile(re.escape(fill) + b'{%d,}' % KEY_GAP)
+    pieces = []
+    for (first_index, cells) in tape.segment_cells():
+        #
+        # Strip the fill off each segment, and split what is left wherever there is a long stretch of fill
+        start = len(cells) - len(cells.lstrip(fill))
+        stop = len(cells.rstrip(fill))
+        if start >= stop:
+            continue
+        for gap in list(long_gap.finditer(cells, start, stop)) + [None]:
+            end = stop if gap is None else gap.start()
+            (piece_index, piece) = (first_index + start, bytes(cells[start:end]))
+            #
+            # Join the piece to the one before, if they are not far apart
+            if pieces and piece_index - pieces[-1][0] - len(pieces[-1][1]) < KEY_GAP:
+                (last_index, last_piece) = pieces.pop()
+                piece = last_piece + fill * (piece_index - last_index - len(last_piece)) + piece
+                piece_index = last_index
+            pieces.append((piece_index, piece))
+            if gap is not None:
+                start = gap.end()
+    return tuple(pieces)
+
+
+# Function to describe the extent of a tape's non-fill cells, as (first index, last index) (or (inf, -inf) if every
+# cell holds the fill symbol)
+def _non_fill_extent(tape):
+    fill = bytes((tape.fill_code,))
+    (first_index, last_index) = (float('inf'), float('-inf'))
+    for (start, cells) in tape.segment_cells():
+        last_position = len(cells.rstrip(fill)) - 1
+        if last_position >= 0:
+            first_index = min(first_index, start + len(cells) - len(cells.lstrip(fill)))
+            last_index = max(last_index, start + last_position)
+    return (first_index, last_index)
+
+
+# Generator which steps a compiled program on a tape (whose symbol codes must already match the program's), starting
+# from the given tape index and row offset, yielding (row offset, tape index, tape hash, first non-fill index, last
+# non-fill index) for the starting configuration and then after every step. The non-fill extent is conservative: it
+# only ever grows, so cells outside it certainly hold the fill symbol. A row offset of 0 means the machine has halted,
+# and a negative row offset means it has hit a missing transition (a step which didn't really happen).
+def _configurations(compiled, tape, tape_index, row_offset):
+    write_table = compiled.write_table
+    step_table = compiled.step_table
+    next_table = compiled.next_table
+    (delta_table, power_table) = _hash_tables(compiled)
+    fill_code = tape.fill_code
+    tape_hash = _tape_hash(tape)
+    power = pow(HASH_BASE, tape_index % (HASH_MODULUS - 1), HASH_MODULUS)
+    (first_index, last_index) = _non_fill_extent(tape)
+    yield (row_offset, tape_index, tape_hash, first_index, last_index)
+    (cells, origin) = tape.cells_at(tape_index)
+    while row_offset > 0:
+        position = tape_index + origin
+        if not 0 <= position < len(cells):
+            (cells, origin) = tape.cells_at(tape_index)       # Growing the tape (or switching it to a 'SparseTape')
+            position = tape_index + origin
+        index = row_offset + cells[position]
+        code = write_table[index]
+        if code != fill_code:
+            if tape_index > last_index:
+                last_index = tape_index
+            if tape_index < first_index:
+                first_index = tape_index
+        cells[position] = code
+        tape_hash = (tape_hash + delta_table[index] * power) % HASH_MODULUS
+        power = power * power_table[index] % HASH_MODULUS
+        tape_index += step_table[index]
+        row_offset = next_table[index]
+        yield (row_offset, tape_index, tape_hash, first_index, last_index)
+
+
+##############################################################################
+# Loop detector
+##############################################################################
+#
+class LoopDetector:
+    #
+    # Set up a detector for a compiled program running on the given 'Tape' (which is updated in place). A copy of the
+    # tape is kept, so that the step at which a repeated configuration first occurred can be found (which is why a
+    # 'MappedTape', meant for tapes too big to hold in memory, can't be used)
+    def __init__(self, compiled, tape):
+        if isinstance(tape, MappedTape):
+            raise ValueError("Can't detect loops on a memory-mapped tape")
+        tape.use_alphabet(compiled.symbols)
+        self.compiled = compiled
+        self.tape = tape
+        self.initial_tape = tape.copy()
+        self.initial_configuration = None
+        self.configurations = None
+        self.steps = 0
+        #
+        # Brent's algorithm: the saved configuration, the step it was saved at, and how long to keep it
+        self.saved_configuration = None
+        self.saved_tape_key = None
+        self.saved_step = 0
+        self.saved_lifetime = 1
+        #
+        # Runs off into blank tape: for each side, the steps at which the machine was beyond all the non-fill cells
+        # on that side (which it hasn't since gone back behind), and how far back it has been since the latest one
+        self.right_records = []
+        self.right_states = {}
+        self.right_low = None
+        self.left_records = []
+        self.left_states = {}
+        self.left_high = None
+
+    #
+    # Advance the machine from the given tape index and card index by at most 'max_steps' steps, returning the new
+    # tape index and card index and the number of steps taken. Raises a 'LoopDetected' once the machine has provably
+    # entered a loop (or a 'MissingTransition', just as 'run_compiled()' does)
+    def advance(self, tape_index, state, max_steps):
+        compiled = self.compiled
+        if self.configurations is None:
+            row_offset = compiled.state_rows[state] * compiled.width
+            self.initial_configuration = (tape_index, row_offset)
+            self.configurations = _configurations(compiled, self.tape, tape_index, row_offset)
+            self._save(next(self.configurations)[:3], 0)
+            self.right_low = self.left_high = tape_index
+        steps = 0
+        saved_hash = self.saved_configuration[2]
+        right_low = self.right_low
+        left_high = self.left_high
+        for (row_offset, tape_index, tape_hash, first_index, last_index) in self.configurations:
+            steps += 1
+            if row_offset <= 0:
+                break
+            #
+            # Compare with the configuration saved by Brent's algorithm (and save this one, if that has lived its time)
+            if tape_hash == saved_hash and (row_offset, tape_index) == self.saved_configuration[:2]:
+                if _tape_key(self.tape) == self.saved_tape_key:
+                    self.steps += steps
+                    cycle_length = self.steps - self.saved_step
+                    raise LoopDetected(cycle_length, self._find_entry_step(cycle_length), 0, tape_index,
+                                       compiled.states[row_offset // compiled.width], steps)
+            if self.steps + steps - self.saved_step == self.saved_lifetime:
+                self._save((row_offset, tape_index, tape_hash), self.steps + steps)
+                self.saved_lifetime *= 2
+                saved_hash = tape_hash
+            #
+            # Check for a run off into blank tape
+            if tape_index < right_low:
+                right_low = tape_index
+            if tape_index > left_high:
+                left_high = tape_index
+            run_off = None
+            if tape_index > last_index:
+                run_off = self._check_run_off(self.right_records, self.right_states, lambda head: head > right_low,
+                                              tape_index, row_offset, self.steps + steps)
+                right_low = tape_index
+            if tape_index < first_index and run_off is None:
+                run_off = self._check_run_off(self.left_records, self.left_states, lambda head: head < left_high,
+                                              tape_index, row_offset, self.steps + steps)
+                left_high = tape_index
+            if run_off is not None:
+                self.steps += steps
+                (entry_step, entry_tape_index) = run_off
+                raise LoopDetected(self.steps - entry_step, entry_step, tape_index - entry_tape_index, tape_index,
+                                   compiled.states[row_offset // compiled.width], steps)
+            if steps >= max_steps:
+                break
+        else:
+            return (tape_index, state, 0)       # The machine had already stopped
+        self.steps += steps
+        self.right_low = right_low
+        self.left_high = left_high
+
+        #
+        # Deal with a missing transition, reporting it just as the reference stepper would have done
+        if row_offset < 0:
+            self.steps -= 1
+            state = compiled.states[(-row_offset - 1) // compiled.width]
+            if state not in compiled.card_states:
+                raise MissingTransition(state, tape_index, state, steps - 1)
+            raise MissingTransition(self.tape[tape_index], tape_index, state, steps - 1)
+        return (tape_index, compiled.states[row_offset // compiled.width], steps)
+
+    #
+    # Save a configuration for Brent's algorithm to compare later ones with
+    def _save(self, configuration, step):
+        self.saved_configuration = configuration
+        self.saved_tape_key = _tape_key(self.tape)
+        self.saved_step = step
+
+    #
+    # The machine is beyond all the non-fill cells on one side of the tape. First forget the earlier times this
+    # happened which it has since gone back behind (for which 'gone_back' is true), then if it was in the same state at
+    # one of the remaining times, it is running off into blank tape, so return that (step, tape index) (or None if not)
+    def _check_run_off(self, records, states, gone_back, tape_index, row_offset, steps):
+        while records and gone_back(records[-1][1]):
+            (step, head, record_row_offset) = records.pop()
+            if states.get(record_row_offset) == (step, head):
+                del states[record_row_offset]
+        if row_offset in states:
+            return states[row_offset]
+        records.append((steps, tape_index, row_offset))
+        states[row_offset] = (steps, tape_index)
+        return None
+
+    #
+    # Find the first step at which the machine's configuration repeats 'cycle_length' steps later, by re-running it
+    # from the start twice over, with one run 'cycle_length' steps ahead of the other
+    def _find_entry_step(self, cycle_length):
+        (tape_index, row_offset) = self.initial_configuration
+        trailing_tape = self.initial_tape.copy()
+        leading_tape = self.initial_tape.copy()
+        trailing = _configurations(self.compiled, trailing_tape, tape_index, row_offset)
+        leading = _configurations(self.compiled, leading_tape, tape_index, row_offset)
+        for _ in range(cycle_length):
+            next(leading)
+        for (entry_step, (trailing_configuration, leading_configuration)) in enumerate(zip(trailing, leading)):
+            if trailing_configuration[:3] == leading_configuration[:3] and _tape_key(trailing_tape) == _tape_key(leading_tape):
+                return entry_step
+        return self.steps - cycle_length     # Not reached, since we know that the configurations do repeat
@@ -0,0 +1,257 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a memory-mapped tape, for
+# tapes which are too big to hold in memory (e.g. unary numbers gigabytes long, for
+# PROGRAM_07 addition or PROGRAM_11 unary to binary).
+#
+# A tape file is just the symbol codes of its cells, one byte per cell (just as a 'Tape'
+# holds them in its bytearray), with the alphabet (mapping codes back to symbols) given
+# separately. 'MappedTape' maps such a file into memory, and stands in for a 'Tape' (it is
+# one), so every engine runs on it unchanged, reading and writing the file's pages as the
+# head reaches them, and the operating system keeps only the pages in use in memory. The tape
+# grows on the right by extending the file, and on the left by extending the file and moving
+# its contents along (in doubling chunks, so that the moves are amortised). At no point is the
+# tape turned into a Python list, unless it is printed.
+#
+# Tape files can be built from runs of symbols with 'write_tape_file()' (again without a list),
+# and any tape's contents can be written out to one with 'save_tape_file()'. Loop detection
+# (which keeps a copy of the tape) needs an ordinary 'Tape', and refuses a mapped one. From the command line, e.g.:
+#
+# python TMulator_mapped.py make sum.tape '[["_", 1], [1, 1000000000], ["_", 1], [1, 1000000000], ["_", 1]]'
+# python TMulator_mapped.py run PROGRAM_07 sum.tape 0 --max-steps 10000000000
+# python TMulator_mapped.py show sum.tape 999999990 1000000010
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import json
+import mmap
+import os
+
+from TMulator_tape import DEFAULT_FILL_SYMBOL, MIN_GROWTH_CHUNK, Tape
+
+##############################################################################
+# Mapped tape parameters
+##############################################################################
+#
+# Various top-level parameters
+DEFAULT_ALPHABET = ('_', 0, 1)      # The symbols of most of our programs, so that these are codes 0, 1 and 2
+BLOCK_SIZE = 1 << 20                # Cells are scanned, filled and re-coded this many at a time
+MAX_RIGHT_GROWTH_CHUNK = 1 << 26    # Growing on the right is cheap, so we don't double the file beyond this much at a time
+
+
+# Function to write 'count' copies of a code to a file (a block at a time, so that no huge bytes object is built)
+def _write_code(file, code, count):
+    block = bytes((code,)) * min(count, BLOCK_SIZE)
+    while count > 0:
+        file.write(block[:count])
+        count -= len(block)
+
+
+##############################################################################
+# Memory-mapped tape
+##############################################################################
+#
+class MappedTape(Tape):
+    #
+    # Map the tape file at 'path' (creating it if it doesn't exist), with its first cell at logical index 'first_index',
+    # and its codes decoded by 'alphabet'. Any symbol written which isn't in the alphabet is given the next free code.
+    def __init__(self, path, alphabet=DEFAULT_ALPHABET, fill_symbol=DEFAULT_FILL_SYMBOL, first_index=0):
+        super().__init__(fill_symbol=fill_symbol, first_index=first_index, alphabet=alphabet)
+        self.path = path
+        self.file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        length = os.fstat(self.file.fileno()).st_size
+        self.initial_last_index = first_index + length - 1
+        if length == 0:
+            _write_code(self.file, self.fill_code, MIN_GROWTH_CHUNK)   # An empty file can't be mapped
+            self.file.flush()
+        self.cells = mmap.mmap(self.file.fileno(), 0)
+
+    #
+    # The logical index of the first cell in the file (which changes whenever the tape grows on the left)
+    @property
+    def first_cell_index(self):
+        return -self.origin
+
+    #
+    # Extend the file (and its map) by 'count' cells of the fill symbol, on the right
+    def _extend(self, count):
+        length = len(self.cells)
+        self.cells.close()
+        self.file.seek(length)
+        if self.fill_code == 0:
+            self.file.truncate(length + count)      # Zero bytes cost nothing to write (and may not even take up disk space)
+        else:
+            _write_code(self.file, self.fill_code, count)
+        self.file.flush()
+        self.cells = mmap.mmap(self.file.fileno(), 0)
+
+    #
+    # Grow the file so that it includes the given logical index. On the right, the file is simply extended, by at least
+    # a doubling chunk (up to MAX_RIGHT_GROWTH_CHUNK). On the left, it is extended by a doubling chunk, and its contents
+    # are moved along to make room at the start.
+    def grow_to(self, index):
+        position = index + self.origin
+        length = len(self.cells)
+        if position < 0:
+            chunk = max(-position, length, MIN_GROWTH_CHUNK)
+            self._extend(chunk)
+            self.cells.move(chunk, 0, length)
+            for start in range(0, chunk, BLOCK_SIZE):
+                stop = min(start + BLOCK_SIZE, chunk)
+                self.cells[start:stop] = bytes((self.fill_code,)) * (stop - start)
+            self.origin += chunk
+        elif position >= length:
+            self._extend(max(position - length + 1, min(length, MAX_RIGHT_GROWTH_CHUNK), MIN_GROWTH_CHUNK))
+
+    #
+    # A mapped tape always stays in its file (so a far jump grows the file, rather than switching to a 'SparseTape')
+    def is_far_jump(self, index):
+        return False
+
+    #
+    # Switch the tape over to the given alphabet (as 'Tape.use_alphabet()' does), re-coding the cells in place, a block
+    # at a time, if our alphabet isn't a prefix of the new one
+    def use_alphabet(self, symbols):
+        symbols = list(symbols)
+        if symbols[:len(self.alphabet)] != self.alphabet:
+            new_codes = {symbol: code for code, symbol in enumerate(symbols)}
+            missing = [symbol for symbol in self.alphabet if symbol not in new_codes]
+            if missing:
+                raise ValueError('Tape symbols {!r} are not in the new alphabet'.format(missing))
+            table = bytes(new_codes[symbol] for symbol in self.alphabet) + bytes(256 - len(self.alphabet))
+            for start in range(0, len(self.cells), BLOCK_SIZE):
+                self.cells[start:start + BLOCK_SIZE] = self.cells[start:start + BLOCK_SIZE].translate(table)
+        self.alphabet = symbols
+        self.symbol_codes = {symbol: code for code, symbol in enumerate(symbols)}
+        self.fill_code = self.symbol_codes[self.fill_symbol]
+
+    #
+    # The logical extent of the tape (as for 'Tape'), found by scanning in from each end of the file a block at a time
+    @property
+    def first_index(self):
+        fill = bytes((self.fill_code,))
+        first_position = len(self.cells)
+        for start in range(0, len(self.cells), BLOCK_SIZE):
+            block = self.cells[start:start + BLOCK_SIZE]
+            remainder = block.lstrip(fill)
+            if remainder:
+                first_position = start + len(block) - len(remainder)
+                break
+        return min(self.initial_first_index, first_position - self.origin)
+
+    @property
+    def last_index(self):
+        fill = bytes((self.fill_code,))
+        last_position = -1
+        for stop in range(len(self.cells), 0, -BLOCK_SIZE):
+            remainder = self.cells[max(0, stop - BLOCK_SIZE):stop].rstrip(fill)
+            if remainder:
+                last_position = max(0, stop - BLOCK_SIZE) + len(remainder) - 1
+                break
+        return max(self.initial_last_index, last_position - self.origin)
+
+    #
+    # Write any changes out to the file, and unmap it
+    def flush(self):
+        self.cells.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.cells.flush()
+            self.cells.close()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+##############################################################################
+# Tape files
+##############################################################################
+#
+# Function to write a tape file from a sequence of runs, each a (symbol, count) pair, e.g. [('_', 1), (1, 10 ** 9), ('_', 1)]
+# for a unary number of a billion, enclosed in blanks. Symbols are coded by 'alphabet' (which must hold them all)
+def write_tape_file(path, runs, alphabet=DEFAULT_ALPHABET):
+    symbol_codes = {symbol: code for code, symbol in enumerate(alphabet)}
+    with open(path, 'wb') as tape_file:
+        for (symbol, count) in runs:
+            if symbol not in symbol_codes:
+                raise ValueError('Symbol {!r} is not in the alphabet {!r}'.format(symbol, list(alphabet)))
+            _write_code(tape_file, symbol_codes[symbol], count)
+
+
+# Function to write a tape's logical extent (from its first to its last index) out to a tape file, a block at a time,
+# with symbols coded by the tape's own alphabet (the gaps between the segments of a 'SparseTape' are written out as
+# the fill symbol). Returns the first index (the logical index of the file's first cell)
+def save_tape_file(tape, path):
+    (first_index, last_index) = (tape.first_index, tape.last_index)
+    with open(path, 'wb') as tape_file:
+        for start in range(first_index, last_index + 1, BLOCK_SIZE):
+            tape_file.write(tape.codes(start, min(start + BLOCK_SIZE, last_index + 1)))
+    return first_index
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to parse the command line, and make, run or show a tape file
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Make tape files, and run TM programs on them in place')
+    parser.add_argument('--alphabet', type=json.loads, default=list(DEFAULT_ALPHABET),
+                        help='JSON list of the symbols, in code order (default: {})'.format(json.dumps(DEFAULT_ALPHABET)))
+    parser.add_argument('--first-index', type=int, default=0, help='Logical index of the first cell of the file')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    make_parser = subparsers.add_parser('make', help='Write a tape file from runs of symbols')
+    make_parser.add_argument('path')
+    make_parser.add_argument('runs', type=json.loads, help='JSON list of [symbol, count] runs')
+    run_parser = subparsers.add_parser('run', help='Run a program on a tape file, updating it in place')
+    run_parser.add_argument('program', help="Name of the program, e.g. 'PROGRAM_07', or a program file")
+    run_parser.add_argument('path')
+    run_parser.add_argument('start', type=int, help='Start cell index')
+    run_parser.add_argument('--max-steps', type=int, default=1000000)
+    run_parser.add_argument('--engine', default='compiled')
+    show_parser = subparsers.add_parser('show', help='Show a range of cells of a tape file')
+    show_parser.add_argument('path')
+    show_parser.add_argument('start', type=int)
+    show_parser.add_argument('stop', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'make':
+        write_tape_file(args.path, args.runs, args.alphabet)
+    elif args.command == 'run':
+        from TMulator import run
+        from TMulator_batch import find_program
+        with MappedTape(args.path, args.alphabet, first_index=args.first_index) as tape:
+            result = run(find_program(args.program), tape, args.start, max_steps=args.max_steps, engine=args.engine)
+            print('{} after {} steps ({:.3f}s)'.format(result.halt_reason, result.steps, result.wall_time))
+            print('Current tape index:- ', result.tape_index)
+            print('Current card index:- ', result.card_index)
+            print('First cell index:- ', tape.first_cell_index)
+            if tape.alphabet != args.alphabet:
+                print('Alphabet:- ', json.dumps(tape.alphabet))
+    else:
+        with MappedTape(args.path, args.alphabet, first_index=args.first_index) as tape:
+            print(tape[args.start:args.stop])
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
@@ -0,0 +1,180 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a memoising engine,
+# which remembers what the machine did on each block of tape it has worked through,
+# so that it doesn't have to work it out again the next time (in the style of Hashlife).
+#
+# The tape is divided into fixed-size blocks (block k holding logical cells k * size to
+# (k + 1) * size - 1). Whenever the machine is in a block, its behaviour until it leaves that
+# block depends only on its state, where in the block it is, and what the block holds. So the
+# engine looks that up in a cache, keyed on (state row, entry offset within the block, block
+# contents), finding the state row and offset it leaves the block with (an offset below 0 or
+# beyond the end of the block being a step off its left or right side), the block's rewritten
+# contents, and the number of steps taken. On a hit, the whole traversal is done in one go.
+# On a miss, the machine is stepped through the block, and the outcome recorded.
+#
+# Programs such as PROGRAM_01 and PROGRAM_08 scan over the same blocks of bits time after time
+# (within a run, and from one run to the next), so most blocks become cache hits. The cache is
+# bounded (evicting the least recently used entries), and counts its hits and misses, which can
+# be used to judge whether it is paying its way.
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+from collections import OrderedDict
+
+from TMulator_compiled import MissingTransition
+
+##############################################################################
+# Block memo
+##############################################################################
+#
+# Various top-level parameters
+DEFAULT_BLOCK_SIZE = 64             # Number of cells in a block
+DEFAULT_MAX_ENTRIES = 1 << 16       # Number of block traversals remembered, before the least recently used are evicted
+MAX_MEMOS = 16                      # Number of programs whose memos are kept by 'memo_for()'
+
+#
+# The memos kept by 'memo_for()', keyed by the compiled tables they are for, least recently used first
+_memos = OrderedDict()
+
+
+class BlockMemo:
+    #
+    # Create an empty memo for a compiled program (it is only valid for that program's tables and symbol codes)
+    def __init__(self, compiled, block_size=DEFAULT_BLOCK_SIZE, max_entries=DEFAULT_MAX_ENTRIES):
+        self.compiled = compiled
+        self.block_size = block_size
+        self.max_entries = max_entries
+        self.entries = OrderedDict()    # (row offset, entry offset, contents) -> (row offset, exit offset, contents or None, steps)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    #
+    # The fraction of lookups which have been hits
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def statistics(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hit_rate}
+
+    #
+    # Step the machine through a block (a bytearray, updated in place), from the given row offset and offset within the
+    # block, for at most 'max_steps' steps, stopping as soon as it leaves the block, halts or hits a missing transition.
+    # Returns the row offset and offset it stopped with, and the number of steps taken (which includes the step onto a
+    # missing transition, marked by a negative row offset, just as in 'run_compiled()')
+    def traverse(self, block, row_offset, offset, max_steps):
+        write_table = self.compiled.write_table
+        step_table = self.compiled.step_table
+        next_table = self.compiled.next_table
+        block_size = self.block_size
+        steps = 0
+        while steps < max_steps:
+            index = row_offset + block[offset]
+            block[offset] = write_table[index]
+            offset += step_table[index]
+            row_offset = next_table[index]
+            steps += 1
+            if row_offset <= 0 or not 0 <= offset < block_size:
+                break
+        return (row_offset, offset, steps)
+
+    #
+    # Find how the machine leaves a block (given as bytes), from the given row offset and entry offset, for at most
+    # 'max_steps' steps. Returns (row offset, exit offset, rewritten contents (or None if the block is unchanged),
+    # steps), from the cache if possible. A traversal which was cut short by 'max_steps' (so didn't leave the block,
+    # halt or hit a missing transition) isn't cached, since it would be different with more steps to go
+    def lookup(self, row_offset, offset, contents, max_steps):
+        key = (row_offset, offset, contents)
+        entry = self.entries.get(key)
+        if entry is not None and entry[3] <= max_steps:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry
+        self.misses += 1
+        block = bytearray(contents)
+        (exit_row_offset, exit_offset, steps) = self.traverse(block, row_offset, offset, max_steps)
+        rewritten = bytes(block)
+        entry = (exit_row_offset, exit_offset, None if rewritten == contents else rewritten, steps)
+        if exit_row_offset <= 0 or not 0 <= exit_offset < self.block_size:
+            self.entries[key] = entry
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+
+# Function to return the memo for a compiled program, keeping memos from one run to the next (for up to MAX_MEMOS
+# programs, evicting the least recently used), so that repeated runs of a program share what has been learned
+def memo_for(compiled, block_size=DEFAULT_BLOCK_SIZE, max_entries=DEFAULT_MAX_ENTRIES):
+    key = (compiled.symbols, compiled.width, tuple(compiled.write_table), tuple(compiled.step_table),
+           tuple(compiled.next_table), block_size)
+    memo = _memos.get(key)
+    if memo is None:
+        memo = _memos[key] = BlockMemo(compiled, block_size, max_entries)
+        if len(_memos) > MAX_MEMOS:
+            _memos.popitem(last=False)
+    _memos.move_to_end(key)
+    return memo
+
+
+##############################################################################
+# Run loop
+##############################################################################
+#
+# Function to run a compiled program on a 'Tape' a block at a time, using (and filling) a block memo, starting from
+# the given tape index and state, for at most 'max_steps' steps. Returns the updated tape index and state, and the
+# number of steps taken, exactly as 'run_compiled()' does (and likewise raises a 'MissingTransition' if the machine
+# hits one)
+def run_memoised(compiled, tape, tape_index, state, max_steps, memo=None):
+    tape.use_alphabet(compiled.symbols)
+    if memo is None:
+        memo = memo_for(compiled)
+    block_size = memo.block_size
+    width = compiled.width
+    row_offset = compiled.state_rows[state] * width
+    (cells, origin) = tape.cells_at(tape_index)
+    steps_taken = 0
+    while steps_taken < max_steps and row_offset > 0:
+        #
+        # Find the block the head is in (growing the tape to cover all of it, if need be, and on a 'SparseTape' making
+        # sure that it all lies in the one segment)
+        block_start = tape_index - tape_index % block_size
+        start = block_start + origin
+        if start < 0 or start + block_size > len(cells):
+            (cells, origin) = tape.cells_spanning(block_start, block_start + block_size - 1)
+            start = block_start + origin
+        #
+        # Then traverse it in one go (only writing the block back if the traversal changed it)
+        contents = bytes(cells[start:start + block_size])
+        (row_offset, offset, rewritten, steps) = memo.lookup(row_offset, tape_index - block_start, contents,
+                                                             max_steps - steps_taken)
+        if rewritten is not None:
+            cells[start:start + block_size] = rewritten
+        tape_index = block_start + offset
+        steps_taken += steps
+
+    #
+    # Deal with a missing transition, reporting it just as the reference stepper would have done (the step which hit
+    # it has been counted, but didn't happen)
+    if row_offset < 0:
+        state = compiled.states[(-row_offset - 1) // width]
+        if state not in compiled.card_states:
+            raise MissingTransition(state, tape_index, state, steps_taken - 1)              # There is no card for this state
+        raise MissingTransition(tape[tape_index], tape_index, state, steps_taken - 1)      # The card has no entry for the scanned symbol
+    return (tape_index, compiled.states[row_offset // width], steps_taken)
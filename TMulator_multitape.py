@@ -0,0 +1,529 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing multi-tape machines, which
+# have k tapes, with one R/W head on each.
+#
+# The card format is extended in the obvious way: each card is keyed by the tuple of symbols
+# scanned by the k heads, and each action writes a tuple of k symbols, steps each head by its
+# own step (as before, any integer, not just +/-1) and moves to the next state, e.g.
+#
+#   ('_', 0): { 'write': ('_', '_'), 'step': (+1, +1), 'next_state': 2}
+#
+# See MULTITAPE_PROGRAM_00 (copy) and MULTITAPE_PROGRAM_01 (compare) in 'TMulator_programming.py',
+# which take O(n) steps where the one-tape PROGRAM_06 and PROGRAM_09/10 shuttle their one head back
+# and forth. 'execute_a_multitape_step()' is the reference stepper, and 'run_multitape_compiled()'
+# is a compiled engine for it, which (as in 'TMulator_compiled.py') works on 'Tape' cells with
+# dense tables, indexed by the state's row offset plus the scanned codes in mixed radix, i.e.
+# row * width ** k + code_1 + code_2 * width + ... (so k and the alphabet must be small enough
+# for the tables to fit, see MAX_TABLE_ENTRIES).
+#
+# 'single_tape_program()' converts a k-tape program into an ordinary one-tape program which
+# simulates it (so that the multi-tape engines can be validated against the one-tape ones). The
+# one tape holds k 'tracks': each cell holds a tuple (symbol 1, mark 1, ..., symbol k, mark k),
+# where a mark of 1 shows where that track's head is, and the tracks are bracketed by '#L' and '#R'
+# end markers. Each simulated step is four sweeps: rightwards to collect the symbols under the
+# marks, leftwards writing the new symbols and carrying marks left, rightwards carrying marks
+# right, and back to '#L'. An end marker is pushed outwards when a mark is carried past it.
+# From the command line, e.g.:
+#
+# python TMulator_multitape.py run MULTITAPE_PROGRAM_01 MULTITAPE_TAPES_01 START_CELL_INDICES_01
+# python TMulator_multitape.py check
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+from collections import deque, namedtuple
+
+from TMulator_compiled import HALT_STATE, MissingTransition, _intern_symbol
+from TMulator_tape import DEFAULT_FILL_SYMBOL, Tape
+
+##############################################################################
+# Multi-tape stepping
+##############################################################################
+#
+# Various top-level parameters
+START_CARD_INDEX = 1            # We always start on card index 1, and stop (halt) on card index 0
+MAX_TABLE_ENTRIES = 1 << 22     # Most entries we allow in the compiled tables (states * width ** k)
+
+#
+# Possible reasons for a run ending (as in 'TMulator.py')
+HALTED = 'HALTED'
+MAX_STEPS_REACHED = 'MAX_STEPS_REACHED'
+MISSING_TRANSITION = 'MISSING_TRANSITION'
+
+#
+# The result of a multi-tape run, as for 'RunResult' in 'TMulator.py', but with a tuple of tapes and of tape indices
+MultitapeResult = namedtuple('MultitapeResult', ['halt_reason', 'steps', 'tapes', 'tape_indices', 'card_index', 'error'])
+
+
+# Function to execute a step of a multi-tape TM (the multi-tape version of 'execute_a_TM_step()')
+def execute_a_multitape_step(current_tapes, current_tape_indices, current_card):
+    #
+    # Read the current symbols (one from each tape)
+    scanned_symbols = tuple(tape[index] for tape, index in zip(current_tapes, current_tape_indices))
+    action_dict = current_card[scanned_symbols]
+
+    #
+    # Write to the tapes, and step the tape heads
+    for tape, index, character_to_write in zip(current_tapes, current_tape_indices, action_dict['write']):
+        tape[index] = character_to_write
+    new_tape_indices = tuple(index + step_size for index, step_size in zip(current_tape_indices, action_dict['step']))
+
+    #
+    # Return the updated parameters
+    return (current_tapes, new_tape_indices, action_dict['next_state'])
+
+
+# Function to work out the number of tapes a multi-tape program is for (from the length of its first key)
+def number_of_tapes(state_machine):
+    for state, card in state_machine.items():
+        if state != HALT_STATE:
+            for scanned_symbols in card:
+                return len(scanned_symbols)
+    raise ValueError('The program has no transitions')
+
+
+##############################################################################
+# Compiled multi-tape engine
+##############################################################################
+#
+# The compiled form of a multi-tape program. As for 'CompiledProgram' in 'TMulator_compiled.py', but with a write
+# table and a step table for each tape, and rows of width ** k entries (the 'row_size'). The 'next_table' holds the
+# offset of the next row, or -(offset + 1) for a missing transition.
+CompiledMultitapeProgram = namedtuple('CompiledMultitapeProgram', ['symbols', 'symbol_codes', 'states', 'state_rows', 'card_states',
+                                                                   'tapes', 'width', 'row_size', 'write_tables', 'step_tables',
+                                                                   'next_table'])
+
+
+# Function to turn a multi-tape program into its compiled form. Any symbols passed in 'symbols' are given the first codes
+def compile_multitape_program(state_machine, symbols=()):
+    tapes = number_of_tapes(state_machine)
+    #
+    # Intern the symbols, and give every state a row (with the halting state on row 0)
+    symbol_list = []
+    symbol_codes = {}
+    for symbol in symbols:
+        _intern_symbol(symbol, symbol_list, symbol_codes)
+    state_list = [HALT_STATE]
+    state_rows = {HALT_STATE: 0}
+    cards = {state: card for state, card in state_machine.items() if state != HALT_STATE}
+    for state, card in cards.items():
+        if state not in state_rows:
+            state_rows[state] = len(state_list)
+            state_list.append(state)
+        for scanned_symbols, action_dict in card.items():
+            if len(scanned_symbols) != tapes or len(action_dict['write']) != tapes or len(action_dict['step']) != tapes:
+                raise ValueError('Card {!r}, symbols {!r}: every key and action must be for {} tapes'.format(state, scanned_symbols, tapes))
+            for symbol in scanned_symbols + tuple(action_dict['write']):
+                _intern_symbol(symbol, symbol_list, symbol_codes)
+    for card in cards.values():
+        for action_dict in card.values():
+            if action_dict['next_state'] not in state_rows:
+                state_rows[action_dict['next_state']] = len(state_list)
+                state_list.append(action_dict['next_state'])
+
+    #
+    # Fill in the tables, starting with every transition missing (leave the symbols alone, don't move, and stop)
+    width = len(symbol_list)
+    row_size = width ** tapes
+    number_of_entries = len(state_list) * row_size
+    if number_of_entries > MAX_TABLE_ENTRIES:
+        raise ValueError('{} states of {} tapes of {} symbols need too big a table'.format(len(state_list), tapes, width))
+    write_tables = [[(index % row_size) // width ** tape % width for index in range(number_of_entries)] for tape in range(tapes)]
+    step_tables = [[0] * number_of_entries for tape in range(tapes)]
+    next_table = [-((index - index % row_size) + 1) for index in range(number_of_entries)]
+    for state, card in cards.items():
+        row_offset = state_rows[state] * row_size
+        for scanned_symbols, action_dict in card.items():
+            index = row_offset + sum(symbol_codes[symbol] * width ** tape for tape, symbol in enumerate(scanned_symbols))
+            for tape in range(tapes):
+                write_tables[tape][index] = symbol_codes[action_dict['write'][tape]]
+                step_tables[tape][index] = action_dict['step'][tape]
+            next_table[index] = state_rows[action_dict['next_state']] * row_size
+    return CompiledMultitapeProgram(tuple(symbol_list), symbol_codes, tuple(state_list), state_rows, frozenset(cards), tapes, width,
+                                    row_size, write_tables, step_tables, next_table)
+
+
+# Function to run a compiled multi-tape program on a list of 'Tape's (which are updated in place), starting in the given
+# state with the heads at the given tape indices, for at most 'max_steps' steps. Returns the final tape indices (as a
+# tuple), the final state and the number of steps taken. As with 'run_compiled()', a missing transition raises a
+# 'MissingTransition' (for the tuple of scanned symbols, or for the state if it has no card), whose 'tape_index' is
+# the tuple of tape indices.
+def run_multitape_compiled(compiled, tapes, tape_indices, state, max_steps):
+    for tape in tapes:
+        tape.use_alphabet(compiled.symbols)
+    width = compiled.width
+    row_size = compiled.row_size
+    write_tables = compiled.write_tables
+    step_tables = compiled.step_tables
+    next_table = compiled.next_table
+    (cells, origins) = map(list, zip(*[tape.cells_at(tape_index) for tape, tape_index in zip(tapes, tape_indices)]))
+    heads = [tape_index + origin for tape_index, origin in zip(tape_indices, origins)]
+    row_offset = compiled.state_rows[state] * row_size
+    steps_taken = 0
+
+    #
+    # Step the machine, in the same way as 'run_compiled()' does: the inner loop stops when a head steps off the LHS end
+    # of its cells, and a read beyond the RHS end raises an IndexError (before anything has been written), and either
+    # way we grow the tapes and carry on. Two tapes (the commonest case) get a loop of their own.
+    while steps_taken < max_steps and row_offset > 0:
+        for number, tape in enumerate(tapes):
+            if not 0 <= heads[number] < len(cells[number]):
+                tape_index = heads[number] - origins[number]
+                (cells[number], origins[number]) = tape.cells_at(tape_index)      # Growing the tape (or making it sparse)
+                heads[number] = tape_index + origins[number]
+        steps = 0
+        try:
+            if compiled.tapes == 2:
+                (cells_1, cells_2) = cells
+                (write_1, write_2) = write_tables
+                (step_1, step_2) = step_tables
+                (head_1, head_2) = heads
+                try:
+                    for steps in range(1, max_steps - steps_taken + 1):
+                        index = row_offset + cells_1[head_1] + cells_2[head_2] * width
+                        cells_1[head_1] = write_1[index]
+                        cells_2[head_2] = write_2[index]
+                        head_1 += step_1[index]
+                        head_2 += step_2[index]
+                        row_offset = next_table[index]
+                        if row_offset <= 0 or head_1 < 0 or head_2 < 0:
+                            break
+                finally:
+                    heads[:] = (head_1, head_2)
+            else:
+                numbers = range(compiled.tapes)
+                multipliers = [width ** number for number in numbers]
+                for steps in range(1, max_steps - steps_taken + 1):
+                    index = row_offset + sum([cells[number][heads[number]] * multipliers[number] for number in numbers])
+                    for number in numbers:
+                        cells[number][heads[number]] = write_tables[number][index]
+                        heads[number] += step_tables[number][index]
+                    row_offset = next_table[index]
+                    if row_offset <= 0 or min(heads) < 0:
+                        break
+        except IndexError:
+            steps -= 1              # A head was off the RHS end of its cells, so this step hasn't happened yet
+        steps_taken += steps
+
+    #
+    # Deal with a missing transition, reporting it just as the reference stepper would have done (the step which hit
+    # it has been counted, but didn't happen)
+    tape_indices = tuple(head - origin for head, origin in zip(heads, origins))
+    if row_offset < 0:
+        state = compiled.states[(-row_offset - 1) // row_size]
+        if state not in compiled.card_states:
+            raise MissingTransition(state, tape_indices, state, steps_taken - 1)
+        scanned_symbols = tuple(tape[tape_index] for tape, tape_index in zip(tapes, tape_indices))
+        raise MissingTransition(scanned_symbols, tape_indices, state, steps_taken - 1)
+    return (tape_indices, compiled.states[row_offset // row_size], steps_taken)
+
+
+# Function to run a multi-tape program on its tapes (each either a 'Tape', which is updated in place, or a list of
+# symbols, which is copied into a new 'Tape'), starting on card 1 with the heads at the given tape indices, until the
+# machine halts, or hits a missing transition, or has taken 'max_steps' steps. The 'engine' is 'compiled' or
+# 'reference' (which calls 'execute_a_multitape_step()'). Returns a 'MultitapeResult'.
+def run_multitape(state_machine, current_tapes, current_tape_indices, max_steps, engine='compiled'):
+    current_tapes = [tape if isinstance(tape, Tape) else Tape(tape) for tape in current_tapes]
+    current_tape_indices = tuple(current_tape_indices)
+    current_card_index = START_CARD_INDEX
+    time_step = 0
+    error = None
+    try:
+        if engine == 'compiled':
+            symbols = dict.fromkeys(symbol for tape in current_tapes for symbol in tape.alphabet)
+            compiled = compile_multitape_program(state_machine, symbols=symbols)
+            (current_tape_indices, current_card_index, time_step) = run_multitape_compiled(
+                compiled, current_tapes, current_tape_indices, current_card_index, max_steps)
+        else:
+            while time_step < max_steps and current_card_index != 0:
+                try:
+                    (_, current_tape_indices, current_card_index) = execute_a_multitape_step(
+                        current_tapes, current_tape_indices, state_machine[current_card_index])
+                except KeyError as key_error:
+                    raise MissingTransition(key_error.args[0], current_tape_indices, current_card_index, time_step) from None
+                time_step += 1
+    except MissingTransition as missing:
+        (time_step, current_tape_indices, current_card_index) = (missing.steps, missing.tape_index, missing.state)
+        error = 'No transition for {!r} (card index {})'.format(missing.args[0], missing.state)
+    if error is not None:
+        halt_reason = MISSING_TRANSITION
+    elif current_card_index == 0:
+        halt_reason = HALTED
+    else:
+        halt_reason = MAX_STEPS_REACHED
+    return MultitapeResult(halt_reason, time_step, tuple(current_tapes), current_tape_indices, current_card_index, error)
+
+
+##############################################################################
+# Conversion to a one-tape machine
+##############################################################################
+#
+# Various top-level parameters
+LEFT_END = '#L'             # End markers, bracketing the tracks on the one tape
+RIGHT_END = '#R'
+
+
+# Function to collect the symbols a multi-tape program (and its tapes) can use, with the fill symbol among them
+def _symbols_of(state_machine, fill_symbol, extra_symbols=()):
+    symbols = {fill_symbol: None}
+    symbols.update(dict.fromkeys(extra_symbols))
+    for state, card in state_machine.items():
+        if state != HALT_STATE:
+            for scanned_symbols, action_dict in card.items():
+                symbols.update(dict.fromkeys(scanned_symbols))
+                symbols.update(dict.fromkeys(action_dict['write']))
+    return list(symbols)
+
+
+# Function to list every track cell (a flat tuple of symbol, mark pairs) with the given symbols and marks on k tracks
+def _track_cells(symbols, marks, tapes):
+    cells = [()]
+    for _ in range(tapes):
+        cells = [cell + (symbol, mark) for cell in cells for symbol in symbols for mark in marks]
+    return cells
+
+
+# Function to work out the action of one state of the simulating machine on one cell. Returns (write, step, next state)
+def _simulated_action(state_machine, tapes, blank_cell, state, cell):
+    kind = state[0]
+    if cell == LEFT_END and kind in ('collect', 'return'):
+        if kind == 'return' and state[1] == HALT_STATE:
+            return (LEFT_END, 0, HALT_STATE)
+        return (LEFT_END, +1, ('collect', state[1], (None,) * tapes))
+    if kind == 'collect':
+        (_, current_state, found) = state
+        if cell == RIGHT_END:
+            action_dict = state_machine.get(current_state, {}).get(found) if None not in found else None
+            if not isinstance(action_dict, dict):
+                return (RIGHT_END, 0, ('missing', current_state, found))
+            (write, steps) = (tuple(action_dict['write']), tuple(action_dict['step']))
+            return (RIGHT_END, -1, ('left', action_dict['next_state'], write, steps, (0,) * tapes, (False,) * tapes, False))
+        found = tuple(cell[2 * tape] if cell[2 * tape + 1] == 1 else found[tape] for tape in range(tapes))
+        return (cell, +1, ('collect', current_state, found))
+    if kind == 'return':
+        return (cell, -1, state)
+    if kind in ('left_end', 'right_end'):
+        end = LEFT_END if kind == 'left_end' else RIGHT_END
+        next_state = ('right', state[1], state[2], (0,) * tapes, False) if kind == 'left_end' else ('return', state[1])
+        return (end, +1 if kind == 'left_end' else -1, next_state)
+    if kind == 'left':
+        (_, next_state, write, steps, countdowns, done, beyond) = state
+        if cell == LEFT_END:
+            if not any(countdowns):
+                return (LEFT_END, +1, ('right', next_state, steps, (0,) * tapes, False))
+            (cell, beyond) = (blank_cell, True)     # A mark is being carried past the end, so push the end outwards
+        cell = list(cell)
+        (countdowns, done) = (list(countdowns), list(done))
+        for tape in range(tapes):
+            if countdowns[tape]:
+                countdowns[tape] -= 1
+                if not countdowns[tape]:
+                    cell[2 * tape + 1] = 1          # A carried mark arrives
+            elif cell[2 * tape + 1] == 1 and not done[tape]:
+                cell[2 * tape] = write[tape]        # A head's cell: write the new symbol, and carry (or leave) its mark
+                done[tape] = True
+                if steps[tape] < 0:
+                    (cell[2 * tape + 1], countdowns[tape]) = (0, -steps[tape])
+                elif steps[tape] > 0:
+                    cell[2 * tape + 1] = 2          # To be carried right on the next sweep
+        if beyond and not any(countdowns):
+            return (tuple(cell), -1, ('left_end', next_state, steps))
+        return (tuple(cell), -1, ('left', next_state, write, steps, tuple(countdowns), tuple(done), beyond))
+    if kind == 'right':
+        (_, next_state, steps, countdowns, beyond) = state
+        if cell == RIGHT_END:
+            if not any(countdowns):
+                return (RIGHT_END, -1, ('return', next_state))
+            (cell, beyond) = (blank_cell, True)
+        cell = list(cell)
+        countdowns = list(countdowns)
+        for tape in range(tapes):
+            if countdowns[tape]:
+                countdowns[tape] -= 1
+                if not countdowns[tape]:
+                    cell[2 * tape + 1] = 1
+            elif cell[2 * tape + 1] == 2 and steps[tape] > 0:
+                (cell[2 * tape + 1], countdowns[tape]) = (0, steps[tape])
+        if beyond and not any(countdowns):
+            return (tuple(cell), +1, ('right_end', next_state))
+        return (tuple(cell), +1, ('right', next_state, steps, tuple(countdowns), beyond))
+    raise ValueError('Unknown simulation state {!r}'.format(state))
+
+
+# Function to convert a k-tape program into a one-tape program (in the usual card format) which simulates it, on a tape
+# made by 'encode_tapes()'. Only the states reachable from the start state are generated, and they are numbered in the
+# order they are found (with card 1 to start on, and 0 to halt). States with no card stand for the k-tape machine's
+# missing transitions. The one-tape symbols are the track cells and the end markers, so there are (3 * number of
+# symbols) ** k + 2 of them, which must be no more than the 256 a 'Tape' can hold.
+def single_tape_program(state_machine, fill_symbol=DEFAULT_FILL_SYMBOL, extra_symbols=()):
+    tapes = number_of_tapes(state_machine)
+    symbols = _symbols_of(state_machine, fill_symbol, extra_symbols)
+    blank_cell = (fill_symbol, 0) * tapes
+    plain_cells = _track_cells(symbols, (0, 1), tapes)
+    cells_by_kind = {'collect': plain_cells + [LEFT_END, RIGHT_END], 'return': plain_cells + [LEFT_END],
+                     'left': plain_cells + [LEFT_END], 'left_end': [blank_cell],
+                     'right_end': [blank_cell], 'right': _track_cells(symbols, (0, 1, 2), tapes) + [RIGHT_END]}
+    start = ('collect', START_CARD_INDEX, (None,) * tapes)
+    numbers = {HALT_STATE: HALT_STATE, start: START_CARD_INDEX}
+    program = {HALT_STATE: 'Placemarker card for halting state 0'}
+    pending = deque([start])
+    while pending:
+        state = pending.popleft()
+        card = program[numbers[state]] = {}
+        for cell in cells_by_kind[state[0]]:
+            (write, step, next_state) = _simulated_action(state_machine, tapes, blank_cell, state, cell)
+            if next_state not in numbers:
+                numbers[next_state] = len(numbers)
+                if next_state[0] != 'missing':
+                    pending.append(next_state)
+            card[cell] = {'write': write, 'step': step, 'next_state': numbers[next_state]}
+    return program
+
+
+# Function to lay out k tapes (lists of symbols, or 'Tape's) as tracks on one 'Tape', for the program made by
+# 'single_tape_program()'. Returns the tape, the index to start on (the '#L' end marker), and the logical index of
+# the k tapes which the first track cell stands for (needed by 'decode_tapes()')
+def encode_tapes(current_tapes, current_tape_indices, fill_symbol=DEFAULT_FILL_SYMBOL):
+    current_tapes = [tape if isinstance(tape, Tape) else Tape(tape, fill_symbol=fill_symbol) for tape in current_tapes]
+    first_index = min([tape.first_index for tape in current_tapes] + list(current_tape_indices))
+    last_index = max([tape.last_index for tape in current_tapes] + list(current_tape_indices))
+    cells = [LEFT_END]
+    for index in range(first_index, last_index + 1):
+        cell = ()
+        for tape, tape_index in zip(current_tapes, current_tape_indices):
+            cell += (tape[index], 1 if index == tape_index else 0)
+        cells.append(cell)
+    cells.append(RIGHT_END)
+    return (Tape(cells, fill_symbol=(fill_symbol, 0) * len(current_tapes)), 0, first_index)
+
+
+# Function to read k tapes back off a one-tape simulation, returning them (as 'Tape's) and their head indices
+def decode_tapes(tape, first_index, tapes, fill_symbol=DEFAULT_FILL_SYMBOL):
+    decoded = [Tape(fill_symbol=fill_symbol) for _ in range(tapes)]
+    tape_indices = [None] * tapes
+    for position in range(tape.first_index, tape.last_index + 1):
+        cell = tape[position]
+        if cell in (LEFT_END, RIGHT_END):
+            continue
+        index = position - 1 + first_index     # Cells never move, so position 1 always stands for 'first_index'
+        for number in range(tapes):
+            if cell[2 * number] != fill_symbol:
+                decoded[number][index] = cell[2 * number]
+            if cell[2 * number + 1] == 1:
+                tape_indices[number] = index
+    return (decoded, tuple(tape_indices))
+
+
+##############################################################################
+# Validation
+##############################################################################
+#
+# Function to describe a tape's contents regardless of how far it has grown (as the index of its first non-fill cell,
+# and its symbols from there to its last non-fill cell)
+def _contents(tape):
+    symbols = tape.to_list()
+    first_index = tape.first_index
+    while symbols and symbols[0] == tape.fill_symbol:
+        symbols.pop(0)
+        first_index += 1
+    while symbols and symbols[-1] == tape.fill_symbol:
+        symbols.pop()
+    return (first_index, symbols) if symbols else (0, [])
+
+
+# Function to run a multi-tape program with the compiled engine, the reference stepper and as a one-tape simulation
+# (with the one-tape compiled engine), returning a list of the ways in which they differ (empty if they all agree).
+# The simulation is run to the end (it takes many more steps), so 'max_steps' should be enough for the machine to halt.
+def check_multitape(state_machine, current_tapes, current_tape_indices, max_steps, fill_symbol=DEFAULT_FILL_SYMBOL):
+    from TMulator import run
+    results = {engine: run_multitape(state_machine, [list(tape) for tape in current_tapes], current_tape_indices, max_steps, engine)
+               for engine in ('compiled', 'reference')}
+    outcomes = {engine: (result.halt_reason, result.steps, result.tape_indices, result.card_index,
+                         [_contents(tape) for tape in result.tapes]) for engine, result in results.items()}
+    problems = []
+    if outcomes['compiled'] != outcomes['reference']:
+        problems.append('compiled {!r} != reference {!r}'.format(outcomes['compiled'], outcomes['reference']))
+    reference = results['reference']
+    if reference.halt_reason == MAX_STEPS_REACHED:
+        return problems             # The simulation would just run for (many times) longer
+    extra_symbols = [symbol for tape in current_tapes for symbol in tape]
+    program = single_tape_program(state_machine, fill_symbol, extra_symbols)
+    max_step_size = max([abs(step) for card in state_machine.values() if isinstance(card, dict)
+                         for action_dict in card.values() for step in action_dict['step']] or [0])
+    (tape, tape_index, first_index) = encode_tapes([list(tape) for tape in current_tapes], current_tape_indices, fill_symbol)
+    simulated = run(program, tape, tape_index, max_steps=10 * (reference.steps + 1) * (len(tape) + 2 * reference.steps * max_step_size + 10))
+    (decoded, tape_indices) = decode_tapes(simulated.tape, first_index, len(current_tapes), fill_symbol)
+    if reference.halt_reason == HALTED:
+        outcome = (simulated.halt_reason, tape_indices, [_contents(tape) for tape in decoded])
+        expected = (HALTED, reference.tape_indices, [_contents(tape) for tape in reference.tapes])
+        if outcome != expected:
+            problems.append('one-tape simulation {!r} != {!r}'.format(outcome, expected))
+    elif simulated.halt_reason != MISSING_TRANSITION:
+        problems.append('one-tape simulation ended {}, not {}'.format(simulated.halt_reason, MISSING_TRANSITION))
+    return problems
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to look up a program, tapes or start cell indices by name from 'TMulator.py' and its companion module
+def _find(name):
+    import TMulator
+    if not hasattr(TMulator, name):
+        raise SystemExit('Unknown name {!r}'.format(name))
+    return getattr(TMulator, name)
+
+
+# Function to parse the command line, and run a multi-tape program, or check the engines (and the one-tape
+# simulation) against each other on the bundled multi-tape programs
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run multi-tape TM programs, or check the multi-tape engines')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='Run a multi-tape program')
+    run_parser.add_argument('program', help="Name of the program, e.g. 'MULTITAPE_PROGRAM_01'")
+    run_parser.add_argument('tapes', help="Name of the tapes, e.g. 'MULTITAPE_TAPES_01'")
+    run_parser.add_argument('starts', help="Name of the start cell indices, e.g. 'START_CELL_INDICES_01'")
+    run_parser.add_argument('--max-steps', type=int, default=1000000)
+    run_parser.add_argument('--engine', choices=('compiled', 'reference'), default='compiled')
+    subparsers.add_parser('check', help='Check every bundled multi-tape program on its tapes')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        result = run_multitape(_find(args.program), [list(tape) for tape in _find(args.tapes)], _find(args.starts),
+                               args.max_steps, args.engine)
+        print('{} after {} steps'.format(result.halt_reason, result.steps))
+        for number, (tape, tape_index) in enumerate(zip(result.tapes, result.tape_indices), 1):
+            print('Tape {}:- {}  tape index:- {}'.format(number, tape, tape_index))
+        print('Current card index:- ', result.card_index)
+        return
+    import TMulator
+    failed = 0
+    for name in sorted(name for name in dir(TMulator) if name.startswith('MULTITAPE_PROGRAM_')):
+        suffix = name[len('MULTITAPE_PROGRAM_'):]
+        problems = check_multitape(getattr(TMulator, name), getattr(TMulator, 'MULTITAPE_TAPES_' + suffix),
+                                   getattr(TMulator, 'START_CELL_INDICES_' + suffix), 10000)
+        print('{}:- {}'.format(name, 'OK' if not problems else ''))
+        for problem in problems:
+            print('    ' + problem)
+        failed += bool(problems)
+    raise SystemExit(1 if failed else 0)
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
@@ -72,7 +72,7 @@ PROGRAM_03 =    { # This program acts as an AND gate for the two bits enclosed i
                             1: { 'write': 1, 'step': +1, 'next_state': 4}   # Re-write the bit, step right, stay in this state
                         }, 
                     3:  { # The result has been decided as 0, so write this and halt (we are expecting to overwrite a blank)
-                            '_': { 'write': '0', 'step': 0, 'next_state': 0},  # Write the 0, then halt
+                            '_': { 'write': 0, 'step': 0, 'next_state': 0},  # Write the 0, then halt
                             0: { 'write': 'E', 'step': 0, 'next_state': 0},   # Expecting '_', so Error and halt
                             1: { 'write': 'E', 'step': 0, 'next_state': 0},   # Expecting '_', so Error and halt
                         },
@@ -82,7 +82,7 @@ PROGRAM_03 =    { # This program acts as an AND gate for the two bits enclosed i
                             1: { 'write': 1, 'step': +2, 'next_state': 5}   # Result must be 1, so jump to where to write that
                         },
                     5:  { # The result has been decided as 1, so write this and halt (we are expecting to overwrite a blank)
-                            '_': { 'write': '1', 'step': 0, 'next_state': 0},  # Write the 1, then halt
+                            '_': { 'write': 1, 'step': 0, 'next_state': 0},  # Write the 1, then halt
                             0: { 'write': 'E', 'step': 0, 'next_state': 0},   # Expecting '_', so Error and halt
                             1: { 'write': 'E', 'step': 0, 'next_state': 0},   # Expecting '_', so Error and halt
                         },                   
@@ -365,6 +365,149 @@ PROGRAM_11 =    { # This program takes a single unary number, and outputs the sa
                         },                                                                        
                 }
 
+PROGRAM_12 =    { # This program takes a binary number enclosed in blanks, starting on the LHS blank, and increments it over and over (as PROGRAM_01 does once), halting when it wraps round to all 0s
+                    0: 'Placemarker card for halting state 0',
+                    1:  { # Starting state - it should be sitting on the LHS blank, otherwise stop, there must be an error
+                            '_': { 'write': '_', 'step': +1, 'next_state': 2},  # Step right of the blank, and move to state 2
+                            0: { 'write': 'E', 'step': 0, 'next_state': 0},   # Write 'E' (for error) and stop
+                            1: { 'write': 'E', 'step': 0, 'next_state': 0}     # Write 'E' (for error) and stop
+                        },
+                    2:  {  # This the state which searches for the RHS blank, then steps 1 left and enters state 3, to do the actual incrementing
+                            '_': { 'write': '_', 'step': -1, 'next_state': 3},  # We've found the blank, re-write it, step left and enter state 3
+                            0: { 'write': 0, 'step': +1, 'next_state': 2},   # Keep moving right and stay in this state
+                            1: { 'write': 1, 'step': +1, 'next_state': 2}   # Keep moving right and stay in this state
+                        },
+                    3:  {  # State which actually does the incrementing
+                            '_': { 'write': '_', 'step': 0, 'next_state': 0},  # If we hit the LHS blank, the number has wrapped round to all 0s, so halt
+                            0: { 'write': 1, 'step': -1, 'next_state': 4},   # Change 0 to 1, and go back to the LHS blank
+                            1: { 'write': 0, 'step': -1, 'next_state': 3}   # Change 1 to 0 and move left, looking to increment the next more significant bit
+                        },
+                    4:  {  # This state returns to the LHS blank, then steps 1 right to increment the number again
+                            '_': { 'write': '_', 'step': +1, 'next_state': 2},  # We've found the blank, so go round again
+                            0: { 'write': 0, 'step': -1, 'next_state': 4},   # Keep moving left and stay in this state
+                            1: { 'write': 1, 'step': -1, 'next_state': 4}   # Keep moving left and stay in this state
+                        },
+                }
+
+PROGRAM_13 =    { # This program takes a binary number enclosed in blanks, starting on the LHS blank, and decrements it over and over (as PROGRAM_08 does once), halting when it wraps round to all 1s
+                    0: 'Placemarker card for halting state 0',
+                    1:  { # Starting state - it should be sitting on the LHS blank, otherwise stop, there must be an error
+                            '_': { 'write': '_', 'step': +1, 'next_state': 2},  # Step right of the blank, and move to state 2
+                            0: { 'write': 'E', 'step': 0, 'next_state': 0},   # Write 'E' (for error) and stop
+                            1: { 'write': 'E', 'step': 0, 'next_state': 0}     # Write 'E' (for error) and stop
+                        },
+                    2:  {  # This the state which searches for the RHS blank, then steps 1 left and enters state 3, to do the actual decrementing
+                            '_': { 'write': '_', 'step': -1, 'next_state': 3},  # We've found the blank, re-write it, step left and enter state 3
+                            0: { 'write': 0, 'step': +1, 'next_state': 2},   # Keep moving right and stay in this state
+                            1: { 'write': 1, 'step': +1, 'next_state': 2}   # Keep moving right and stay in this state
+                        },
+                    3:  {  # State which actually does the decrementing
+                            '_': { 'write': '_', 'step': 0, 'next_state': 0},  # If we hit the LHS blank, the number has wrapped round to all 1s, so halt
+                            0: { 'write': 1, 'step': -1, 'next_state': 3},   # Change 0 to 1 and move left, looking to borrow from the next more significant bit
+                            1: { 'write': 0, 'step': -1, 'next_state': 4}   # Change 1 to 0, and go back to the LHS blank
+                        },
+                    4:  {  # This state returns to the LHS blank, then steps 1 right to decrement the number again
+                            '_': { 'write': '_', 'step': +1, 'next_state': 2},  # We've found the blank, so go round again
+                            0: { 'write': 0, 'step': -1, 'next_state': 4},   # Keep moving left and stay in this state
+                            1: { 'write': 1, 'step': -1, 'next_state': 4}   # Keep moving left and stay in this state
+                        },
+                }
+
+#
+# Busy beavers. These are the classic 2-symbol machines which, for their number of states, run for the longest before
+# halting when started on a blank tape (of 0s). Unlike the programs above they use 0 as the blank, so they run off the
+# ends of any finite tape, and need the unbounded tape ('Tape' in 'TMulator_tape.py') to run to completion
+BUSY_BEAVER_3 = { # 3-state busy beaver:- halts after 21 steps, leaving 5 1's on the tape
+                    0: 'Placemarker card for halting state 0',
+                    1:  { 0: { 'write': 1, 'step': +1, 'next_state': 2}, 1: { 'write': 1, 'step': +1, 'next_state': 0} },
+                    2:  { 0: { 'write': 1, 'step': -1, 'next_state': 2}, 1: { 'write': 0, 'step': +1, 'next_state': 3} },
+                    3:  { 0: { 'write': 1, 'step': -1, 'next_state': 3}, 1: { 'write': 1, 'step': -1, 'next_state': 1} },
+                }
+
+BUSY_BEAVER_4 = { # 4-state busy beaver:- halts after 107 steps, leaving 13 1's on the tape
+                    0: 'Placemarker card for halting state 0',
+                    1:  { 0: { 'write': 1, 'step': +1, 'next_state': 2}, 1: { 'write': 1, 'step': -1, 'next_state': 2} },
+                    2:  { 0: { 'write': 1, 'step': -1, 'next_state': 1}, 1: { 'write': 0, 'step': -1, 'next_state': 3} },
+                    3:  { 0: { 'write': 1, 'step': +1, 'next_state': 0}, 1: { 'write': 1, 'step': -1, 'next_state': 4} },
+                    4:  { 0: { 'write': 1, 'step': +1, 'next_state': 4}, 1: { 'write': 0, 'step': +1, 'next_state': 1} },
+                }
+
+BUSY_BEAVER_5 = { # 5-state busy beaver:- halts after 47,176,870 steps, leaving 4,098 1's on the tape
+                    0: 'Placemarker card for halting state 0',
+                    1:  { 0: { 'write': 1, 'step': +1, 'next_state': 2}, 1: { 'write': 1, 'step': -1, 'next_state': 3} },
+                    2:  { 0: { 'write': 1, 'step': +1, 'next_state': 3}, 1: { 'write': 1, 'step': +1, 'next_state': 2} },
+                    3:  { 0: { 'write': 1, 'step': +1, 'next_state': 4}, 1: { 'write': 0, 'step': -1, 'next_state': 5} },
+                    4:  { 0: { 'write': 1, 'step': -1, 'next_state': 1}, 1: { 'write': 1, 'step': -1, 'next_state': 4} },
+                    5:  { 0: { 'write': 1, 'step': +1, 'next_state': 0}, 1: { 'write': 0, 'step': -1, 'next_state': 1} },
+                }
+
+#
+# Multi-tape programs (see 'TMulator_multitape.py'). These have one R/W head on each of several tapes, so each card is
+# keyed by the tuple of scanned symbols (one per tape), and each action writes a tuple of symbols and steps by a tuple
+# of steps. They do in O(n) steps what PROGRAM_06 and PROGRAM_09/10 need O(n^2) steps (or big jumps) for on one tape
+MULTITAPE_PROGRAM_00 = { # 2 tapes:- copies a binary number enclosed in blanks on tape 1 onto tape 2, starting on the LHS blanks
+                    0: 'Placemarker card for halting state 0',
+                    1:  { # Starting state - tape 1 should be on the LHS blank, otherwise stop, there must be an error
+                            ('_', '_'): { 'write': ('_', '_'), 'step': (+1, +1), 'next_state': 2},  # Step both heads right, and start copying
+                            ('_', 0): { 'write': ('_', '_'), 'step': (+1, +1), 'next_state': 2},    # (tape 2 may be blank or 0-filled)
+                            ('_', 1): { 'write': ('_', '_'), 'step': (+1, +1), 'next_state': 2},
+                            (0, '_'): { 'write': ('E', '_'), 'step': (0, 0), 'next_state': 0},      # Write 'E' (for error) and stop
+                            (0, 0): { 'write': ('E', 0), 'step': (0, 0), 'next_state': 0},
+                            (0, 1): { 'write': ('E', 1), 'step': (0, 0), 'next_state': 0},
+                            (1, '_'): { 'write': ('E', '_'), 'step': (0, 0), 'next_state': 0},
+                            (1, 0): { 'write': ('E', 0), 'step': (0, 0), 'next_state': 0},
+                            (1, 1): { 'write': ('E', 1), 'step': (0, 0), 'next_state': 0},
+                        },
+                    2:  { # Copy each bit across, stepping both heads right, until the RHS blank on tape 1
+                            ('_', '_'): { 'write': ('_', '_'), 'step': (0, 0), 'next_state': 0},    # End of the number, so blank the end of the copy and halt
+                            ('_', 0): { 'write': ('_', '_'), 'step': (0, 0), 'next_state': 0},
+                            ('_', 1): { 'write': ('_', '_'), 'step': (0, 0), 'next_state': 0},
+                            (0, '_'): { 'write': (0, 0), 'step': (+1, +1), 'next_state': 2},        # Copy a 0, and step both heads right
+                            (0, 0): { 'write': (0, 0), 'step': (+1, +1), 'next_state': 2},
+                            (0, 1): { 'write': (0, 0), 'step': (+1, +1), 'next_state': 2},
+                            (1, '_'): { 'write': (1, 1), 'step': (+1, +1), 'next_state': 2},        # Copy a 1, and step both heads right
+                            (1, 0): { 'write': (1, 1), 'step': (+1, +1), 'next_state': 2},
+                            (1, 1): { 'write': (1, 1), 'step': (+1, +1), 'next_state': 2},
+                        },
+                }
+
+MULTITAPE_PROGRAM_01 = { # 2 tapes:- compares binary numbers enclosed in blanks on tapes 1 and 2, writing 1 over tape 1's RHS blank if they are equal, 0 otherwise
+                    0: 'Placemarker card for halting state 0',
+                    1:  { # Starting state - both tapes should be on their LHS blanks, otherwise stop, there must be an error
+                            ('_', '_'): { 'write': ('_', '_'), 'step': (+1, +1), 'next_state': 2},  # Step both heads right, and start comparing
+                            ('_', 0): { 'write': ('E', 0), 'step': (0, 0), 'next_state': 0},        # Write 'E' (for error) and stop
+                            ('_', 1): { 'write': ('E', 1), 'step': (0, 0), 'next_state': 0},
+                            (0, '_'): { 'write': ('E', '_'), 'step': (0, 0), 'next_state': 0},
+                            (0, 0): { 'write': ('E', 0), 'step': (0, 0), 'next_state': 0},
+                            (0, 1): { 'write': ('E', 1), 'step': (0, 0), 'next_state': 0},
+                            (1, '_'): { 'write': ('E', '_'), 'step': (0, 0), 'next_state': 0},
+                            (1, 0): { 'write': ('E', 0), 'step': (0, 0), 'next_state': 0},
+                            (1, 1): { 'write': ('E', 1), 'step': (0, 0), 'next_state': 0},
+                        },
+                    2:  { # Compare each pair of bits, stepping both heads right while they match
+                            ('_', '_'): { 'write': (1, '_'), 'step': (0, 0), 'next_state': 0},      # Both numbers ended together, so they are equal. Write 1 and halt
+                            ('_', 0): { 'write': (0, 0), 'step': (0, 0), 'next_state': 0},          # Tape 1's number ended first, so they differ. Write 0 and halt
+                            ('_', 1): { 'write': (0, 1), 'step': (0, 0), 'next_state': 0},
+                            (0, '_'): { 'write': (0, '_'), 'step': (+1, 0), 'next_state': 3},       # Tape 2's number ended first, so they differ
+                            (0, 0): { 'write': (0, 0), 'step': (+1, +1), 'next_state': 2},          # The bits match, so step both heads right
+                            (0, 1): { 'write': (0, 1), 'step': (+1, 0), 'next_state': 3},           # The bits differ
+                            (1, '_'): { 'write': (1, '_'), 'step': (+1, 0), 'next_state': 3},
+                            (1, 0): { 'write': (1, 0), 'step': (+1, 0), 'next_state': 3},
+                            (1, 1): { 'write': (1, 1), 'step': (+1, +1), 'next_state': 2},
+                        },
+                    3:  { # The numbers differ, so step tape 1's head right to its RHS blank, write 0 there and halt
+                            ('_', '_'): { 'write': (0, '_'), 'step': (0, 0), 'next_state': 0},
+                            ('_', 0): { 'write': (0, 0), 'step': (0, 0), 'next_state': 0},
+                            ('_', 1): { 'write': (0, 1), 'step': (0, 0), 'next_state': 0},
+                            (0, '_'): { 'write': (0, '_'), 'step': (+1, 0), 'next_state': 3},
+                            (0, 0): { 'write': (0, 0), 'step': (+1, 0), 'next_state': 3},
+                            (0, 1): { 'write': (0, 1), 'step': (+1, 0), 'next_state': 3},
+                            (1, '_'): { 'write': (1, '_'), 'step': (+1, 0), 'next_state': 3},
+                            (1, 0): { 'write': (1, 0), 'step': (+1, 0), 'next_state': 3},
+                            (1, 1): { 'write': (1, 1), 'step': (+1, 0), 'next_state': 3},
+                        },
+                }
+
 ##############################################################################
 # Tapes (and starting-cell indices)
 ##############################################################################
@@ -377,6 +520,11 @@ TAPE_04 = ['_', 1, 0, 0, 0, '_', '_', '_', '_', '_', '_', 0, 0, 0, 0]; START_CEL
 TAPE_05 = ['_', 1, 1, 1, 1, '_', 1, 1, 1, 1, 1, '_', 0, 0, 0]; START_CELL_INDEX_05 = 0   # PROGRAM_07:- For adding two unary numbers separated by a blank
 TAPE_06 = ['_', 0, 1, '_', 1, 0, '_', '_', '_', 0 ]; START_CELL_INDEX_06 = 0   # PROGRAM_09/10:- Detect if two 2-bit binary numbers are equal or not, write 1 if they are, 0 otherwise, in middle if the 3 RHS blanks
 TAPE_07 = ['_', 1, 1, 0, '_', 0, 0, '_', '_', '_' ]; START_CELL_INDEX_07 = 0   # PROGRAM_11:- Read unary number (0-3), write it in binary (2-bits)
+TAPE_08 = [0]; START_CELL_INDEX_08 = 0   # BUSY_BEAVER_3/4/5:- A blank tape (which grows as needed)
+TAPE_09 = ['_', 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, '_']; START_CELL_INDEX_09 = 0   # PROGRAM_12:- A 16-bit binary number (0), to count up from, 65,535 times
+TAPE_10 = ['_', 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, '_']; START_CELL_INDEX_10 = 0   # PROGRAM_13:- A 16-bit binary number (65,535), to count down from, 65,535 times
+MULTITAPE_TAPES_00 = (['_', 1, 0, 1, 1, '_'], ['_']); START_CELL_INDICES_00 = (0, 0)   # MULTITAPE_PROGRAM_00:- Copy a 4-bit binary number onto a blank tape
+MULTITAPE_TAPES_01 = (['_', 1, 0, 1, 1, '_'], ['_', 1, 0, 1, 1, '_']); START_CELL_INDICES_01 = (0, 0)   # MULTITAPE_PROGRAM_01:- Compare two 4-bit binary numbers
 
 #
 ################################################################################
@@ -0,0 +1,496 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a local job service,
+# which accepts TM runs over a Unix socket (or a localhost TCP port), queues them, and
+# runs them on a pool of worker processes, streaming progress and results back.
+#
+# The protocol is one JSON object per line in each direction. A request looks like:
+#
+# {"id": "job-1", "program": "PROGRAM_01", "tape": ["_", 1, 0, "_"], "tape_index": 0,
+#  "max_steps": 1000000, "timeout": 10.0, "progress_every": 100000, "detect_loops": false}
+#
+# where "program" is either the name of a bundled program, or a program body in the format read
+# by 'TMulator_loader.py' ({"transitions": [[state, symbol, write, step, next state], ...]}).
+# Only "program" and "tape" are required. The service replies with a stream of events for the
+# job, each tagged with its "id": "queued", then "progress" (every "progress_every" steps, if
+# asked for), then a final "result" (or "error", if the request couldn't be run at all).
+#
+# Each worker process compiles each program just once, and keeps it for later requests. Jobs
+# are run in chunks of steps, so that progress can be reported, and the wall-clock timeout
+# checked, between chunks (a job which runs out of time ends with a TIMED_OUT result). The job
+# queue is bounded: once it is full, the service stops reading requests until there is room,
+# so that clients which send too much are held back (rather than the queue growing without limit).
+#
+# The service and its client ('ServiceClient' below) only ever talk over a local socket, so
+# they can be run, and tested, entirely offline. From the command line, e.g.:
+#
+# python TMulator_service.py serve --socket /tmp/tmulator.sock --processes 4
+# python TMulator_service.py submit --socket /tmp/tmulator.sock PROGRAM_01 '["_", 1, 0, "_"]'
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from TMulator_compiled import HALT_STATE, MissingTransition, compile_program, run_compiled
+from TMulator_loader import ProgramError, program_from_transitions, validate_program
+from TMulator_loops import LoopDetected, LoopDetector
+from TMulator_tape import Tape
+
+##############################################################################
+# Service parameters
+##############################################################################
+#
+# Various top-level parameters
+START_CARD_INDEX = 1                    # We always start on card index 1, and stop (halt) on card index 0
+DEFAULT_MAX_NUMBER_OF_STEPS = 1000000
+DEFAULT_TIMEOUT = 60.0                  # Seconds of wall-clock time per job
+DEFAULT_QUEUE_SIZE = 64                 # Jobs waiting for a worker, beyond which we stop reading requests
+CHUNK_STEPS = 1 << 18                   # Jobs are run at most this many steps at a time (fewer, to report progress)
+MAX_LINE_LENGTH = 1 << 26               # Longest request line we accept (tapes can be long)
+MAX_WORKER_PROGRAMS = 64                # Number of compiled programs kept by each worker
+PROGRAM_NAME_PREFIXES = ('PROGRAM_', 'BUSY_BEAVER_')   # A program given by name must be one of these from 'TMulator.py'
+
+#
+# Possible reasons for a run ending (as in 'TMulator.py', plus the service's own timeout)
+HALTED = 'HALTED'
+MAX_STEPS_REACHED = 'MAX_STEPS_REACHED'
+MISSING_TRANSITION = 'MISSING_TRANSITION'
+LOOP_DETECTED = 'LOOP_DETECTED'
+TIMED_OUT = 'TIMED_OUT'
+
+
+##############################################################################
+# Worker side
+##############################################################################
+#
+# Each worker process keeps the programs it has compiled (keyed by name, or by a hash of the program body, least recently
+# used first), and the jobs it is part way through (keyed by job id)
+_worker_programs = OrderedDict()
+_worker_jobs = {}
+
+
+# Function to look up a bundled program by name. Only the programs in 'TMulator.py' (and its companion module) can be
+# run by name, so anything else there (e.g. 'ENGINES' or 'run') is an unknown program
+def bundled_program(name):
+    import TMulator
+    state_machine = getattr(TMulator, name, None) if name.startswith(PROGRAM_NAME_PREFIXES) else None
+    if not isinstance(state_machine, dict) or not all(isinstance(card, dict) for (state, card) in state_machine.items()
+                                                      if state != HALT_STATE):
+        raise ProgramError(['unknown program {!r}'.format(name)])
+    return state_machine
+
+
+# Function to look up (compiling it if need be) a program, given either its name or its body. Any 'symbols' are given
+# the first codes (see 'compile_program()'), and the program is kept under a key which includes them (for up to
+# MAX_WORKER_PROGRAMS programs, evicting the least recently used)
+def _worker_program(program_key, program, symbols=()):
+    if symbols:
+        program_key = (program_key, tuple(symbols))
+    compiled = _worker_programs.get(program_key)
+    if compiled is None:
+        if isinstance(program, str):
+            state_machine = bundled_program(program)
+        else:
+            state_machine = program_from_transitions(program['transitions'])
+            problems = validate_program(state_machine)
+            if problems:
+                raise ProgramError(problems)
+        compiled = _worker_programs[program_key] = compile_program(state_machine, symbols=symbols)
+        if len(_worker_programs) > MAX_WORKER_PROGRAMS:
+            _worker_programs.popitem(last=False)
+    _worker_programs.move_to_end(program_key)
+    return compiled
+
+
+# Function to start a job in a worker process. If the tape holds symbols which the program never mentions (such as the
+# fill symbol, for a program which never reads it), then the program is compiled again for the tape's alphabet, so that
+# reading one of them is a missing transition, just as it is for 'run()'
+def _start_job(job_id, program_key, program, tape, tape_index, detect_loops):
+    compiled = _worker_program(program_key, program)
+    current_tape = Tape(tape, alphabet=compiled.symbols)
+    if len(current_tape.alphabet) > len(compiled.symbols):
+        compiled = _worker_program(program_key, program, current_tape.alphabet)
+    detector = LoopDetector(compiled, current_tape) if detect_loops else None
+    _worker_jobs[job_id] = [compiled, current_tape, tape_index, START_CARD_INDEX, 0, detector]
+
+
+# Function to advance a job by at most 'max_steps' steps in a worker process. Returns (steps taken so far, tape index,
+# card index, halt reason or None if the job can carry on, error or None, cycle length, entry step)
+def _advance_job(job_id, max_steps):
+    job = _worker_jobs[job_id]
+    (compiled, current_tape, tape_index, card_index, steps_taken, detector) = job
+    halt_reason = None
+    error = None
+    loop = None
+    try:
+        if detector is not None:
+            (tape_index, card_index, steps) = detector.advance(tape_index, card_index, max_steps)
+        else:
+            (tape_index, card_index, steps) = run_compiled(compiled, current_tape, tape_index, card_index, max_steps)
+        steps_taken += steps
+        if card_index == 0:
+            halt_reason = HALTED
+    except LoopDetected as loop_detected:
+        loop = loop_detected
+        (tape_index, card_index) = (loop.tape_index, loop.state)
+        steps_taken += loop.steps
+        (halt_reason, error) = (LOOP_DETECTED, str(loop))
+    except MissingTransition as missing:
+        (tape_index, card_index) = (missing.tape_index, missing.state)
+        steps_taken += missing.steps
+        halt_reason = MISSING_TRANSITION
+        error = 'No transition for {!r} (card index {})'.format(missing.args[0], missing.state)
+    job[2:5] = [tape_index, card_index, steps_taken]
+    return (steps_taken, tape_index, card_index, halt_reason, error,
+            loop.cycle_length if loop else None, loop.entry_step if loop else None)
+
+
+# Function to finish a job in a worker process, returning its final tape (as a list) and first index
+def _finish_job(job_id):
+    current_tape = _worker_jobs.pop(job_id)[1]
+    return (current_tape.to_list(), current_tape.first_index)
+
+
+##############################################################################
+# Service
+##############################################################################
+#
+# Function to work out the key a program is cached under by the workers (its name, or a hash of its body)
+def program_key(program):
+    if isinstance(program, str):
+        return program
+    return hashlib.sha256(json.dumps(program, sort_keys=True).encode()).hexdigest()
+
+
+class JobService:
+    #
+    # Create a service with a pool of 'processes' worker processes (or, if 'processes' is 0, a single worker thread in
+    # this process), and a job queue holding at most 'queue_size' jobs
+    def __init__(self, processes=None, queue_size=DEFAULT_QUEUE_SIZE):
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.queue_size = queue_size
+        self.queue = None
+        self.executors = []
+        self.workers = []
+        self.server = None
+        self.connections = {}           # Connection handler task -> its writer
+        self.job_numbers = itertools.count(1)
+
+    #
+    # Start listening on a Unix socket ('path') or a localhost TCP port ('port'), with the workers ready to go
+    async def start(self, path=None, host='127.0.0.1', port=None):
+        self.queue = asyncio.Queue(self.queue_size)
+        if self.processes:
+            self.executors = [ProcessPoolExecutor(max_workers=1) for _ in range(self.processes)]
+        else:
+            self.executors = [ThreadPoolExecutor(max_workers=1)]
+        self.workers = [asyncio.ensure_future(self._worker(executor)) for executor in self.executors]
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self._handle_connection, path=path, limit=MAX_LINE_LENGTH)
+        else:
+            self.server = await asyncio.start_server(self._handle_connection, host=host, port=port, limit=MAX_LINE_LENGTH)
+        return self.server
+
+    #
+    # Stop listening, hang up on any clients which are still connected, and shut the workers down
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        if self.server is not None:
+            await self.server.wait_closed()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        for executor in self.executors:
+            executor.shutdown(wait=True)
+
+    #
+    # Handle one client connection: read its requests, and queue them up as jobs (waiting for room in the queue if it
+    # is full, which stops us reading any more from this client until there is room)
+    async def _handle_connection(self, reader, writer):
+        self.connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                request = None
+                try:
+                    request = json.loads(line)
+                    job = self._parse_request(request)
+                except ProgramError as error:
+                    _send(writer, {'id': request.get('id'), 'event': 'error', 'message': str(error)})
+                    continue
+                except (ValueError, TypeError, KeyError) as error:
+                    request_id = request.get('id') if isinstance(request, dict) else None
+                    _send(writer, {'id': request_id, 'event': 'error', 'message': 'Bad request:- {!r}'.format(error)})
+                    continue
+                job['writer'] = writer
+                await self.queue.put(job)
+                _send(writer, {'id': job['id'], 'event': 'queued'})
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            del self.connections[asyncio.current_task()]
+
+    #
+    # Check a request, and turn it into a job
+    def _parse_request(self, request):
+        if not isinstance(request, dict):
+            raise ValueError('a request must be a JSON object')
+        program = request['program']
+        if not isinstance(program, (str, dict)):
+            raise ValueError("'program' must be a program name or a program body")
+        if isinstance(program, str):
+            bundled_program(program)        # So that an unknown program is reported before the job is queued
+        if not isinstance(request['tape'], list):
+            raise ValueError("'tape' must be a list of symbols")
+        return {
+            'id': request.get('id', next(self.job_numbers)),
+            'program': program,
+            'program_key': program_key(program),
+            'tape': request['tape'],
+            'tape_index': int(request.get('tape_index', 0)),
+            'max_steps': int(request.get('max_steps', DEFAULT_MAX_NUMBER_OF_STEPS)),
+            'timeout': float(request.get('timeout', DEFAULT_TIMEOUT)),
+            'progress_every': int(request.get('progress_every') or 0),
+            'detect_loops': bool(request.get('detect_loops', False)),
+        }
+
+    #
+    # A worker: take jobs from the queue, and run them on its executor (one process), one at a time
+    async def _worker(self, executor):
+        loop = asyncio.get_event_loop()
+        while True:
+            job = await self.queue.get()
+            try:
+                await self._run_job(loop, executor, job)
+            except Exception as error:      # Report anything unexpected to the client, and carry on with the next job
+                _send(job['writer'], {'id': job['id'], 'event': 'error', 'message': '{}: {}'.format(type(error).__name__, error)})
+            finally:
+                self.queue.task_done()
+
+    #
+    # Run one job in chunks, reporting progress between them, until it stops, runs out of steps or runs out of time
+    async def _run_job(self, loop, executor, job):
+        (job_id, writer) = (job['id'], job['writer'])
+        start_time = time.perf_counter()
+        try:
+            await loop.run_in_executor(executor, _start_job, job_id, job['program_key'], job['program'], job['tape'],
+                                       job['tape_index'], job['detect_loops'])
+        except (ProgramError, ValueError, KeyError) as error:
+            _send(writer, {'id': job_id, 'event': 'error', 'message': str(error)})
+            return
+        progress_every = job['progress_every']
+        next_progress = progress_every
+        (steps, tape_index, card_index) = (0, job['tape_index'], START_CARD_INDEX)
+        (halt_reason, error, cycle_length, entry_step) = (None, None, None, None)
+        try:
+            while halt_reason is None:
+                if steps >= job['max_steps']:
+                    halt_reason = MAX_STEPS_REACHED
+                    break
+                if time.perf_counter() - start_time > job['timeout']:
+                    halt_reason = TIMED_OUT
+                    break
+                if writer.is_closing():
+                    return                  # The client has gone, so there is no-one to tell
+                #
+                # Run the next chunk, stopping at the next multiple of 'progress_every' steps (if progress is wanted), and
+                # report progress once we get there
+                chunk = min(CHUNK_STEPS, job['max_steps'] - steps)
+                if progress_every:
+                    chunk = min(chunk, next_progress - steps)
+                (steps, tape_index, card_index, halt_reason, error, cycle_length, entry_step) = await loop.run_in_executor(
+                    executor, _advance_job, job_id, chunk)
+                if halt_reason is None and progress_every and steps >= next_progress:
+                    next_progress = (steps // progress_every + 1) * progress_every
+                    _send(writer, {'id': job_id, 'event': 'progress', 'steps': steps, 'tape_index': tape_index,
+                                   'card_index': card_index, 'wall_time': time.perf_counter() - start_time})
+                    await writer.drain()
+        finally:
+            (tape, first_index) = await loop.run_in_executor(executor, _finish_job, job_id)
+        _send(writer, {'id': job_id, 'event': 'result', 'halt_reason': halt_reason, 'steps': steps, 'tape': tape,
+                       'first_index': first_index, 'tape_index': tape_index, 'card_index': card_index,
+                       'wall_time': time.perf_counter() - start_time, 'error': error, 'cycle_length': cycle_length,
+                       'entry_step': entry_step})
+        await writer.drain()
+
+
+# Function to send one event to a client (quietly dropping it if the client has gone)
+def _send(writer, event):
+    if not writer.is_closing():
+        writer.write(json.dumps(event).encode() + b'\n')
+
+
+##############################################################################
+# Client
+##############################################################################
+#
+class ServiceClient:
+    #
+    # Create a client for a service listening on a Unix socket ('path') or a localhost TCP port ('port')
+    def __init__(self, path=None, host='127.0.0.1', port=None):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+        self.events = {}                # Job id -> queue of events for that job
+        self.receiver = None
+        self.job_numbers = itertools.count(1)
+
+    async def connect(self):
+        if self.path is not None:
+            (self.reader, self.writer) = await asyncio.open_unix_connection(self.path, limit=MAX_LINE_LENGTH)
+        else:
+            (self.reader, self.writer) = await asyncio.open_connection(self.host, self.port, limit=MAX_LINE_LENGTH)
+        self.receiver = asyncio.ensure_future(self._receive())
+        return self
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+        await asyncio.gather(self.receiver, return_exceptions=True)
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    #
+    # Hand each event from the service to the queue for its job
+    async def _receive(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            event = json.loads(line)
+            self.events.setdefault(event['id'], asyncio.Queue()).put_nowait(event)
+        for queue in self.events.values():
+            queue.put_nowait(None)          # The service has gone away
+
+    #
+    # Submit a job (a request as described at the top of this module, with an 'id' added if it has none), and return an
+    # async iterator over its events, ending with its 'result' (or 'error')
+    async def submit(self, request):
+        request = dict(request)
+        request.setdefault('id', 'client-{}'.format(next(self.job_numbers)))
+        queue = self.events.setdefault(request['id'], asyncio.Queue())
+        self.writer.write(json.dumps(request).encode() + b'\n')
+        await self.writer.drain()
+        return self._job_events(request['id'], queue)
+
+    async def _job_events(self, job_id, queue):
+        while True:
+            event = await queue.get()
+            if event is None:
+                raise ConnectionError('The service closed the connection')
+            yield event
+            if event['event'] in ('result', 'error'):
+                del self.events[job_id]
+                return
+
+    #
+    # Submit a job and wait for it to finish, returning its 'result' (or 'error') event. 'progress' is called with
+    # each 'progress' event, if given
+    async def run(self, request, progress=None):
+        async for event in await self.submit(request):
+            if event['event'] == 'progress' and progress is not None:
+                progress(event)
+            if event['event'] in ('result', 'error'):
+                return event
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to run the service until interrupted
+async def serve(path=None, port=None, processes=None, queue_size=DEFAULT_QUEUE_SIZE):
+    service = JobService(processes=processes, queue_size=queue_size)
+    server = await service.start(path=path, port=port)
+    print('Serving on {}'.format(path or server.sockets[0].getsockname()), file=sys.stderr)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await service.close()
+
+
+# Function to submit one job, printing its events as JSON lines
+async def submit(request, path=None, port=None):
+    async with ServiceClient(path=path, port=port) as client:
+        async for event in await client.submit(request):
+            print(json.dumps(event))
+
+
+# Function to parse the command line, and serve, or submit a job
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local service for running TM programs')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for subparser in (subparsers.add_parser('serve', help='Run the service'), subparsers.add_parser('submit', help='Submit a job')):
+        address = subparser.add_mutually_exclusive_group(required=True)
+        address.add_argument('--socket', help='Unix socket path')
+        address.add_argument('--port', type=int, help='Localhost TCP port')
+    serve_parser = subparsers.choices['serve']
+    serve_parser.add_argument('--processes', type=int, default=None, help='Number of worker processes (default: one per CPU, 0 for none)')
+    serve_parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help='Number of jobs which can wait for a worker')
+    submit_parser = subparsers.choices['submit']
+    submit_parser.add_argument('program', help="Name of a bundled program, e.g. 'PROGRAM_01', or a program file")
+    submit_parser.add_argument('tape', help='The tape, as a JSON list')
+    submit_parser.add_argument('--tape-index', type=int, default=0)
+    submit_parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_NUMBER_OF_STEPS)
+    submit_parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    submit_parser.add_argument('--progress-every', type=int, default=0)
+    submit_parser.add_argument('--detect-loops', action='store_true')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == 'serve':
+            asyncio.run(serve(path=args.socket, port=args.port, processes=args.processes, queue_size=args.queue_size))
+        else:
+            program = args.program
+            if os.path.exists(program):
+                from TMulator_loader import load_compiled, program_to_transitions
+                program = {'transitions': program_to_transitions(load_compiled(program)[0])}
+            request = {'program': program, 'tape': json.loads(args.tape), 'tape_index': args.tape_index,
+                       'max_steps': args.max_steps, 'timeout': args.timeout, 'progress_every': args.progress_every,
+                       'detect_loops': args.detect_loops}
+            asyncio.run(submit(request, path=args.socket, port=args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
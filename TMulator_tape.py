@@ -0,0 +1,472 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing an unbounded tape.
+#
+# The tapes in 'TMulator_programming.py' are plain Python lists, so a program which walks
+# off either end of them either raises an IndexError or (for a negative index) silently
+# wraps round to the other end. The 'Tape' class below behaves like one of those lists as
+# far as 'execute_a_TM_step()' and the main loop are concerned (it can be indexed, assigned
+# to and printed), but it grows in both directions as needed, and every cell beyond the
+# initial contents holds the fill symbol (0 by default, as that is what pads our tapes).
+#
+# Cells are held compactly as a bytearray of one-byte symbol codes (rather than a list of
+# boxed Python objects), with the 'alphabet' mapping codes back to symbols. Growth happens in
+# chunks which double in size, so that it is amortised over the steps which cause it.
+#
+# Since a step can be any integer, a program can also write at cells millions (or more) apart,
+# which a single bytearray would have to fill in between. The 'SparseTape' below holds only the
+# segments of the tape which have been visited, each a bytearray (so that stepping within one
+# costs no more than on a 'Tape'), with the segment last used cached, and the others found by a
+# binary search of their start indices. A 'Tape' switches itself over to a 'SparseTape' (in place,
+# so every reference to it sees the change) the first time it is asked to grow by a far jump, one
+# of more than SPARSE_JUMP cells, and more than the number of cells so far written.
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+from bisect import bisect_right
+
+##############################################################################
+# Tape parameters
+##############################################################################
+#
+# Various top-level parameters
+DEFAULT_FILL_SYMBOL = 0     # Our tapes are padded out with 0s, so that is what lies beyond their ends
+MIN_GROWTH_CHUNK = 64       # The smallest number of cells we add when growing the tape
+MAX_NUMBER_OF_SYMBOLS = 256 # Symbol codes must fit in a byte
+SPARSE_JUMP = 1 << 16       # A jump of at least this many cells off the end of a 'Tape' may switch it to a 'SparseTape'
+SEGMENT_GAP = 1 << 12       # A 'SparseTape' cell within this many cells of a segment is added to that segment
+SEGMENT_PAD = 1 << 6        # A new segment is started with this many cells either side of the cell which needed it
+MAX_LISTED_CELLS = 1 << 12  # A 'SparseTape' spread out further than this prints its segments rather than a list
+
+
+##############################################################################
+# Unbounded tape
+##############################################################################
+#
+class Tape:
+    #
+    # Create a tape holding the given symbols, with the first of them at logical index 'first_index'. The
+    # 'cells' bytearray holds the symbol codes, and logical index 0 lives at cells[origin]
+    def __init__(self, symbols=(), fill_symbol=DEFAULT_FILL_SYMBOL, first_index=0, alphabet=()):
+        self.alphabet = []
+        self.symbol_codes = {}
+        self.fill_symbol = fill_symbol
+        for symbol in alphabet:
+            self.code_for(symbol)
+        self.fill_code = self.code_for(fill_symbol)
+        symbols = list(symbols)
+        for symbol in dict.fromkeys(symbols):
+            self.code_for(symbol)   # Intern each distinct symbol once, in the order they first appear
+        self.cells = bytearray(map(self.symbol_codes.__getitem__, symbols))
+        self.origin = -first_index
+        self.initial_first_index = first_index
+        self.initial_last_index = first_index + len(self.cells) - 1
+
+    #
+    # Return the code for a symbol, giving it the next free code if we haven't seen it before
+    def code_for(self, symbol):
+        code = self.symbol_codes.get(symbol)
+        if code is None:
+            if len(self.alphabet) >= MAX_NUMBER_OF_SYMBOLS:
+                raise ValueError('Too many distinct symbols (at most {} are supported)'.format(MAX_NUMBER_OF_SYMBOLS))
+            code = self.symbol_codes[symbol] = len(self.alphabet)
+            self.alphabet.append(symbol)
+        return code
+
+    #
+    # Switch the tape over to the given alphabet (a sequence of symbols, indexed by code), so that an engine
+    # with its own symbol codes can work directly on the cells. If our alphabet is a prefix of the new one then
+    # no cells need to change, otherwise they are all re-coded in one pass with bytearray.translate()
+    def use_alphabet(self, symbols):
+        symbols = list(symbols)
+        if symbols[:len(self.alphabet)] != self.alphabet:
+            new_codes = {symbol: code for code, symbol in enumerate(symbols)}
+            missing = [symbol for symbol in self.alphabet if symbol not in new_codes]
+            if missing:
+                raise ValueError('Tape symbols {!r} are not in the new alphabet'.format(missing))
+            table = bytes(new_codes[symbol] for symbol in self.alphabet) + bytes(256 - len(self.alphabet))
+            self.cells = self.cells.translate(table)
+        self.alphabet = symbols
+        self.symbol_codes = {symbol: code for code, symbol in enumerate(symbols)}
+        self.fill_code = self.symbol_codes[self.fill_symbol]
+
+    #
+    # Grow the cells (by at least a doubling chunk) so that they include the given logical index
+    def grow_to(self, index):
+        position = index + self.origin
+        fill = bytes((self.fill_code,))
+        if position < 0:
+            chunk = max(-position, len(self.cells), MIN_GROWTH_CHUNK)
+            self.cells[0:0] = fill * chunk
+            self.origin += chunk
+        elif position >= len(self.cells):
+            chunk = max(position - len(self.cells) + 1, len(self.cells), MIN_GROWTH_CHUNK)
+            self.cells.extend(fill * chunk)
+
+    #
+    # The logical extent of the tape runs from its first to its last 'interesting' cell, which covers the initial
+    # contents and every cell beyond them which no longer holds the fill symbol
+    @property
+    def first_index(self):
+        fill = bytes((self.fill_code,))
+        first_position = len(self.cells) - len(self.cells.lstrip(fill))
+        return min(self.initial_first_index, first_position - self.origin)
+
+    @property
+    def last_index(self):
+        fill = bytes((self.fill_code,))
+        last_position = len(self.cells.rstrip(fill)) - 1
+        return max(self.initial_last_index, last_position - self.origin)
+
+    #
+    # Read the symbol in a cell (or a list of symbols for a slice of logical indices), without growing the tape
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start = self.first_index if index.start is None else index.start
+            stop = self.last_index + 1 if index.stop is None else index.stop
+            return [self[i] for i in range(start, stop, index.step or 1)]
+        position = index + self.origin
+        if 0 <= position < len(self.cells):
+            return self.alphabet[self.cells[position]]
+        return self.fill_symbol
+
+    #
+    # Is the given index a far jump off the end of the cells (one which would mostly fill the tape with blank gap)?
+    # If so, the tape is better off switched over to a 'SparseTape' than grown to reach it
+    def is_far_jump(self, index):
+        position = index + self.origin
+        distance = -position if position < 0 else position - len(self.cells) + 1
+        return distance >= SPARSE_JUMP and distance > len(self.cells) - self.cells.count(self.fill_code)
+
+    #
+    # Return (cells, origin), where 'cells' is a bytearray of symbol codes which includes the given logical index, at
+    # position index + origin. This is how the engines find the cells to step over (rather than using 'cells' and
+    # 'origin' directly), growing the tape if need be, so that they also work on a 'SparseTape' (where 'cells' is the
+    # segment holding the index), which the tape switches itself over to if the index is a far jump away
+    def cells_at(self, index):
+        position = index + self.origin
+        if not 0 <= position < len(self.cells):
+            if self.is_far_jump(index):
+                return make_sparse(self).cells_at(index)
+            self.grow_to(index)
+        return (self.cells, self.origin)
+
+    #
+    # Return (cells, origin) as 'cells_at()' does, but with 'cells' including every index from 'first_index' to
+    # 'last_index' (e.g. a block of cells to be worked on in one go), growing the tape to cover them if need be (or
+    # switching it over to a 'SparseTape', if either end is a far jump away)
+    def cells_spanning(self, first_index, last_index):
+        if self.is_far_jump(first_index) or self.is_far_jump(last_index):
+            return make_sparse(self).cells_spanning(first_index, last_index)
+        self.grow_to(first_index)
+        self.grow_to(last_index)
+        return (self.cells, self.origin)
+
+    #
+    # The stretches of cells the tape holds, as a list of (logical index of the first cell, cells) pairs, in order along
+    # the tape. A 'Tape' holds just the one stretch, and a 'SparseTape' one for each of its segments. This is how
+    # anything which works on all the cells at once (e.g. saving or hashing them) finds them, rather than using 'cells'
+    # and 'origin' directly
+    def segment_cells(self):
+        return [(-self.origin, self.cells)]
+
+    #
+    # Return the codes of the cells from logical index 'start' up to (but not including) 'stop', as bytes, without
+    # growing the tape (cells it doesn't hold yet read as the fill symbol)
+    def codes(self, start, stop):
+        (first_position, last_position) = (start + self.origin, stop + self.origin)
+        if 0 <= first_position and last_position <= len(self.cells):
+            return bytes(self.cells[first_position:last_position])
+        return _codes_from_segments(self.segment_cells(), self.fill_code, start, stop)
+
+    #
+    # Write a symbol to a cell, growing the tape if the cell lies beyond its current ends (or switching it over to a
+    # 'SparseTape', if the cell is a far jump away)
+    def __setitem__(self, index, symbol):
+        position = index + self.origin
+        if not 0 <= position < len(self.cells):
+            if self.is_far_jump(index):
+                make_sparse(self)
+                self[index] = symbol
+                return
+            self.grow_to(index)
+            position = index + self.origin
+        self.cells[position] = self.code_for(symbol)
+
+    #
+    # The tape acts like a list of the symbols in its logical extent
+    def __len__(self):
+        return self.last_index - self.first_index + 1
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self):
+        first_position = self.first_index + self.origin
+        last_position = self.last_index + self.origin
+        alphabet = self.alphabet
+        if first_position < 0 or last_position >= len(self.cells):
+            return self[self.first_index:self.last_index + 1]   # The initial extent may not have been filled in yet
+        return [alphabet[code] for code in self.cells[first_position:last_position + 1]]
+
+    def __eq__(self, other):
+        if not isinstance(other, Tape):
+            return NotImplemented
+        return (self.first_index, self.to_list()) == (other.first_index, other.to_list())
+
+    def copy(self):
+        tape = Tape(fill_symbol=self.fill_symbol, alphabet=self.alphabet)
+        tape.cells = bytearray(self.cells)
+        tape.origin = self.origin
+        tape.initial_first_index = self.initial_first_index
+        tape.initial_last_index = self.initial_last_index
+        return tape
+
+    #
+    # Printing a tape shows its symbols just as printing a list would (and repr() also shows where it starts)
+    def __str__(self):
+        return str(self.to_list())
+
+    def __repr__(self):
+        return 'Tape({!r}, first_index={})'.format(self.to_list(), self.first_index)
+
+
+##############################################################################
+# Sparse tape
+##############################################################################
+#
+class SparseTape(Tape):
+    #
+    # Create a sparse tape holding the given symbols (with the same arguments as 'Tape'). The visited cells are held as
+    # 'segments', bytearrays of symbol codes, in order along the tape, with the first cell of segments[k] at logical
+    # index starts[k]. Segments never touch (they are merged when they grow into one another), and 'current' is the
+    # number of the segment last used
+    def __init__(self, symbols=(), fill_symbol=DEFAULT_FILL_SYMBOL, first_index=0, alphabet=()):
+        super().__init__(symbols, fill_symbol, first_index, alphabet)
+        self._take_cells()
+
+    #
+    # Turn the cells of a 'Tape' (which this was, until now) into our only segment
+    def _take_cells(self):
+        self.starts = [-self.origin]
+        self.segments = [self.cells]
+        self.current = 0
+        del self.cells
+        del self.origin
+
+    #
+    # Switch the tape over to the given alphabet (as 'Tape.use_alphabet()' does), re-coding each segment if need be
+    def use_alphabet(self, symbols):
+        symbols = list(symbols)
+        if symbols[:len(self.alphabet)] != self.alphabet:
+            new_codes = {symbol: code for code, symbol in enumerate(symbols)}
+            missing = [symbol for symbol in self.alphabet if symbol not in new_codes]
+            if missing:
+                raise ValueError('Tape symbols {!r} are not in the new alphabet'.format(missing))
+            table = bytes(new_codes[symbol] for symbol in self.alphabet) + bytes(256 - len(self.alphabet))
+            self.segments = [segment.translate(table) for segment in self.segments]
+        self.alphabet = symbols
+        self.symbol_codes = {symbol: code for code, symbol in enumerate(symbols)}
+        self.fill_code = self.symbol_codes[self.fill_symbol]
+
+    #
+    # Return the number of the segment holding the given index (or None if no segment holds it), trying the current
+    # segment first
+    def find_segment(self, index):
+        (starts, segments) = (self.starts, self.segments)
+        number = self.current
+        if not starts[number] <= index < starts[number] + len(segments[number]):
+            number = bisect_right(starts, index) - 1
+            if number < 0 or index >= starts[number] + len(segments[number]):
+                return None
+            self.current = number
+        return number
+
+    #
+    # Return the number of the segment holding the given index, first extending the nearest segment to include it (if
+    # it is within SEGMENT_GAP cells of one), or starting a new segment for it. Segments are extended by at least their
+    # own length each time (up to the next segment along), so that walking off the end of one is amortised
+    def grow_to(self, index):
+        number = self.find_segment(index)
+        if number is not None:
+            return number
+        (starts, segments) = (self.starts, self.segments)
+        fill = bytes((self.fill_code,))
+        number = bisect_right(starts, index) - 1
+        left_end = starts[number] + len(segments[number]) if number >= 0 else None            # Just past the segment on the left
+        right_start = starts[number + 1] if number + 1 < len(starts) else None                  # The start of the segment on the right
+        if left_end is not None and index - left_end < SEGMENT_GAP:
+            stop = max(index + 1, left_end + max(len(segments[number]), MIN_GROWTH_CHUNK))
+            if right_start is not None:
+                stop = min(stop, right_start)
+            segments[number].extend(fill * (stop - left_end))
+        elif right_start is not None and right_start - index <= SEGMENT_GAP:
+            number += 1
+            start = min(index, right_start - max(len(segments[number]), MIN_GROWTH_CHUNK))
+            if left_end is not None:
+                start = max(start, left_end)
+            segments[number][0:0] = fill * (right_start - start)
+            starts[number] = start
+            number -= 1     # So that the merge below checks this segment against the one on its left
+        else:
+            start = index - SEGMENT_PAD if left_end is None else max(index - SEGMENT_PAD, left_end)
+            stop = index + SEGMENT_PAD + 1 if right_start is None else min(index + SEGMENT_PAD + 1, right_start)
+            number += 1
+            starts.insert(number, start)
+            segments.insert(number, bytearray(fill * (stop - start)))
+            number -= 1
+        #
+        # Merge the segment we grew with its neighbour, if they now touch
+        if 0 <= number < len(starts) - 1 and starts[number] + len(segments[number]) == starts[number + 1]:
+            segments[number] += segments[number + 1]
+            del starts[number + 1]
+            del segments[number + 1]
+        self.current = 0
+        return self.find_segment(index)
+
+    #
+    # Return (cells, origin) as 'Tape.cells_at()' does, where 'cells' is the segment holding the index
+    def cells_at(self, index):
+        number = self.grow_to(index)
+        return (self.segments[number], -self.starts[number])
+
+    #
+    # Return (cells, origin) as 'Tape.cells_spanning()' does, merging the segments from the one holding 'first_index' to
+    # the one holding 'last_index' into one (filling in the gaps between them), if they are not one already
+    def cells_spanning(self, first_index, last_index):
+        self.grow_to(first_index)
+        last_number = self.grow_to(last_index)
+        first_number = self.find_segment(first_index)      # Growing to the last index may have merged segments
+        (starts, segments) = (self.starts, self.segments)
+        if first_number != last_number:
+            fill = bytes((self.fill_code,))
+            merged = segments[first_number]
+            for number in range(first_number + 1, last_number + 1):
+                merged += fill * (starts[number] - starts[first_number] - len(merged))
+                merged += segments[number]
+            del starts[first_number + 1:last_number + 1]
+            del segments[first_number + 1:last_number + 1]
+            self.current = first_number
+        return (segments[first_number], -starts[first_number])
+
+    def segment_cells(self):
+        return list(zip(self.starts, self.segments))
+
+    def codes(self, start, stop):
+        return _codes_from_segments(self.segment_cells(), self.fill_code, start, stop)
+
+    #
+    # The logical extent of the tape (as for 'Tape'), found from the first and last segments holding a non-fill cell
+    @property
+    def first_index(self):
+        fill = bytes((self.fill_code,))
+        for (start, segment) in zip(self.starts, self.segments):
+            remainder = segment.lstrip(fill)
+            if remainder:
+                return min(self.initial_first_index, start + len(segment) - len(remainder))
+        return self.initial_first_index
+
+    @property
+    def last_index(self):
+        fill = bytes((self.fill_code,))
+        for (start, segment) in zip(reversed(self.starts), reversed(self.segments)):
+            remainder = segment.rstrip(fill)
+            if remainder:
+                return max(self.initial_last_index, start + len(remainder) - 1)
+        return self.initial_last_index
+
+    #
+    # Read the symbol in a cell (or a list of symbols for a slice of logical indices), without growing the tape
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return super().__getitem__(index)
+        number = self.find_segment(index)
+        if number is None:
+            return self.fill_symbol
+        return self.alphabet[self.segments[number][index - self.starts[number]]]
+
+    #
+    # Write a symbol to a cell, adding it to a segment if it isn't in one
+    def __setitem__(self, index, symbol):
+        number = self.grow_to(index)
+        self.segments[number][index - self.starts[number]] = self.code_for(symbol)
+
+    #
+    # The visited stretches of the tape, as a list of (first index, list of symbols) pairs
+    def segment_lists(self):
+        alphabet = self.alphabet
+        return [(start, [alphabet[code] for code in segment]) for (start, segment) in zip(self.starts, self.segments)]
+
+    def to_list(self):
+        (first_index, last_index) = (self.first_index, self.last_index)
+        symbols = [self.fill_symbol] * (last_index - first_index + 1)
+        alphabet = self.alphabet
+        for (start, segment) in zip(self.starts, self.segments):
+            low = max(start, first_index)
+            high = min(start + len(segment), last_index + 1)
+            if low < high:
+                symbols[low - first_index:high - first_index] = [alphabet[code] for code in segment[low - start:high - start]]
+        return symbols
+
+    def copy(self):
+        tape = SparseTape(fill_symbol=self.fill_symbol, alphabet=self.alphabet)
+        tape.starts = list(self.starts)
+        tape.segments = [bytearray(segment) for segment in self.segments]
+        tape.initial_first_index = self.initial_first_index
+        tape.initial_last_index = self.initial_last_index
+        return tape
+
+    #
+    # A tape spread out over more than MAX_LISTED_CELLS cells prints as its segments, rather than as one long list
+    def __str__(self):
+        if self.last_index - self.first_index < MAX_LISTED_CELLS:
+            return str(self.to_list())
+        return str(dict(self.segment_lists()))
+
+    def __repr__(self):
+        return 'SparseTape({}, first_index={})'.format(self, self.first_index)
+
+
+# Function to return the codes of the cells from logical index 'start' up to (but not including) 'stop', as bytes, given
+# the stretches of cells held (as from 'segment_cells()'), with any cells between or beyond them reading as 'fill_code'
+def _codes_from_segments(segments, fill_code, start, stop):
+    codes = bytearray((fill_code,)) * max(0, stop - start)
+    for (segment_start, cells) in segments:
+        low = max(start, segment_start)
+        high = min(stop, segment_start + len(cells))
+        if low < high:
+            codes[low - start:high - start] = cells[low - segment_start:high - segment_start]
+    return bytes(codes)
+
+
+# Function to build a tape from stretches of cells, given as (logical index of the first cell, cells) pairs in order
+# along the tape, which must not touch (as from 'segment_cells()'), with codes for the given alphabet. Returns a 'Tape'
+# if there is just the one stretch, or a 'SparseTape' otherwise
+def tape_from_segments(segments, alphabet, fill_symbol=DEFAULT_FILL_SYMBOL):
+    tape = Tape(fill_symbol=fill_symbol, alphabet=alphabet)
+    if len(segments) == 1:
+        (start, cells) = segments[0]
+        tape.cells = bytearray(cells)
+        tape.origin = -start
+    elif segments:
+        make_sparse(tape)
+        tape.starts = [start for (start, _) in segments]
+        tape.segments = [bytearray(cells) for (_, cells) in segments]
+    return tape
+
+
+# Function to switch a 'Tape' over to a 'SparseTape', in place (so that every reference to it sees the change)
+def make_sparse(tape):
+    if not isinstance(tape, SparseTape):
+        tape.__class__ = SparseTape
+        tape._take_cells()
+    return tape
@@ -0,0 +1,461 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a binary trace recorder,
+# which keeps a full execution history of a run in a compact file, along with a replay tool
+# which can reconstruct the tape at any step.
+#
+# Printing the whole tape at every step (as 'FullTrace' does) is quadratic in the size of
+# the output, so instead we record just the table index of each transition taken by the
+# compiled engine (see 'TMulator_compiled.py'). Together with the compiled tables (which are
+# stored in the file's header) that index determines everything about the step: the state
+# and the old symbol (its row and column), the new symbol, the head movement and the next
+# state. So each step costs 2 (or 4) bytes before compression, and recording adds only a
+# list append to each step of the compiled run loop.
+#
+# The file is written as a sequence of blocks, each of which may be zlib compressed:
+#
+#   - 'C' (checkpoint) blocks, every 'checkpoint_interval' steps, hold the whole tape and the
+#     head and state at that step ('S' blocks do the same for a 'SparseTape', segment by segment)
+#   - 'D' (delta) blocks hold the transitions for a range of steps
+#   - an 'X' (index) block at the end lists the checkpoints (with their file offsets) and how
+#     the run ended, so that replay can seek straight to the checkpoint before any given step
+#
+# (if the run was interrupted before the index block was written, then the blocks are scanned
+# to rebuild it). From the command line, e.g.:
+#
+# python TMulator_trace.py record PROGRAM_01 TAPE_02 START_CELL_INDEX_02 run.tmtrace --max-steps 1000000
+# python TMulator_trace.py info run.tmtrace
+# python TMulator_trace.py tape run.tmtrace 5000
+# python TMulator_trace.py steps run.tmtrace 5000 5010
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+import argparse
+import bisect
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import namedtuple
+
+from TMulator import HALTED, MAX_STEPS_REACHED, MISSING_TRANSITION, START_CARD_INDEX, RunResult
+from TMulator_compiled import CompiledProgram, MissingTransition, compile_program, run_compiled
+from TMulator_tape import Tape, tape_from_segments
+
+##############################################################################
+# Trace file format
+##############################################################################
+#
+# Various top-level parameters
+FILE_MAGIC = b'TMTRACE1'
+END_MAGIC = b'TMTREND1'
+DEFAULT_CHECKPOINT_INTERVAL = 1 << 20   # Steps between full-tape checkpoints
+DEFAULT_BLOCK_STEPS = 1 << 16           # Steps per delta block (we never let a delta block span a checkpoint)
+BLOCK_HEADER = struct.Struct('<cBQI')   # Kind, compressed flag, step at the start of the block, payload length
+CHECKPOINT_HEADER = struct.Struct('<qqqqI') # Tape index of the head, logical index of the first cell, the tape's initial
+                                            # first and last indices, and the state row
+SPARSE_CHECKPOINT_HEADER = struct.Struct('<qqqII')  # Tape index of the head, the tape's initial first and last indices,
+                                                    # the state row, and the number of segments
+SEGMENT_HEADER = struct.Struct('<qQ')   # Logical index of the first cell of a segment, and its length
+CHECKPOINT_KINDS = (b'C', b'S')
+INDEX_TRAILER = struct.Struct('<Q8s')   # File offset of the index block, END_MAGIC
+
+#
+# One step of a replayed run: the step number, the cell written, its old and new symbols, and the state and
+# head position after the step
+TraceStep = namedtuple('TraceStep', ['step', 'cell_index', 'old_symbol', 'new_symbol', 'state', 'tape_index'])
+
+
+# Function to choose the array typecode for transition indices (2 bytes if they fit, otherwise 4)
+def _typecode_for(compiled):
+    return 'H' if len(compiled.next_table) <= 0xFFFF else 'I'
+
+
+# Function to convert an array to/from little-endian bytes (which is what we store, whatever the platform)
+def _array_to_bytes(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array_from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+##############################################################################
+# Recording
+##############################################################################
+#
+class TraceWriter:
+    #
+    # Open a trace file, and write its header (the compiled program, from which every transition can be decoded)
+    def __init__(self, path, compiled, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, compress=True):
+        self.file = open(path, 'wb', buffering=1 << 20)
+        self.compiled = compiled
+        self.compress = compress
+        self.typecode = _typecode_for(compiled)
+        self.checkpoints = []       # (step, file offset) of every checkpoint block
+        header = json.dumps({'symbols': compiled.symbols, 'states': compiled.states, 'card_states': sorted(compiled.card_states),
+                             'width': compiled.width, 'write_table': compiled.write_table, 'step_table': compiled.step_table,
+                             'next_table': compiled.next_table, 'typecode': self.typecode,
+                             'checkpoint_interval': checkpoint_interval}).encode()
+        self.file.write(FILE_MAGIC + struct.pack('<I', len(header)) + header)
+
+    #
+    # Write a block, compressing its payload if asked to
+    def _write_block(self, kind, step, payload):
+        offset = self.file.tell()
+        if self.compress:
+            payload = zlib.compress(payload, 1)
+        self.file.write(BLOCK_HEADER.pack(kind, int(self.compress), step, len(payload)))
+        self.file.write(payload)
+        return offset
+
+    #
+    # Write a checkpoint of the whole tape (which must use the compiled program's symbol codes) and the head and state.
+    # A tape held in one stretch of cells is written as a 'C' block, and one held in segments as an 'S' block
+    def write_checkpoint(self, step, tape, tape_index, state):
+        segments = tape.segment_cells()
+        state_row = self.compiled.state_rows[state]
+        if len(segments) == 1:
+            (first_index, cells) = segments[0]
+            payload = CHECKPOINT_HEADER.pack(tape_index, first_index, tape.initial_first_index, tape.initial_last_index,
+                                             state_row) + bytes(cells)
+            self.checkpoints.append((step, self._write_block(b'C', step, payload)))
+        else:
+            payload = b''.join([SPARSE_CHECKPOINT_HEADER.pack(tape_index, tape.initial_first_index, tape.initial_last_index,
+                                                              state_row, len(segments))] +
+                               [SEGMENT_HEADER.pack(first_index, len(cells)) for (first_index, cells) in segments] +
+                               [bytes(cells) for (_, cells) in segments])
+            self.checkpoints.append((step, self._write_block(b'S', step, payload)))
+
+    #
+    # Write the transitions taken from the given step onwards
+    def write_transitions(self, step, transitions):
+        if transitions:
+            self._write_block(b'D', step, _array_to_bytes(array(self.typecode, transitions)))
+
+    #
+    # Write the index block (the checkpoints and how the run ended), and close the file
+    def close(self, steps=None, halt_reason=None):
+        index = json.dumps({'checkpoints': self.checkpoints, 'steps': steps, 'halt_reason': halt_reason}).encode()
+        offset = self._write_block(b'X', 0, index)
+        self.file.write(INDEX_TRAILER.pack(offset, END_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.file.closed:
+            self.close()
+
+
+# Function to run a program (as 'run()' in 'TMulator.py' does, with the compiled engine) while recording every step to
+# a trace file. Returns a 'RunResult'.
+def record_run(state_machine, current_tape, current_tape_index, path, max_steps, checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL,
+               block_steps=DEFAULT_BLOCK_STEPS, compress=True):
+    #
+    # Set up the run
+    start_time = time.perf_counter()
+    if not isinstance(current_tape, Tape):
+        current_tape = Tape(current_tape)
+    compiled = compile_program(state_machine, symbols=current_tape.alphabet)
+    current_tape.use_alphabet(compiled.symbols)
+    current_card_index = START_CARD_INDEX
+    time_step = 0
+    error = None
+
+    #
+    # Run the machine a block at a time, writing out each block's transitions, and a checkpoint at every interval
+    with TraceWriter(path, compiled, checkpoint_interval, compress) as writer:
+        writer.write_checkpoint(0, current_tape, current_tape_index, current_card_index)
+        while time_step < max_steps and current_card_index != 0:
+            next_checkpoint = (time_step // checkpoint_interval + 1) * checkpoint_interval
+            transitions = []        # Appending to a list is cheaper in the run loop than appending to an array
+            try:
+                (current_tape_index, current_card_index, steps) = run_compiled(
+                    compiled, current_tape, current_tape_index, current_card_index,
+                    min(block_steps, next_checkpoint - time_step, max_steps - time_step), transition_log=transitions)
+            except MissingTransition as missing:
+                (current_tape_index, current_card_index, steps) = (missing.tape_index, missing.state, missing.steps)
+                error = 'No transition for {!r} (card index {})'.format(missing.args[0], missing.state)
+            writer.write_transitions(time_step, transitions)
+            time_step += steps
+            if error is not None:
+                break
+            if time_step == next_checkpoint:
+                writer.write_checkpoint(time_step, current_tape, current_tape_index, current_card_index)
+
+        #
+        # Work out why the run ended, and finish off the file
+        if error is not None:
+            halt_reason = MISSING_TRANSITION
+        elif current_card_index == 0:
+            halt_reason = HALTED
+        else:
+            halt_reason = MAX_STEPS_REACHED
+        writer.close(time_step, halt_reason)
+    return RunResult(halt_reason, time_step, current_tape, current_tape_index, current_card_index,
+                     time.perf_counter() - start_time, error)
+
+
+##############################################################################
+# Replay
+##############################################################################
+#
+class TraceReader:
+    #
+    # Open a trace file, reading its header, and its index (or rebuilding the index if the run was interrupted)
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if self.file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError('{} is not a TMulator trace file'.format(path))
+        (header_length,) = struct.unpack('<I', self.file.read(4))
+        header = json.loads(self.file.read(header_length))
+        self.first_block_offset = self.file.tell()
+        self.checkpoint_interval = header['checkpoint_interval']
+        self.typecode = header['typecode']
+        self.compiled = CompiledProgram(tuple(header['symbols']), {symbol: code for code, symbol in enumerate(header['symbols'])},
+                                        tuple(header['states']), {state: row for row, state in enumerate(header['states'])},
+                                        frozenset(header['card_states']), header['width'], header['write_table'],
+                                        header['step_table'], header['next_table'], header['next_table'], {})
+        self.steps = None
+        self.halt_reason = None
+        if not self._read_index():
+            self._rebuild_index()
+
+    #
+    # Read the block at the current file position, returning its kind, start step and (decompressed) payload
+    def _read_block(self):
+        header = self.file.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            return None
+        (kind, compressed, step, length) = BLOCK_HEADER.unpack(header)
+        payload = self.file.read(length)
+        if len(payload) < length:
+            return None             # A block cut short by an interrupted run
+        return (kind, step, zlib.decompress(payload) if compressed else payload)
+
+    #
+    # Read the index block, via the trailer at the end of the file
+    def _read_index(self):
+        self.file.seek(0, 2)
+        if self.file.tell() < self.first_block_offset + INDEX_TRAILER.size:
+            return False
+        self.file.seek(-INDEX_TRAILER.size, 2)
+        (offset, magic) = INDEX_TRAILER.unpack(self.file.read(INDEX_TRAILER.size))
+        if magic != END_MAGIC:
+            return False
+        self.file.seek(offset)
+        (_, _, payload) = self._read_block()
+        index = json.loads(payload)
+        self.checkpoints = [tuple(checkpoint) for checkpoint in index['checkpoints']]
+        self.steps = index['steps']
+        self.halt_reason = index['halt_reason']
+        return True
+
+    #
+    # Rebuild the index by scanning every block (the number of steps is then however many were written out)
+    def _rebuild_index(self):
+        self.checkpoints = []
+        self.steps = 0
+        self.file.seek(self.first_block_offset)
+        while True:
+            offset = self.file.tell()
+            block = self._read_block()
+            if block is None:
+                break
+            (kind, step, payload) = block
+            if kind in CHECKPOINT_KINDS:
+                self.checkpoints.append((step, offset))
+                self.steps = max(self.steps, step)
+            elif kind == b'D':
+                self.steps = max(self.steps, step + len(payload) // array(self.typecode).itemsize)
+
+    #
+    # Read the checkpoint at the given offset, returning the tape, head and state it holds
+    def _read_checkpoint(self, offset):
+        self.file.seek(offset)
+        (kind, _, payload) = self._read_block()
+        if kind == b'C':
+            (tape_index, first_index, initial_first_index, initial_last_index, state_row) = CHECKPOINT_HEADER.unpack_from(payload)
+            segments = [(first_index, payload[CHECKPOINT_HEADER.size:])]
+        else:
+            (tape_index, initial_first_index, initial_last_index, state_row, number_of_segments) = \
+                SPARSE_CHECKPOINT_HEADER.unpack_from(payload)
+            position = SPARSE_CHECKPOINT_HEADER.size + number_of_segments * SEGMENT_HEADER.size
+            segments = []
+            for number in range(number_of_segments):
+                (first_index, length) = SEGMENT_HEADER.unpack_from(payload, SPARSE_CHECKPOINT_HEADER.size + number * SEGMENT_HEADER.size)
+                segments.append((first_index, payload[position:position + length]))
+                position += length
+        tape = tape_from_segments(segments, self.compiled.symbols)
+        tape.initial_first_index = initial_first_index
+        tape.initial_last_index = initial_last_index
+        return (tape, tape_index, self.compiled.states[state_row])
+
+    #
+    # Generate the transitions (table indices) from the given step onwards, reading the delta blocks after the given
+    # checkpoint offset
+    def _transitions_from(self, offset, step):
+        self.file.seek(offset)
+        while True:
+            block = self._read_block()
+            if block is None:
+                return
+            (kind, block_step, payload) = block
+            if kind == b'X':
+                return
+            if kind != b'D':
+                continue
+            transitions = _array_from_bytes(self.typecode, payload)
+            if block_step + len(transitions) <= step:
+                continue
+            position = self.file.tell()
+            for transition in transitions[max(0, step - block_step):]:
+                yield transition
+            self.file.seek(position)
+
+    #
+    # Generate a 'TraceStep' for each step from 'start' (exclusive, i.e. the first one is step start + 1) up to 'stop'
+    # (inclusive, or to the end of the run), along with the tape as it is after each step (the same 'Tape', updated in place)
+    def replay(self, start=0, stop=None):
+        if stop is None:
+            stop = self.steps
+        (checkpoint_step, offset) = self.checkpoints[bisect.bisect_right(self.checkpoints, (start, float('inf'))) - 1]
+        (tape, tape_index, state) = self._read_checkpoint(offset)
+        compiled = self.compiled
+        (width, write_table, step_table, next_table, symbols) = (compiled.width, compiled.write_table, compiled.step_table,
+                                                                 compiled.next_table, compiled.symbols)
+        (cells, origin) = tape.cells_at(tape_index)
+        step = checkpoint_step
+        for transition in self._transitions_from(offset, checkpoint_step):
+            if step >= stop:
+                break
+            #
+            # Apply the transition to the tape (growing it if need be, or switching it to a 'SparseTape', just as the
+            # engine did)
+            position = tape_index + origin
+            if not 0 <= position < len(cells):
+                (cells, origin) = tape.cells_at(tape_index)
+                position = tape_index + origin
+            cell_index = tape_index
+            cells[position] = write_table[transition]
+            tape_index += step_table[transition]
+            state = compiled.states[next_table[transition] // width]
+            step += 1
+            if step > start:
+                yield (TraceStep(step, cell_index, symbols[transition % width], symbols[write_table[transition]], state, tape_index), tape)
+
+    #
+    # Return the tape (a 'Tape'), tape index and state as they were after the given step
+    def tape_at(self, step):
+        (checkpoint_step, offset) = self.checkpoints[bisect.bisect_right(self.checkpoints, (step, float('inf'))) - 1]
+        if checkpoint_step == step:
+            return self._read_checkpoint(offset)
+        last = None
+        for last in self.replay(step - 1, step):
+            pass
+        if last is None:
+            raise ValueError('Step {} is beyond the end of the trace ({} steps)'.format(step, self.steps))
+        (trace_step, tape) = last
+        return (tape, trace_step.tape_index, trace_step.state)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+##############################################################################
+# Command line interface
+##############################################################################
+#
+# Function to look up a program, tape or start cell index by name from 'TMulator.py' and its companion module (a
+# program may also be given as a program file, see 'TMulator_loader.py')
+def _find(name):
+    if os.path.exists(name):
+        from TMulator_loader import load_compiled
+        return load_compiled(name)[0]   # The program, along with its compiled form (cached, see 'TMulator_loader.py')
+    import TMulator
+    if not hasattr(TMulator, name):
+        raise SystemExit('Unknown name {!r}'.format(name))
+    return getattr(TMulator, name)
+
+
+# Function to parse the command line, and record or replay a trace
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Record or replay a binary trace of a TM run')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record', help='Run a program, recording every step')
+    record_parser.add_argument('program', help="Name of the program, e.g. 'PROGRAM_01', or a program file")
+    record_parser.add_argument('tape', help="Name of the tape, e.g. 'TAPE_02'")
+    record_parser.add_argument('start', help="Name of the start cell index, e.g. 'START_CELL_INDEX_02' (or a number)")
+    record_parser.add_argument('path', help='Trace file to write')
+    record_parser.add_argument('--max-steps', type=int, default=1000000)
+    record_parser.add_argument('--checkpoint-interval', type=int, default=DEFAULT_CHECKPOINT_INTERVAL)
+    record_parser.add_argument('--no-compress', action='store_true')
+    info_parser = subparsers.add_parser('info', help='Describe a trace file')
+    info_parser.add_argument('path')
+    tape_parser = subparsers.add_parser('tape', help='Show the tape as it was after a given step')
+    tape_parser.add_argument('path')
+    tape_parser.add_argument('step', type=int)
+    steps_parser = subparsers.add_parser('steps', help='List the steps in a range')
+    steps_parser.add_argument('path')
+    steps_parser.add_argument('start', type=int, help='List from the step after this one ...')
+    steps_parser.add_argument('stop', type=int, help='... up to and including this one')
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        start = int(args.start) if args.start.lstrip('-').isdigit() else _find(args.start)
+        result = record_run(_find(args.program), _find(args.tape), start, args.path, args.max_steps,
+                            checkpoint_interval=args.checkpoint_interval, compress=not args.no_compress)
+        print('{} after {} steps ({:.3f}s)'.format(result.halt_reason, result.steps, result.wall_time))
+        return
+    with TraceReader(args.path) as reader:
+        if args.command == 'info':
+            print('Steps:- ', reader.steps)
+            print('Halt reason:- ', reader.halt_reason)
+            print('Checkpoints:- ', len(reader.checkpoints), '(every {} steps)'.format(reader.checkpoint_interval))
+            print('Symbols:- ', list(reader.compiled.symbols))
+        elif args.command == 'tape':
+            (tape, tape_index, state) = reader.tape_at(args.step)
+            print('Current tape:- ', tape)
+            print('Current tape index:- ', tape_index)
+            print('Current card index:- ', state)
+        else:
+            for (trace_step, _) in reader.replay(args.start, args.stop):
+                print('Time step:- {}  cell:- {}  {!r} -> {!r}  tape index:- {}  card index:- {}'.format(
+                      trace_step.step, trace_step.cell_index, trace_step.old_symbol, trace_step.new_symbol,
+                      trace_step.tape_index, trace_step.state))
+
+
+#
+################################################################################
+#       Main
+################################################################################
+#
+if __name__=="__main__":
+    main()
@@ -0,0 +1,141 @@
+##############################################################################
+# This Python module is a companion to 'TMulator.py', providing a vectorised engine,
+# which runs one program on many tapes at once, in lockstep, using NumPy.
+#
+# For small machines (such as PROGRAM_02 - PROGRAM_05) the per-job overhead of the batch
+# runner ('TMulator_batch.py') dominates, so instead we hold all N tapes as the rows of one
+# 2-D array of symbol codes, with a vector of head positions and a vector of states (held as
+# row offsets into the compiled tables of 'TMulator_compiled.py'). Each iteration then advances
+# every machine which is still running by one step, using fancy-indexed lookups into the
+# compiled tables. Machines which have halted (reached card 0), or which have hit a missing
+# transition, are masked out of all further iterations.
+#
+# As with 'Tape', the tapes grow (in both directions, padded with the fill symbol) if any
+# head steps off either end of them.
+#
+# This module needs NumPy (https://numpy.org), which the rest of the emulator does not.
+#
+# This code has been written in Python 3.8.0 (but should be compatible with earlier versions of Python3)
+#
+# License:
+# MIT License (see https://github.com/deebs67/TMulator/blob/master/LICENSE)
+#
+# Copyright (c) 2020 deebs67
+#
+
+##############################################################################
+# Global module imports
+##############################################################################
+#
+from collections import namedtuple
+
+import numpy as np
+
+from TMulator_compiled import compile_program
+from TMulator_tape import DEFAULT_FILL_SYMBOL, MIN_GROWTH_CHUNK
+
+##############################################################################
+# Vectorised engine
+##############################################################################
+#
+# Various top-level parameters
+START_CARD_INDEX = 1        # We always start on card index 1, and stop (halt) on card index 0
+
+#
+# The result of a vectorised run. 'cells' is a 2-D array of symbol codes (one row per tape, decoded via 'symbols'),
+# with logical tape index 0 of every tape in column 'origin'. 'tape_indices', 'card_indices' and 'steps' are the
+# final head index, state and number of steps taken for each machine, and 'missing' flags the machines which
+# stopped on a missing transition (where the reference stepper would have raised a KeyError)
+VectorisedResult = namedtuple('VectorisedResult', ['symbols', 'cells', 'origin', 'tape_indices', 'card_indices', 'steps', 'missing'])
+
+
+# Function to convert a compiled program's tables into NumPy arrays
+def _table_arrays(compiled):
+    write_table = np.array(compiled.write_table, dtype=np.uint8)
+    step_table = np.array(compiled.step_table, dtype=np.int64)
+    next_table = np.array(compiled.next_table, dtype=np.int64)
+    return (write_table, step_table, next_table)
+
+
+# Function to build the 2-D array of symbol codes for a list of tapes (padding the shorter ones with the fill symbol)
+def _tape_array(compiled, tapes, fill_code):
+    symbol_codes = compiled.symbol_codes
+    tape_length = max([len(tape) for tape in tapes] + [1])
+    cells = np.full((len(tapes), tape_length), fill_code, dtype=np.uint8)
+    for row, tape in enumerate(tapes):
+        cells[row, :len(tape)] = [symbol_codes[symbol] for symbol in tape]
+    return cells
+
+
+# Function to grow the 2-D array of cells (by at least a doubling chunk on the side(s) needed) so that it
+# includes every head position in 'heads'. Returns the new cells and the number of columns added on the left
+def _grow_cells(cells, heads, fill_code):
+    tape_length = cells.shape[1]
+    left = 0
+    right = 0
+    if heads.min() < 0:
+        left = max(-int(heads.min()), tape_length, MIN_GROWTH_CHUNK)
+    if heads.max() >= tape_length:
+        right = max(int(heads.max()) - tape_length + 1, tape_length, MIN_GROWTH_CHUNK)
+    cells = np.pad(cells, ((0, 0), (left, right)), mode='constant', constant_values=fill_code)
+    return (cells, left)
+
+
+# Function to run a program (in the usual card format) on many tapes in lockstep. 'tapes' is a list of tapes (each a
+# list of symbols) and 'tape_indices' the corresponding start cell indices (or a single index for all of them). Every
+# machine starts on card 1, and runs until it halts, hits a missing transition, or has taken 'max_steps' steps.
+def run_vectorised(state_machine, tapes, tape_indices, max_steps, fill_symbol=DEFAULT_FILL_SYMBOL):
+    #
+    # Compile the program (making sure all the tape symbols have codes), and set up the arrays
+    tape_symbols = dict.fromkeys([fill_symbol] + [symbol for tape in tapes for symbol in dict.fromkeys(tape)])
+    compiled = compile_program(state_machine, symbols=tape_symbols)
+    width = compiled.width
+    fill_code = compiled.symbol_codes[fill_symbol]
+    (write_table, step_table, next_table) = _table_arrays(compiled)
+    cells = _tape_array(compiled, tapes, fill_code)
+    number_of_machines = len(tapes)
+    origin = 0
+    heads = np.zeros(number_of_machines, dtype=np.int64) + np.asarray(tape_indices, dtype=np.int64)
+    row_offsets = np.full(number_of_machines, compiled.state_rows[START_CARD_INDEX] * width, dtype=np.int64)
+    steps = np.zeros(number_of_machines, dtype=np.int64)
+
+    #
+    # Step every running machine, dropping machines from the 'running' set as they halt or hit a missing transition
+    running = np.flatnonzero(row_offsets > 0)
+    for _ in range(max_steps):
+        if running.size == 0:
+            break
+        #
+        # Grow the tapes if any running head has stepped off either end of them
+        running_heads = heads[running]
+        if running_heads.min() < 0 or running_heads.max() >= cells.shape[1]:
+            (cells, left) = _grow_cells(cells, running_heads, fill_code)
+            origin += left
+            heads += left
+            running_heads = heads[running]
+        #
+        # Execute one step on every running machine, addressing the cells through a flat view of the 2-D array
+        flat_cells = cells.reshape(-1)
+        flat_indices = running * cells.shape[1] + running_heads
+        table_indices = row_offsets[running] + flat_cells[flat_indices]
+        flat_cells[flat_indices] = write_table[table_indices]
+        heads[running] = running_heads + step_table[table_indices]
+        new_row_offsets = next_table[table_indices]
+        row_offsets[running] = new_row_offsets
+        steps[running] += 1
+        running = running[new_row_offsets > 0]
+
+    #
+    # Work out the final states (a machine which hit a missing transition didn't take that last step)
+    missing = row_offsets < 0
+    steps[missing] -= 1
+    rows = np.where(missing, (-row_offsets - 1) // width, row_offsets // width)
+    states = np.array(compiled.states, dtype=np.int64)[rows]
+    return VectorisedResult(compiled.symbols, cells, origin, heads - origin, states, steps, missing)
+
+
+# Function to decode one machine's tape from a vectorised result, as a list of symbols starting at logical index
+# -result.origin (which is only non-zero if one of the machines stepped off the LHS end of its tape)
+def decode_tape(result, machine):
+    symbols = result.symbols
+    return [symbols[code] for code in result.cells[machine].tolist()]